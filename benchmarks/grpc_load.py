@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+GENERATED = ROOT / "proto" / "generated"
+sys.path.insert(0, str(ROOT))
+
+
+def ensure_stubs():
+    stub = GENERATED / "analytics_pb2_grpc.py"
+    if stub.exists() and stub.stat().st_mtime >= (ROOT / "proto" / "analytics.proto").stat().st_mtime:
+        return
+    from importlib.resources import files
+    from grpc_tools import protoc
+    GENERATED.mkdir(parents=True, exist_ok=True)
+    result = protoc.main([
+        "grpc_tools.protoc",
+        f"-I{ROOT / 'proto'}",
+        f"-I{files('grpc_tools') / '_proto'}",
+        f"--python_out={GENERATED}",
+        f"--grpc_python_out={GENERATED}",
+        str(ROOT / "proto" / "analytics.proto")
+    ])
+    if result != 0:
+        raise SystemExit("protoc failed")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def seed(db, users: int, days: int):
+    from src.infrastructure.models import DailyMoodSummary, UserTopicsSummary, ArchetypeHistory
+
+    start = date.today() - timedelta(days=days)
+    async for session in db.get_session():
+        for user_index in range(users):
+            user_id = f"user-{user_index}"
+            for day in range(days):
+                session.add(DailyMoodSummary(
+                    id=str(uuid.uuid4()),
+                    user_id=user_id,
+                    date=start + timedelta(days=day),
+                    emotion_vector=[random.random() for _ in range(8)],
+                    dominant_emotion="joy",
+                    average_valence=random.uniform(-1, 1),
+                    average_arousal=random.random(),
+                    entry_count=random.randint(1, 5),
+                    total_tokens=random.randint(50, 500)
+                ))
+            for topic in ("work", "family", "sport"):
+                session.add(UserTopicsSummary(
+                    id=str(uuid.uuid4()), user_id=user_id, topic=topic, frequency=random.randint(1, 50)
+                ))
+            session.add(ArchetypeHistory(
+                id=str(uuid.uuid4()), user_id=user_id, archetype="explorer", confidence=0.8, model_version="bench"
+            ))
+        await session.commit()
+
+
+async def run(args):
+    ensure_stubs()
+
+    import grpc
+    from src.config import Config
+    from src.infrastructure.database import Database
+    from src.infrastructure.repository import AnalyticsRepository
+    from src.infrastructure.cache import UserCache
+    from src.grpc_server import create_grpc_server
+    from analytics_pb2 import GetUserStatisticsRequest, GetUserStatisticsBatchRequest
+    from analytics_pb2_grpc import AnalyticsServiceStub
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'grpc_load.db')}"
+
+    config = Config(database_url=database_url, grpc_host="127.0.0.1", grpc_max_concurrent_rpcs=args.max_concurrent_rpcs)
+    db = Database(config)
+    await db.create_tables()
+    await seed(db, args.users, args.days)
+
+    repository = AnalyticsRepository(db)
+    cache = UserCache(config.cache_max_weight, config.cache_ttl_seconds) if args.cache else None
+    server, port = create_grpc_server(config, repository, db, cache, port=0)
+    await server.start()
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(stub):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if args.batch_size > 1:
+                    user_ids = [f"user-{random.randrange(args.users)}" for _ in range(args.batch_size)]
+                    await stub.GetUserStatisticsBatch(GetUserStatisticsBatchRequest(user_ids=user_ids))
+                else:
+                    await stub.GetUserStatistics(GetUserStatisticsRequest(user_id=f"user-{random.randrange(args.users)}"))
+                latencies.append(time.perf_counter() - started)
+            except grpc.RpcError:
+                errors += 1
+
+    async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+        stub = AnalyticsServiceStub(channel)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(stub) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await server.stop(0)
+    await db.close()
+
+    print(f"database:    {database_url.split('://')[0]}")
+    print(f"rpc:         {'GetUserStatisticsBatch x' + str(args.batch_size) if args.batch_size > 1 else 'GetUserStatistics'}")
+    print(f"concurrency: {args.concurrency}")
+    print(f"requests:    {len(latencies)} ok, {errors} failed in {elapsed:.1f}s")
+    print(f"throughput:  {len(latencies) / elapsed:.0f} rpc/s")
+    print(f"latency ms:  p50={percentile(latencies, 0.5) * 1000:.2f} "
+          f"p95={percentile(latencies, 0.95) * 1000:.2f} p99={percentile(latencies, 0.99) * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the in-process gRPC server")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--max-concurrent-rpcs", type=int, default=1000)
+    parser.add_argument("--cache", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
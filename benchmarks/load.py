@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+ARCHETYPES = ("explorer", "caregiver", "creator", "sage", "rebel", "ruler", "lover", "jester")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def zipf_cdf(size: int, skew: float) -> np.ndarray:
+    weights = np.arange(1, size + 1, dtype=np.float64) ** -skew
+    return np.cumsum(weights) / weights.sum()
+
+
+class EventStream:
+    def __init__(self, config, users: int, skew: float, topics: int, archetype_ratio: float,
+                 duplicate_ratio: float, days: int, seed: int):
+        self.mood_topic = config.mood_analyzed_topic
+        self.archetype_topic = config.archetype_updated_topic
+        self.archetype_ratio = archetype_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.days = days
+        self.rng = np.random.default_rng(seed)
+        self.user_cdf = zipf_cdf(users, skew)
+        self.topic_cdf = zipf_cdf(topics, 1.0)
+        self.vocabulary = [f"topic-{i}" for i in range(topics)]
+        self.now = datetime.now(timezone.utc)
+        self._recent = []
+    
+    def _pick(self, cdf: np.ndarray) -> int:
+        return min(int(np.searchsorted(cdf, self.rng.random())), len(cdf) - 1)
+    
+    def next(self):
+        user_id = f"user-{self._pick(self.user_cdf)}"
+        roll = self.rng.random()
+        
+        if roll < self.archetype_ratio:
+            return self.archetype_topic, {
+                "metadata": {"correlation_id": str(uuid.uuid4())},
+                "payload": {
+                    "user_id": user_id,
+                    "archetype": ARCHETYPES[int(self.rng.integers(len(ARCHETYPES)))],
+                    "confidence": float(self.rng.random()),
+                    "model_version": "load"
+                }
+            }
+        
+        if self._recent and roll < self.archetype_ratio + self.duplicate_ratio:
+            return self.mood_topic, self._recent[int(self.rng.integers(len(self._recent)))]
+        
+        emotion_vector = self.rng.dirichlet(np.ones(8)).tolist()
+        created_at = self.now - timedelta(days=float(self.rng.random() * self.days))
+        event = {
+            "metadata": {"correlation_id": str(uuid.uuid4()), "timestamp": created_at.isoformat()},
+            "payload": {
+                "user_id": user_id,
+                "entry_id": str(uuid.uuid4()),
+                "emotion_vector": emotion_vector,
+                "dominant_emotion": "joy",
+                "valence": float(self.rng.uniform(-1, 1)),
+                "arousal": float(self.rng.random()),
+                "tokens_count": int(self.rng.integers(20, 600)),
+                "detected_topics": sorted({self.vocabulary[self._pick(self.topic_cdf)] for _ in range(3)})
+            }
+        }
+        self._recent.append(event)
+        if len(self._recent) > 1000:
+            self._recent.pop(0)
+        return self.mood_topic, event
+
+
+class Pacer:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.started = time.perf_counter()
+        self.sent = 0
+    
+    def delay(self, count: int = 1) -> float:
+        self.sent += count
+        if not self.interval:
+            return 0.0
+        return max(self.started + self.sent * self.interval - time.perf_counter(), 0.0)
+
+
+class FakeMessage:
+    def __init__(self, topic: str, partition: int, offset: int, key: bytes, value: bytes):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+    
+    def topic(self):
+        return self._topic
+    
+    def partition(self):
+        return self._partition
+    
+    def offset(self):
+        return self._offset
+    
+    def key(self):
+        return self._key
+    
+    def value(self):
+        return self._value
+    
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    def __init__(self, stream: EventStream, events: int, partitions: int, rate: float):
+        self.stream = stream
+        self.remaining = events
+        self.partitions = partitions
+        self.pacer = Pacer(rate)
+        self.produced = {}
+        self.committed = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self, topics):
+        pass
+    
+    def consume(self, num_messages: int = 1, timeout: float = -1):
+        if self.remaining <= 0:
+            time.sleep(min(max(timeout, 0.0), 0.05))
+            return []
+        
+        count = min(num_messages, self.remaining)
+        if self.pacer.interval:
+            count = max(min(count, int(0.01 / self.pacer.interval)), 1)
+        time.sleep(self.pacer.delay(count))
+        
+        msgs = []
+        for _ in range(count):
+            topic, event = self.stream.next()
+            key = event["payload"]["user_id"].encode("utf-8")
+            partition = zlib.crc32(key) % self.partitions
+            with self._lock:
+                offset = self.produced.get((topic, partition), 0)
+                self.produced[(topic, partition)] = offset + 1
+            msgs.append(FakeMessage(topic, partition, offset, key, json.dumps(event).encode("utf-8")))
+        with self._lock:
+            self.remaining -= count
+        return msgs
+    
+    def commit(self, offsets=None, asynchronous=True):
+        with self._lock:
+            for topic_partition in offsets or []:
+                key = (topic_partition.topic, topic_partition.partition)
+                self.committed[key] = max(self.committed.get(key, 0), topic_partition.offset)
+    
+    def drained(self) -> bool:
+        with self._lock:
+            return self.remaining <= 0 and all(
+                self.committed.get(key, 0) >= offset for key, offset in self.produced.items()
+            )
+    
+    def close(self):
+        pass
+
+
+class RoundTrips:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+    
+    def _on_execute(self, *args):
+        self.statements += 1
+    
+    def _on_commit(self, *args):
+        self.commits += 1
+
+
+def timed(handler, latencies):
+    async def wrapper(*args):
+        started = time.perf_counter()
+        try:
+            return await handler(*args)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    return wrapper
+
+
+async def drive_handler(args, stream, handler, latencies):
+    handle_message = timed(handler.handle_message, latencies)
+    handle_batch = timed(handler.handle_batch, latencies)
+    pacer = Pacer(args.rate)
+    
+    sent = 0
+    while sent < args.events:
+        count = min(args.batch_size, args.events - sent)
+        await asyncio.sleep(pacer.delay(count))
+        if args.batch_size > 1:
+            await handle_batch([(*stream.next(), None) for _ in range(count)])
+        else:
+            topic, event = stream.next()
+            await handle_message(topic, event, None)
+        sent += count
+
+
+async def drive_consumer(args, config, stream, handler, latencies):
+    from src.infrastructure.kafka_client import KafkaConsumer
+    
+    fake = FakeConsumer(stream, args.events, args.partitions, args.rate)
+    consumer = KafkaConsumer(
+        config,
+        timed(handler.handle_message, latencies),
+        batch_handler=timed(handler.handle_batch, latencies) if args.batch_size > 1 else None
+    )
+    consumer.consumer = fake
+    consumer.running = True
+    
+    task = asyncio.create_task(consumer.consume_loop())
+    try:
+        while not fake.drained():
+            if task.done():
+                task.result()
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        consumer.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def run(args):
+    import logging
+    import structlog
+    from src.config import Config
+    from src.infrastructure.database import Database
+    from src.infrastructure.repository import AnalyticsRepository
+    from src.infrastructure.cache import UserCache
+    from src.application.event_handler import EventHandler
+    from src.application.archetype_buffer import ArchetypeHistoryBuffer
+    
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+    
+    config = Config(
+        database_url=database_url,
+        kafka_workers=args.workers,
+        kafka_batch_max_messages=max(args.batch_size, 1),
+        kafka_batch_max_wait_ms=args.batch_wait_ms
+    )
+    db = Database(config)
+    await db.create_tables()
+    round_trips = RoundTrips(db.engine)
+    
+    repository = AnalyticsRepository(db)
+    cache = UserCache(config.cache_max_weight, config.cache_ttl_seconds) if args.cache else None
+    archetype_buffer = ArchetypeHistoryBuffer(repository, db, cache=cache) if args.archetype_buffer else None
+    handler = EventHandler(repository, db, cache=cache, archetype_buffer=archetype_buffer)
+    stream = EventStream(
+        config, args.users, args.skew, args.topics, args.archetype_ratio, args.duplicate_ratio, args.days, args.seed
+    )
+    
+    latencies = []
+    started = time.perf_counter()
+    try:
+        if args.mode == "consumer":
+            await drive_consumer(args, config, stream, handler, latencies)
+        else:
+            await drive_handler(args, stream, handler, latencies)
+        if archetype_buffer is not None:
+            await archetype_buffer.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        await db.close()
+    
+    events = args.events
+    print(f"database:    {database_url.split('://')[0]}")
+    print(f"mode:        {args.mode}, batch size {args.batch_size}, workers {args.workers if args.mode == 'consumer' else 1}")
+    print(f"stream:      {args.users} users (zipf s={args.skew}), {args.topics} topics, "
+          f"{args.archetype_ratio:.0%} archetype, {args.duplicate_ratio:.0%} redelivered")
+    print(f"events:      {events} in {elapsed:.1f}s, target {args.rate or 'unbounded'} ev/s")
+    print(f"throughput:  {events / elapsed:.0f} ev/s")
+    print(f"handler ms:  calls={len(latencies)} p50={percentile(latencies, 0.5) * 1000:.2f} "
+          f"p95={percentile(latencies, 0.95) * 1000:.2f} p99={percentile(latencies, 0.99) * 1000:.2f}")
+    print(f"db trips:    {round_trips.statements / events:.2f} statements/event, {round_trips.commits / events:.3f} commits/event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive synthetic MoodAnalyzed/ArchetypeUpdated load through the event handler")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--mode", choices=("handler", "consumer"), default="handler",
+                        help="call EventHandler directly or go through KafkaConsumer with a fake confluent_kafka.Consumer")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0.0, help="events per second, 0 = as fast as possible")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--skew", type=float, default=1.1, help="zipf exponent of user activity")
+    parser.add_argument("--topics", type=int, default=500, help="topic vocabulary size")
+    parser.add_argument("--days", type=int, default=30, help="spread event dates over this many days")
+    parser.add_argument("--archetype-ratio", type=float, default=0.05)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="share of redelivered MoodAnalyzed events")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--batch-wait-ms", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="KafkaConsumer keyed workers in consumer mode")
+    parser.add_argument("--partitions", type=int, default=12)
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--archetype-buffer", action="store_true", help="write archetype history through the write-behind buffer")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
+
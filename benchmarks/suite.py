@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import functools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+sys.path.insert(0, str(ROOT))
+
+SIZES = (10, 1000, 100000)
+TOPICS = ("work", "family", "sport", "health", "travel", "money", "friends", "sleep")
+START = date(2024, 1, 1)
+MIN_SAMPLE_S = 0.02
+
+
+def analysis(rng: random.Random) -> dict:
+    return {
+        "emotion_vector": [rng.random() for _ in range(8)],
+        "valence": rng.uniform(-1, 1),
+        "arousal": rng.random(),
+        "tokens_count": rng.randint(20, 400),
+        "detected_topics": rng.sample(TOPICS, 2)
+    }
+
+
+def daily_summary(rng: random.Random, day: int) -> dict:
+    return {
+        "date": START + timedelta(days=day % 3650),
+        "emotion_vector": [rng.random() for _ in range(8)],
+        "average_valence": rng.uniform(-1, 1),
+        "average_arousal": rng.random(),
+        "entry_count": rng.randint(1, 5),
+        "total_tokens": rng.randint(50, 500),
+        "topics": rng.sample(TOPICS, 3)
+    }
+
+
+def weekly_summary(rng: random.Random) -> dict:
+    return {
+        "emotion_vector": [rng.random() for _ in range(8)],
+        "average_valence": rng.uniform(-1, 1),
+        "average_arousal": rng.random(),
+        "entry_count": rng.randint(0, 35),
+        "total_tokens": rng.randint(0, 3500),
+        "key_topics": rng.sample(TOPICS, 5)
+    }
+
+
+def mood_event(rng: random.Random, entry_id: str, user_id: str) -> dict:
+    return {
+        "metadata": {"timestamp": "2024-01-01T12:00:00Z"},
+        "payload": {"user_id": user_id, "entry_id": entry_id, **analysis(rng)}
+    }
+
+
+def loops_for(fn) -> int:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= MIN_SAMPLE_S:
+            return loops
+        loops *= 2
+
+
+@functools.lru_cache(maxsize=None)
+def calibration_workload():
+    import numpy as np
+    
+    rng = random.Random(3)
+    rows = [{"vector": [rng.random() for _ in range(8)], "value": rng.random()} for _ in range(2000)]
+    
+    def loop():
+        values = [row.get("value", 0.0) for row in rows]
+        np.mean([row.get("vector") for row in rows], axis=0)
+        return sorted(values)[len(values) // 2]
+    
+    return loop, len(rows), loops_for(loop)
+
+
+def calibration_sample() -> float:
+    loop, items, loops = calibration_workload()
+    started = time.perf_counter()
+    for _ in range(loops):
+        loop()
+    return (time.perf_counter() - started) / loops / items * 1e6
+
+
+def measure(fn, items: int, repeat: int) -> dict:
+    loops = loops_for(fn)
+    timings = []
+    calibration = []
+    for _ in range(repeat):
+        calibration.append(calibration_sample())
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - started) / loops)
+    return result(timings, items, min(calibration))
+
+
+async def measure_async(fn, items: int, repeat: int) -> dict:
+    timings = []
+    calibration = []
+    for _ in range(repeat):
+        calibration.append(calibration_sample())
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    return result(timings, items, min(calibration))
+
+
+def result(timings, items: int, calibration_us: float) -> dict:
+    best = min(timings)
+    return {
+        "items": items,
+        "repeat": len(timings),
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "per_item_us": best / items * 1e6,
+        "calibration_us": calibration_us,
+        "relative": best / items * 1e6 / calibration_us
+    }
+
+
+def bench_aggregator(sizes, repeat: int) -> dict:
+    from src.domain.aggregator import MoodAggregator
+    
+    rng = random.Random(7)
+    results = {}
+    for size in sizes:
+        analyses = [analysis(rng) for _ in range(size)]
+        dailies = [daily_summary(rng, day) for day in range(size)]
+        weeklies = [weekly_summary(rng) for _ in range(size)]
+        results[f"aggregator.daily.{size}"] = measure(lambda: MoodAggregator.calculate_daily_aggregate(analyses), size, repeat)
+        results[f"aggregator.weekly.{size}"] = measure(lambda: MoodAggregator.calculate_weekly_aggregate(dailies), size, repeat)
+        results[f"aggregator.monthly.{size}"] = measure(lambda: MoodAggregator.calculate_monthly_aggregate(weeklies), size, repeat)
+    return results
+
+
+async def seed(db, repository, users: int, days: int):
+    from src.domain.accumulator import MoodAccumulator
+    
+    rng = random.Random(11)
+    async for session in db.get_session():
+        accumulators = {}
+        topic_counts = {}
+        for user_index in range(users):
+            user_id = f"user-{user_index}"
+            for day in range(days):
+                accumulator = MoodAccumulator()
+                for _ in range(rng.randint(1, 4)):
+                    accumulator.add(analysis(rng))
+                accumulators[(user_id, START + timedelta(days=day))] = accumulator
+                for topic, frequency in accumulator.topic_counts.items():
+                    topic_counts[(user_id, topic)] = topic_counts.get((user_id, topic), 0) + frequency
+        await repository.merge_daily_accumulators(session, accumulators)
+        await repository.upsert_topic_counts(session, topic_counts, datetime.now(timezone.utc))
+        await session.commit()
+        await session.close()
+
+
+async def bench_service(args) -> dict:
+    import httpx
+    from src.config import Config
+    from src.infrastructure.database import Database
+    from src.infrastructure.repository import AnalyticsRepository
+    from src.application.event_handler import EventHandler
+    from src.api.app import app
+    from src.api.state import app_state
+    
+    db = Database(Config(database_url="sqlite+aiosqlite:///:memory:"))
+    results = {}
+    try:
+        await db.create_tables()
+        repository = AnalyticsRepository(db)
+        handler = EventHandler(repository, db)
+        rng = random.Random(13)
+        sequence = iter(range(10 ** 9))
+        
+        def events(count: int) -> list:
+            return [
+                mood_event(rng, f"bench-{next(sequence)}", f"ingest-{rng.randrange(args.users)}")
+                for _ in range(count)
+            ]
+        
+        async def ingest_single():
+            for event in events(args.ingest_events):
+                await handler.handle_mood_analyzed(event)
+        
+        async def ingest_batch():
+            pending = events(args.ingest_events)
+            for offset in range(0, len(pending), args.batch_size):
+                await handler.handle_mood_analyzed_batch(pending[offset:offset + args.batch_size])
+        
+        results["ingest.single"] = await measure_async(ingest_single, args.ingest_events, args.repeat)
+        results[f"ingest.batch.{args.batch_size}"] = await measure_async(ingest_batch, args.ingest_events, args.repeat)
+        
+        await seed(db, repository, args.users, args.days)
+        user_ids = [f"user-{rng.randrange(args.users)}" for _ in range(args.lookups)]
+        
+        async def user_statistics():
+            for user_id in user_ids:
+                async for session in db.get_session():
+                    try:
+                        await repository.get_user_statistics(session, user_id)
+                    finally:
+                        await session.close()
+        
+        results["repository.user_statistics"] = await measure_async(user_statistics, args.lookups, args.repeat)
+        
+        app_state.update({"db": db, "repository": repository, "cache": None})
+        end = START + timedelta(days=args.days - 1)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for response_format in ("rows", "columns"):
+                async def daily_mood():
+                    for user_id in user_ids:
+                        response = await client.get(
+                            f"/users/{user_id}/mood/daily",
+                            params={"start_date": START.isoformat(), "end_date": end.isoformat(), "format": response_format}
+                        )
+                        response.raise_for_status()
+                
+                results[f"api.mood_daily.{response_format}"] = await measure_async(daily_mood, args.lookups, args.repeat)
+    finally:
+        app_state.clear()
+        await db.close()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None or "relative" not in reference:
+            print(f"  {name:<32} {current['relative']:>12.2f} x calibration   (new)")
+            continue
+        ratio = current["relative"] / reference["relative"] if reference["relative"] else 1.0
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"  {name:<32} {current['relative']:>12.2f} x calibration   {ratio:>6.2f}x baseline {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args) -> dict:
+    import structlog
+    import logging
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    
+    results = {}
+    if "aggregator" in args.only:
+        results.update(bench_aggregator(args.sizes, args.repeat))
+    if "service" in args.only:
+        results.update(await bench_service(args))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark aggregation, ingest and read paths against a JSON baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--check", action="store_true", help="exit non-zero when a case regresses past the tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown relative to the calibration loop, 0.5 = 50%%")
+    parser.add_argument("--only", nargs="+", choices=("aggregator", "service"), default=["aggregator", "service"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--ingest-events", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+    
+    print(f"python {platform.python_version()} on {platform.machine()}, best of {args.repeat}, tolerance {args.tolerance:.0%}")
+    regressions = compare(results, baseline, args.tolerance)
+    
+    if args.save:
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": merged
+        }, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+    
+    if args.check and regressions:
+        print(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
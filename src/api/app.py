@@ -1,16 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from prometheus_client import REGISTRY
 import asyncio
+import time
 import structlog
 
 from src.config import Config
 from src.infrastructure.database import Database, Base
 from src.infrastructure.models import DailyMoodSummary, WeeklyMoodSummary, MonthlyMoodSummary, UserTopicsSummary, ArchetypeHistory
 from src.infrastructure.repository import AnalyticsRepository
-from src.infrastructure.kafka_client import KafkaConsumer
+from src.infrastructure.kafka_client import KafkaConsumer, CacheInvalidationBus
+from src.infrastructure.cache import UserCache, RecentIds
+from src.infrastructure.metrics import HTTP_DURATION, register_pool_collector
+from src.domain.trending import TopicTrending
 from src.application.event_handler import EventHandler
+from src.application.rollup import RollupService
+from src.application.export import DailyExporter
+from src.application.archetype_buffer import ArchetypeHistoryBuffer
+from src.application.archetype_timeline import ArchetypeTimeline
+from src.application.retention import RetentionService
 from src.api.state import app_state, consumer_task
 from src.api.routes import router
+from src.grpc_server import create_grpc_server, GRPC_STUBS_AVAILABLE
 
 logger = structlog.get_logger()
 
@@ -23,34 +35,103 @@ async def lifespan(app: FastAPI):
     
     await db.create_database_if_not_exists()
     await db.create_tables()
+    pool_collector = register_pool_collector(db.engine)
     
     repository = AnalyticsRepository(db)
     
-    event_handler = EventHandler(repository, db)
-    kafka_consumer = KafkaConsumer(config, event_handler.handle_message)
+    cache = UserCache(config.cache_max_weight, config.cache_ttl_seconds)
+    invalidation_bus = None
+    if config.cache_invalidation_topic:
+        invalidation_bus = CacheInvalidationBus(config, cache)
+        invalidation_bus.start()
+    
+    trending = TopicTrending(config.trending_half_life_days, config.trending_landmark)
+    if trending.horizon - datetime.now(timezone.utc) < timedelta(days=365):
+        logger.warning(
+            "Trending landmark is close to its horizon, run src.trending_rebase",
+            landmark=trending.landmark.isoformat(), horizon=trending.horizon.isoformat()
+        )
+    archetype_buffer = ArchetypeHistoryBuffer(
+        repository, db, cache=cache,
+        max_rows=config.archetype_flush_max_rows,
+        flush_interval_seconds=config.archetype_flush_interval_ms / 1000.0,
+        max_pending=config.archetype_flush_max_pending,
+        mark_months_dirty=config.rollup_archetype_change
+    )
+    event_handler = EventHandler(
+        repository, db, cache=cache, trending=trending, recent_entries=RecentIds(config.dedup_recent_entries),
+        archetype_buffer=archetype_buffer
+    )
+    kafka_consumer = KafkaConsumer(
+        config,
+        event_handler.handle_message,
+        batch_handler=event_handler.handle_batch if config.kafka_batch_enabled else None,
+        before_commit=archetype_buffer.flush
+    )
     kafka_consumer.start()
     
+    rollup_service = RollupService(
+        repository, db, batch_size=config.rollup_batch_size, archetype_changes=config.rollup_archetype_change,
+        retention_months=config.retention_daily_months
+    )
+    retention_service = RetentionService(
+        repository, db,
+        daily_months=config.retention_daily_months,
+        archetype_months=config.retention_archetype_months,
+        batch_size=config.retention_batch_size
+    )
+    exporter = DailyExporter(repository, db, chunk_size=config.export_chunk_size)
+    
     app_state["config"] = config
     app_state["db"] = db
     app_state["repository"] = repository
+    app_state["cache"] = cache
     app_state["kafka_consumer"] = kafka_consumer
+    app_state["rollup_service"] = rollup_service
+    app_state["retention_service"] = retention_service
+    app_state["exporter"] = exporter
+    app_state["archetype_buffer"] = archetype_buffer
+    app_state["archetype_timeline"] = ArchetypeTimeline(repository, db)
     
     import src.api.state as state_module
     state_module.consumer_task = asyncio.create_task(kafka_consumer.consume_loop())
+    state_module.rollup_task = asyncio.create_task(rollup_service.run(config.rollup_interval_seconds))
+    state_module.archetype_task = asyncio.create_task(archetype_buffer.run())
+    state_module.retention_task = asyncio.create_task(retention_service.run(config.retention_interval_seconds))
+    
+    grpc_server = None
+    if config.grpc_enabled and GRPC_STUBS_AVAILABLE:
+        grpc_server, grpc_port = create_grpc_server(config, repository, db, cache)
+        await grpc_server.start()
+        app_state["grpc_server"] = grpc_server
+        logger.info("gRPC server started", port=grpc_port)
+    elif config.grpc_enabled:
+        logger.warning("gRPC server disabled: proto stubs are not generated")
     
     logger.info("Analytics Service started")
     
     yield
     
+    if grpc_server is not None:
+        await grpc_server.stop(config.grpc_shutdown_grace_seconds)
+    
     import src.api.state as state_module
-    if state_module.consumer_task:
-        state_module.consumer_task.cancel()
-        try:
-            await state_module.consumer_task
-        except asyncio.CancelledError:
-            pass
+    for task in (
+        state_module.consumer_task, state_module.rollup_task,
+        state_module.archetype_task, state_module.retention_task
+    ):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
     
     kafka_consumer.stop()
+    await archetype_buffer.close()
+    if invalidation_bus is not None:
+        invalidation_bus.stop()
+    REGISTRY.unregister(pool_collector)
     await db.close()
 
 
@@ -64,6 +145,21 @@ app = FastAPI(
 app.include_router(router)
 
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_DURATION.labels(
+            request.method, route.path if route is not None else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+
 @app.get("/")
 async def root():
     return {"service": "analytics-service", "version": "1.0.0"}
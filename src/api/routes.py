@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from typing import List, Optional
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
 from pydantic import BaseModel
 
 from src.api.state import app_state
+from src.application.export import ARROW_AVAILABLE, EXPORT_FORMATS
 
 router = APIRouter()
 
@@ -22,12 +25,141 @@ class DailyMoodResponse(BaseModel):
     volatility_index: Optional[float]
 
 
+class WeeklyMoodResponse(BaseModel):
+    user_id: str
+    year: int
+    week: int
+    emotion_vector: List[float]
+    dominant_emotion: str
+    average_valence: float
+    average_arousal: float
+    entry_count: int
+    total_tokens: int
+    volatility: Optional[float]
+    trend: Optional[str]
+    most_emotional_day: Optional[str]
+    most_productive_day: Optional[str]
+    key_topics: Optional[List[str]]
+
+
+class MonthlyMoodResponse(BaseModel):
+    user_id: str
+    year: int
+    month: int
+    emotion_vector: List[float]
+    dominant_emotion: str
+    average_valence: float
+    average_arousal: float
+    entry_count: int
+    total_tokens: int
+    volatility: Optional[float]
+    trend: Optional[str]
+    active_days: int
+    average_entries_per_day: Optional[float]
+    dominant_topics: Optional[List[str]]
+    archetype_change: Optional[str]
+
+
+class TopicResponse(BaseModel):
+    topic: str
+    frequency: int
+    last_seen: Optional[datetime]
+
+
+class ArchetypeSegmentResponse(BaseModel):
+    archetype: str
+    started_at: datetime
+    ended_at: datetime
+    observations: int
+    confidence_min: float
+    confidence_max: float
+    confidence_mean: float
+
+
+class ArchetypeTimelineResponse(BaseModel):
+    user_id: str
+    segments: List[ArchetypeSegmentResponse]
+    next_cursor: Optional[str]
+
+
 @router.get("/users/{user_id}/mood/daily", response_model=List[DailyMoodResponse])
 async def get_daily_mood(
     user_id: str,
     start_date: date = Query(...),
-    end_date: date = Query(...)
+    end_date: date = Query(...),
+    format: str = Query("rows", pattern="^(rows|columns)$")
 ):
+    try:
+        db = app_state.get("db")
+        repository = app_state.get("repository")
+        cache = app_state.get("cache")
+        
+        if not db or not repository:
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        if format == "columns":
+            async def load_columns():
+                return await _load_daily_mood_columns(db, repository, user_id, start_date, end_date)
+            
+            if cache is None:
+                payload = await load_columns()
+            else:
+                payload = await cache.get_or_load(user_id, ("daily_columns", start_date, end_date), load_columns)
+            return ORJSONResponse(payload)
+        
+        async def load_daily():
+            return await _load_daily_mood(db, repository, user_id, start_date, end_date)
+        
+        if cache is None:
+            return await load_daily()
+        return await cache.get_or_load(user_id, ("daily", start_date, end_date), load_daily)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _load_daily_mood(db, repository, user_id: str, start_date: date, end_date: date) -> List[DailyMoodResponse]:
+    async for session in db.get_session():
+        try:
+            summaries = await repository.get_daily_summaries(session, user_id, start_date, end_date)
+            return [
+                DailyMoodResponse(
+                    id=s.id,
+                    user_id=s.user_id,
+                    date=s.date,
+                    emotion_vector=s.emotion_vector,
+                    dominant_emotion=s.dominant_emotion,
+                    average_valence=s.average_valence,
+                    average_arousal=s.average_arousal,
+                    entry_count=s.entry_count,
+                    total_tokens=s.total_tokens,
+                    topics=s.topics,
+                    volatility_index=s.volatility_index
+                )
+                for s in summaries
+            ]
+        finally:
+            await session.close()
+
+
+async def _load_daily_mood_columns(db, repository, user_id: str, start_date: date, end_date: date) -> dict:
+    async for session in db.get_session():
+        try:
+            columns = await repository.get_daily_columns(session, user_id, start_date, end_date)
+            return {
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "count": len(columns["date"]),
+                **columns
+            }
+        finally:
+            await session.close()
+
+
+@router.get("/users/{user_id}/mood/weekly", response_model=List[WeeklyMoodResponse])
+async def get_weekly_mood(user_id: str, weeks: int = Query(4, ge=1, le=52)):
     try:
         db = app_state.get("db")
         repository = app_state.get("repository")
@@ -37,22 +169,25 @@ async def get_daily_mood(
         
         async for session in db.get_session():
             try:
-                summaries = await repository.get_daily_summaries(session, user_id, start_date, end_date)
+                summaries = await repository.get_weekly_summaries(session, user_id, weeks)
                 return [
-                    DailyMoodResponse(
-                        id=s.id,
+                    WeeklyMoodResponse(
                         user_id=s.user_id,
-                        date=s.date,
+                        year=s.year,
+                        week=s.week,
                         emotion_vector=s.emotion_vector,
                         dominant_emotion=s.dominant_emotion,
                         average_valence=s.average_valence,
                         average_arousal=s.average_arousal,
                         entry_count=s.entry_count,
                         total_tokens=s.total_tokens,
-                        topics=s.topics,
-                        volatility_index=s.volatility_index
+                        volatility=s.volatility,
+                        trend=s.trend,
+                        most_emotional_day=s.most_emotional_day,
+                        most_productive_day=s.most_productive_day,
+                        key_topics=s.key_topics
                     )
-                    for s in summaries
+                    for s in reversed(summaries)
                 ]
             finally:
                 await session.close()
@@ -62,14 +197,44 @@ async def get_daily_mood(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/users/{user_id}/mood/weekly")
-async def get_weekly_mood(user_id: str, weeks: int = Query(4, ge=1, le=52)):
-    return {"message": "Not implemented yet"}
-
-
-@router.get("/users/{user_id}/mood/monthly")
+@router.get("/users/{user_id}/mood/monthly", response_model=List[MonthlyMoodResponse])
 async def get_monthly_mood(user_id: str, months: int = Query(6, ge=1, le=24)):
-    return {"message": "Not implemented yet"}
+    try:
+        db = app_state.get("db")
+        repository = app_state.get("repository")
+        
+        if not db or not repository:
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        async for session in db.get_session():
+            try:
+                summaries = await repository.get_monthly_summaries(session, user_id, months)
+                return [
+                    MonthlyMoodResponse(
+                        user_id=s.user_id,
+                        year=s.year,
+                        month=s.month,
+                        emotion_vector=s.emotion_vector,
+                        dominant_emotion=s.dominant_emotion,
+                        average_valence=s.average_valence,
+                        average_arousal=s.average_arousal,
+                        entry_count=s.entry_count,
+                        total_tokens=s.total_tokens,
+                        volatility=s.volatility,
+                        trend=s.trend,
+                        active_days=s.active_days,
+                        average_entries_per_day=s.average_entries_per_day,
+                        dominant_topics=s.dominant_topics,
+                        archetype_change=s.archetype_change
+                    )
+                    for s in reversed(summaries)
+                ]
+            finally:
+                await session.close()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/users/{user_id}/summary")
@@ -77,9 +242,119 @@ async def get_user_summary(user_id: str):
     return {"message": "Not implemented yet"}
 
 
-@router.get("/users/{user_id}/topics")
-async def get_user_topics(user_id: str, period_days: int = Query(30, ge=1, le=365)):
-    return {"message": "Not implemented yet"}
+@router.get("/users/{user_id}/topics", response_model=List[TopicResponse])
+async def get_user_topics(
+    user_id: str,
+    period_days: int = Query(30, ge=1, le=365),
+    limit: int = Query(10, ge=1, le=100)
+):
+    try:
+        db = app_state.get("db")
+        repository = app_state.get("repository")
+        cache = app_state.get("cache")
+        
+        if not db or not repository:
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        async def load_topics():
+            return await _load_user_topics(db, repository, user_id, period_days, limit)
+        
+        if cache is None:
+            return await load_topics()
+        return await cache.get_or_load(user_id, ("topics", period_days, limit), load_topics)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _load_user_topics(db, repository, user_id: str, period_days: int, limit: int) -> List[TopicResponse]:
+    since = datetime.now(timezone.utc).date() - timedelta(days=period_days)
+    async for session in db.get_session():
+        try:
+            topics = await repository.get_top_topics(session, user_id, limit, since)
+            return [
+                TopicResponse(topic=t.topic, frequency=t.frequency, last_seen=t.last_seen)
+                for t in topics
+            ]
+        finally:
+            await session.close()
+
+
+@router.get("/users/{user_id}/archetypes/timeline", response_model=ArchetypeTimelineResponse)
+async def get_archetype_timeline(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    order: str = Query("asc", pattern="^(asc|desc)$")
+):
+    try:
+        timeline = app_state.get("archetype_timeline")
+        if timeline is None:
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        try:
+            segments, next_cursor = await timeline.page(user_id, limit, cursor, newest_first=order == "desc")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return ArchetypeTimelineResponse(
+            user_id=user_id,
+            segments=[ArchetypeSegmentResponse(**segment.to_dict()) for segment in segments],
+            next_cursor=next_cursor
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/users/{user_id}/export")
+async def export_user_history(
+    user_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    return _export_response(user_id, format, start_date, end_date)
+
+
+@router.get("/admin/export")
+async def export_all_history(
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    return _export_response(None, format, start_date, end_date)
+
+
+def _export_response(user_id: Optional[str], format: str, start_date: Optional[date], end_date: Optional[date]):
+    exporter = app_state.get("exporter")
+    if exporter is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if format == "arrow" and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow")
+    
+    stream = exporter.arrow if format == "arrow" else exporter.ndjson
+    filename = f"{user_id or 'all-users'}-daily.{format}"
+    return StreamingResponse(
+        stream(user_id, start_date, end_date),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    cache = app_state.get("cache")
+    if cache is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    return cache.stats()
+
+
+@router.get("/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @router.get("/health")
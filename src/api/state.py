@@ -1,3 +1,6 @@
 app_state = {}
 consumer_task = None
+rollup_task = None
+archetype_task = None
+retention_task = None
 
@@ -0,0 +1,110 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
+import asyncio
+import uuid
+import structlog
+
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.database import Database
+from src.infrastructure.cache import UserCache
+
+logger = structlog.get_logger()
+
+
+def history_row(
+    user_id: str, archetype: str, confidence: float, model_version: str, changed_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "archetype": archetype,
+        "confidence": confidence,
+        "model_version": model_version,
+        "changed_at": changed_at or datetime.now(timezone.utc)
+    }
+
+
+class ArchetypeHistoryBuffer:
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, cache: Optional[UserCache] = None,
+        max_rows: int = 500, flush_interval_seconds: float = 1.0, mark_months_dirty: bool = False,
+        max_pending: int = 50000
+    ):
+        self.repository = repository
+        self.db = db
+        self.cache = cache
+        self.max_rows = max_rows
+        self.flush_interval_seconds = flush_interval_seconds
+        self.mark_months_dirty = mark_months_dirty
+        self.max_pending = max(max_pending, max_rows)
+        
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    async def add(
+        self, user_id: str, archetype: str, confidence: float, model_version: str,
+        changed_at: Optional[datetime] = None
+    ):
+        self._rows.append(history_row(user_id, archetype, confidence, model_version, changed_at))
+        if len(self._rows) >= self.max_rows:
+            await self.flush()
+    
+    async def write(self, session, rows: List[Dict[str, Any]]):
+        await self.repository.insert_archetype_history(session, rows)
+        if self.mark_months_dirty:
+            await self.repository.mark_rollups_dirty(
+                session, {(row["user_id"], row["changed_at"].date()) for row in rows}, periods=("month",)
+            )
+    
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._rows:
+                return 0
+            rows, self._rows = self._rows, []
+            
+            try:
+                async for session in self.db.get_session():
+                    try:
+                        await self.write(session, rows)
+                        await session.commit()
+                    except Exception:
+                        await session.rollback()
+                        raise
+                    finally:
+                        await session.close()
+            except Exception:
+                self._rows = rows + self._rows
+                if len(self._rows) > self.max_pending:
+                    dropped = len(self._rows) - self.max_pending
+                    self._rows = self._rows[dropped:]
+                    logger.error(
+                        "Dropping archetype history the database did not accept",
+                        dropped=dropped, pending=len(self._rows)
+                    )
+                raise
+        
+        if self.cache is not None:
+            self.cache.invalidate_users(row["user_id"] for row in rows)
+        
+        logger.debug("Archetype history flushed", rows=len(rows))
+        return len(rows)
+    
+    async def run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval_seconds)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error flushing archetype history", error=str(e), pending=len(self._rows), exc_info=True)
+    
+    async def close(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Dropping unflushed archetype history", error=str(e), pending=len(self._rows), exc_info=True)
+
@@ -0,0 +1,42 @@
+from typing import List, Optional, Tuple
+
+from src.domain.archetypes import ArchetypeSegment, encode_cursor, decode_cursor
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.database import Database
+
+
+class ArchetypeTimeline:
+    def __init__(self, repository: AnalyticsRepository, db: Database, chunk_size: int = 500):
+        self.repository = repository
+        self.db = db
+        self.chunk_size = chunk_size
+    
+    async def page(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None, newest_first: bool = False
+    ) -> Tuple[List[ArchetypeSegment], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        segments: List[ArchetypeSegment] = []
+        last_key = after
+        
+        async for session in self.db.get_session():
+            try:
+                while True:
+                    rows = await self.repository.get_archetype_history_page(
+                        session, user_id, after, self.chunk_size, newest_first
+                    )
+                    for row in rows:
+                        if segments and segments[-1].archetype == row.archetype:
+                            segments[-1].extend(row.changed_at, row.confidence)
+                        elif len(segments) == limit:
+                            return segments, encode_cursor(*last_key)
+                        else:
+                            segments.append(ArchetypeSegment(row.archetype, row.changed_at, row.confidence))
+                        last_key = (row.changed_at, row.id)
+                    
+                    if len(rows) < self.chunk_size:
+                        return segments, None
+                    after = last_key
+            finally:
+                await session.close()
+        return segments, None
+
@@ -1,103 +1,302 @@
-from typing import Dict, Any, Optional
-from datetime import date, datetime
+from typing import Dict, Any, Optional, List, Tuple
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
 import structlog
 
 from src.domain.aggregator import MoodAggregator
+from src.domain.accumulator import MoodAccumulator
+from src.domain.trending import TopicTrending
+from src.domain.events import (
+    parse_mood_analyzed, parse_entry_deleted, parse_archetype_updated, parse_emotion_vector, parse_topics,
+    entry_contribution
+)
 from src.infrastructure.repository import AnalyticsRepository
 from src.infrastructure.database import Database
+from src.infrastructure.cache import UserCache, RecentIds
+from src.infrastructure.metrics import observe_handler
+from src.application.archetype_buffer import ArchetypeHistoryBuffer, history_row
 
 logger = structlog.get_logger()
 
 
 class EventHandler:
-    def __init__(self, repository: AnalyticsRepository, db: Database):
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, cache: Optional[UserCache] = None,
+        trending: Optional[TopicTrending] = None, recent_entries: Optional[RecentIds] = None,
+        archetype_buffer: Optional[ArchetypeHistoryBuffer] = None
+    ):
         self.repository = repository
         self.db = db
+        self.cache = cache
+        self.trending = trending or TopicTrending()
+        self.recent_entries = recent_entries if recent_entries is not None else RecentIds(100000)
+        self.archetype_buffer = archetype_buffer
         self.aggregator = MoodAggregator()
     
+    def _parse_mood_analyzed(self, event_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return parse_mood_analyzed(event_data)
+    
     async def handle_mood_analyzed(self, event_data: Dict[str, Any], correlation_id: Optional[str] = None):
         try:
-            payload = event_data.get("payload", {})
-            if isinstance(payload, str):
-                import json
-                payload = json.loads(payload)
-            
-            user_id = payload.get("user_id")
-            entry_id = payload.get("entry_id")
-            emotion_vector = payload.get("emotion_vector", [])
-            dominant_emotion = payload.get("dominant_emotion", "neutral")
-            valence = payload.get("valence", 0.0)
-            arousal = payload.get("arousal", 0.0)
-            tokens_count = payload.get("tokens_count", 0)
-            detected_topics = payload.get("detected_topics", [])
-            
-            if not user_id:
-                return
-            
-            analysis_data = {
-                "emotion_vector": emotion_vector,
-                "dominant_emotion": dominant_emotion,
-                "valence": valence,
-                "arousal": arousal,
-                "tokens_count": tokens_count,
-                "detected_topics": detected_topics
-            }
-            
-            today = date.today()
-            
-            async for session in self.db.get_session():
-                try:
-                    daily_summary = await self.repository.get_or_create_daily_summary(session, user_id, today)
-                    
-                    existing_analyses = [analysis_data]
-                    aggregate = self.aggregator.calculate_daily_aggregate(existing_analyses)
-                    
-                    daily_summary.emotion_vector = aggregate.get("emotion_vector", emotion_vector)
-                    daily_summary.dominant_emotion = aggregate.get("dominant_emotion", dominant_emotion)
-                    daily_summary.average_valence = aggregate.get("average_valence", valence)
-                    daily_summary.average_arousal = aggregate.get("average_arousal", arousal)
-                    daily_summary.entry_count += 1
-                    daily_summary.total_tokens += tokens_count
-                    daily_summary.topics = aggregate.get("topics", detected_topics)
-                    daily_summary.volatility_index = aggregate.get("volatility_index", 0.0)
-                    daily_summary.updated_at = datetime.utcnow()
-                    
-                    await session.commit()
-                finally:
-                    await session.close()
-            
+            await self.handle_mood_analyzed_batch([event_data])
         except Exception as e:
             logger.error("Error processing MoodAnalyzed", error=str(e), exc_info=True)
     
+    async def handle_mood_analyzed_batch(self, events: List[Dict[str, Any]]):
+        await self._apply_batch(mood_events=events)
+    
+    def _parse_mood_analyzed_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        analyses = []
+        for event_data in events:
+            try:
+                analysis_data = self._parse_mood_analyzed(event_data)
+                if analysis_data:
+                    analyses.append(analysis_data)
+            except Exception as e:
+                logger.error("Error parsing MoodAnalyzed", error=str(e))
+        return self._drop_known_entries(analyses)
+    
+    async def _apply_mood_analyzed(self, session, analyses: List[Dict[str, Any]], seen_at: datetime, trend_weight: float):
+        analyses = await self._claim_entries(session, analyses, trend_weight)
+        accumulators, topic_counts, daily_topic_counts = self._accumulate(analyses)
+        if accumulators:
+            await self.repository.merge_daily_accumulators(session, accumulators)
+            await self.repository.mark_rollups_dirty(session, accumulators.keys())
+            await self.repository.upsert_topic_counts(session, topic_counts, seen_at, trend_weight)
+            await self.repository.upsert_daily_topic_counts(session, daily_topic_counts)
+        return analyses, accumulators
+    
+    def _drop_known_entries(self, analyses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        fresh = []
+        batch_ids = set()
+        for analysis_data in analyses:
+            entry_id = analysis_data["entry_id"]
+            if entry_id:
+                if entry_id in batch_ids or entry_id in self.recent_entries:
+                    continue
+                batch_ids.add(entry_id)
+            fresh.append(analysis_data)
+        
+        if len(fresh) < len(analyses):
+            logger.debug("Duplicate MoodAnalyzed events skipped", skipped=len(analyses) - len(fresh))
+        return fresh
+    
+    async def _claim_entries(self, session, analyses: List[Dict[str, Any]], trend_weight: float) -> List[Dict[str, Any]]:
+        claimed = await self.repository.claim_entries(session, [
+            (a["entry_id"], a["user_id"], a["date"], entry_contribution(a, trend_weight))
+            for a in analyses if a["entry_id"]
+        ])
+        fresh = [a for a in analyses if not a["entry_id"] or a["entry_id"] in claimed]
+        
+        for analysis_data in analyses:
+            if analysis_data["entry_id"] and analysis_data["entry_id"] not in claimed:
+                self.recent_entries.add(analysis_data["entry_id"])
+        if len(fresh) < len(analyses):
+            logger.info("Already processed MoodAnalyzed events skipped", skipped=len(analyses) - len(fresh))
+        return fresh
+    
+    @staticmethod
+    def _accumulate(analyses: List[Dict[str, Any]]):
+        accumulators: Dict[Tuple[str, date], MoodAccumulator] = defaultdict(MoodAccumulator)
+        topic_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        daily_topic_counts: Dict[Tuple[str, date, str], int] = defaultdict(int)
+        for analysis_data in analyses:
+            accumulators[(analysis_data["user_id"], analysis_data["date"])].add(analysis_data)
+            for topic in analysis_data["detected_topics"]:
+                topic_counts[(analysis_data["user_id"], topic)] += 1
+                daily_topic_counts[(analysis_data["user_id"], analysis_data["date"], topic)] += 1
+        return dict(accumulators), topic_counts, daily_topic_counts
+    
+    async def handle_entry_deleted(self, event_data: Dict[str, Any], correlation_id: Optional[str] = None):
+        try:
+            await self.handle_entry_deleted_batch([event_data])
+        except Exception as e:
+            logger.error("Error processing DiaryEntryDeleted", error=str(e), exc_info=True)
+    
+    async def handle_entry_deleted_batch(self, events: List[Dict[str, Any]]):
+        await self._apply_batch(deleted_events=events)
+    
+    @staticmethod
+    def _parse_entry_deleted_events(events: List[Dict[str, Any]]) -> Dict[str, Tuple[str, str, date]]:
+        deletions = {}
+        for event_data in events:
+            try:
+                deletion = parse_entry_deleted(event_data)
+                if deletion:
+                    deletions[deletion[0]] = deletion
+            except Exception as e:
+                logger.error("Error parsing DiaryEntryDeleted", error=str(e))
+        return deletions
+    
+    async def _apply_entry_deleted(self, session, deletions: Dict[str, Tuple[str, str, date]]):
+        removed = await self.repository.tombstone_entries(session, deletions.values())
+        removals, topic_decrements, daily_topic_decrements = self._removals(removed)
+        if removals:
+            skipped = await self.repository.remove_daily_contributions(session, removals)
+            for (user_id, summary_date), reason in skipped:
+                logger.warning(
+                    "Deleted entry could not be subtracted from its daily summary",
+                    user_id=user_id, date=summary_date.isoformat(), reason=reason
+                )
+            await self.repository.mark_rollups_dirty(session, removals.keys())
+            await self.repository.decrement_topic_counts(session, topic_decrements)
+            await self.repository.decrement_daily_topic_counts(session, daily_topic_decrements)
+        return removed, removals
+    
+    @staticmethod
+    def _removals(entries):
+        removals: Dict[Tuple[str, date], List[Dict[str, Any]]] = defaultdict(list)
+        topic_decrements: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+        daily_topic_decrements: Dict[Tuple[str, date, str], int] = defaultdict(int)
+        for entry in entries:
+            if not entry.contribution:
+                continue
+            try:
+                parse_emotion_vector(entry.contribution.get("emotion_vector"))
+                parse_topics(entry.contribution.get("detected_topics"))
+            except ValueError as e:
+                logger.warning("Deleted entry has an unusable contribution", entry_id=entry.entry_id, error=str(e))
+                continue
+            removals[(entry.user_id, entry.date)].append(entry.contribution)
+            for topic in entry.contribution.get("detected_topics") or []:
+                decrement = topic_decrements[(entry.user_id, topic)]
+                decrement[0] += 1
+                decrement[1] += entry.contribution.get("trend_weight", 0.0)
+                daily_topic_decrements[(entry.user_id, entry.date, topic)] += 1
+        return removals, {key: tuple(value) for key, value in topic_decrements.items()}, daily_topic_decrements
+    
     async def handle_archetype_updated(self, event_data: Dict[str, Any], correlation_id: Optional[str] = None):
         try:
-            payload = event_data.get("payload", {})
-            if isinstance(payload, str):
-                import json
-                payload = json.loads(payload)
-            
-            user_id = payload.get("user_id")
-            archetype = payload.get("archetype")
-            confidence = payload.get("confidence", 0.0)
-            model_version = payload.get("model_version", "unknown")
+            archetype = parse_archetype_updated(event_data)
+            if not archetype:
+                return
             
-            if not user_id or not archetype:
+            if self.archetype_buffer is not None:
+                await self.archetype_buffer.add(**archetype)
                 return
             
             async for session in self.db.get_session():
                 try:
-                    await self.repository.save_archetype_history(
-                        session, user_id, archetype, confidence, model_version
-                    )
+                    await self.repository.save_archetype_history(session, **archetype)
                 finally:
                     await session.close()
             
+            self._invalidate_users({archetype["user_id"]})
+            
         except Exception as e:
             logger.error("Error processing ArchetypeUpdated", error=str(e), exc_info=True)
     
+    @staticmethod
+    def _parse_archetype_rows(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = []
+        for event_data in events:
+            try:
+                archetype = parse_archetype_updated(event_data)
+                if archetype:
+                    rows.append(history_row(**archetype))
+            except Exception as e:
+                logger.error("Error parsing ArchetypeUpdated", error=str(e))
+        return rows
+    
+    async def _write_archetype_history(self, session, rows: List[Dict[str, Any]]):
+        if self.archetype_buffer is not None:
+            await self.archetype_buffer.write(session, rows)
+        else:
+            await self.repository.insert_archetype_history(session, rows)
+    
+    async def _apply_batch(
+        self, mood_events: List[Dict[str, Any]] = (), deleted_events: List[Dict[str, Any]] = (),
+        archetype_events: List[Dict[str, Any]] = (), topics: Optional[Dict[str, str]] = None
+    ):
+        topics = topics or {}
+        analyses = self._parse_mood_analyzed_events(mood_events)
+        deletions = self._parse_entry_deleted_events(deleted_events)
+        archetype_rows = self._parse_archetype_rows(archetype_events)
+        if not (analyses or deletions or archetype_rows):
+            return
+        
+        seen_at = datetime.now(timezone.utc)
+        trend_weight = self.trending.weight(seen_at)
+        accumulators, removed, removals = {}, [], {}
+        async for session in self.db.get_session():
+            try:
+                if analyses:
+                    with self._observe(topics, "mood"):
+                        analyses, accumulators = await self._apply_mood_analyzed(session, analyses, seen_at, trend_weight)
+                if deletions:
+                    with self._observe(topics, "deleted"):
+                        removed, removals = await self._apply_entry_deleted(session, deletions)
+                if archetype_rows:
+                    with self._observe(topics, "archetype"):
+                        await self._write_archetype_history(session, archetype_rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        
+        for analysis_data in analyses:
+            if analysis_data["entry_id"]:
+                self.recent_entries.add(analysis_data["entry_id"])
+        for entry_id in deletions:
+            self.recent_entries.add(entry_id)
+        
+        self._invalidate_users(
+            {user_id for user_id, _ in accumulators}
+            | {user_id for user_id, _ in removals}
+            | {row["user_id"] for row in archetype_rows}
+        )
+        logger.debug(
+            "Event batch applied",
+            mood_events=len(mood_events), applied=len(analyses), summaries=len(accumulators),
+            deleted_events=len(deleted_events), removed=len(removed), archetypes=len(archetype_rows)
+        )
+    
+    @staticmethod
+    def _observe(topics: Dict[str, str], kind: str):
+        return observe_handler(topics[kind]) if kind in topics else nullcontext()
+    
+    def _invalidate_users(self, user_ids):
+        if self.cache is not None:
+            self.cache.invalidate_users(user_ids)
+    
+    @staticmethod
+    def _is_mood_analyzed(topic: str) -> bool:
+        return "mood.analyzed" in topic or "MoodAnalyzed" in topic
+    
+    @staticmethod
+    def _is_entry_deleted(topic: str) -> bool:
+        return "diary.entry.deleted" in topic or "DiaryEntryDeleted" in topic
+    
+    @staticmethod
+    def _is_archetype_updated(topic: str) -> bool:
+        return "archetype.updated" in topic or "ArchetypeUpdated" in topic
+    
     async def handle_message(self, topic: str, event_data: Dict[str, Any], correlation_id: Optional[str] = None):
-        if "mood.analyzed" in topic or "MoodAnalyzed" in topic:
-            await self.handle_mood_analyzed(event_data, correlation_id)
-        elif "archetype.updated" in topic or "ArchetypeUpdated" in topic:
-            await self.handle_archetype_updated(event_data, correlation_id)
+        with observe_handler(topic):
+            if self._is_mood_analyzed(topic):
+                await self.handle_mood_analyzed(event_data, correlation_id)
+            elif self._is_entry_deleted(topic):
+                await self.handle_entry_deleted(event_data, correlation_id)
+            elif self._is_archetype_updated(topic):
+                await self.handle_archetype_updated(event_data, correlation_id)
+    
+    async def handle_batch(self, messages: List[Tuple[str, Dict[str, Any], Optional[str]]]):
+        events = {"mood": [], "deleted": [], "archetype": []}
+        topics = {}
+        for topic, event_data, correlation_id in messages:
+            if self._is_mood_analyzed(topic):
+                kind = "mood"
+            elif self._is_entry_deleted(topic):
+                kind = "deleted"
+            elif self._is_archetype_updated(topic):
+                kind = "archetype"
+            else:
+                continue
+            events[kind].append(event_data)
+            topics.setdefault(kind, topic)
+        
+        await self._apply_batch(events["mood"], events["deleted"], events["archetype"], topics)
 
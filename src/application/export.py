@@ -0,0 +1,95 @@
+from typing import AsyncIterator, Optional
+from datetime import date
+import io
+import orjson
+import structlog
+
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.database import Database
+
+logger = structlog.get_logger()
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    ARROW_AVAILABLE = False
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+
+def arrow_schema():
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("date", pa.date32()),
+        ("emotion_vector", pa.list_(pa.float32())),
+        ("dominant_emotion", pa.string()),
+        ("average_valence", pa.float64()),
+        ("average_arousal", pa.float64()),
+        ("entry_count", pa.int32()),
+        ("total_tokens", pa.int64()),
+        ("topics", pa.list_(pa.string())),
+        ("volatility_index", pa.float64())
+    ])
+
+
+class DailyExporter:
+    def __init__(self, repository: AnalyticsRepository, db: Database, chunk_size: int = 1000):
+        self.repository = repository
+        self.db = db
+        self.chunk_size = chunk_size
+    
+    async def _chunks(self, user_id: Optional[str], start_date: Optional[date], end_date: Optional[date]):
+        async for session in self.db.get_session():
+            try:
+                async for rows in self.repository.stream_daily_rows(
+                    session, user_id, start_date, end_date, self.chunk_size
+                ):
+                    yield rows
+            finally:
+                await session.close()
+    
+    async def ndjson(
+        self, user_id: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> AsyncIterator[bytes]:
+        exported = 0
+        async for rows in self._chunks(user_id, start_date, end_date):
+            yield b"".join(
+                orjson.dumps(row._asdict(), option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+                for row in rows
+            )
+            exported += len(rows)
+        logger.info("Daily summaries exported", format="ndjson", user_id=user_id, rows=exported)
+    
+    async def arrow(
+        self, user_id: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> AsyncIterator[bytes]:
+        schema = arrow_schema()
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+        exported = 0
+        
+        async for rows in self._chunks(user_id, start_date, end_date):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            exported += len(rows)
+            yield self._take(sink)
+        
+        writer.close()
+        yield self._take(sink)
+        logger.info("Daily summaries exported", format="arrow", user_id=user_id, rows=exported)
+    
+    @staticmethod
+    def _take(sink: io.BytesIO) -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
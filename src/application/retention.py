@@ -0,0 +1,99 @@
+from typing import Dict, Optional
+from datetime import date
+import asyncio
+import structlog
+
+from src.domain.retention import expiry_cutoff, retention_cutoff
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.database import Database
+from src.infrastructure.models import DailyMoodSummary
+from src.infrastructure.partitions import drop_partitions_before
+
+logger = structlog.get_logger()
+
+
+class RetentionService:
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, daily_months: int = 0,
+        archetype_months: int = 0, batch_size: int = 5000
+    ):
+        self.repository = repository
+        self.db = db
+        self.daily_months = daily_months
+        self.archetype_months = archetype_months
+        self.batch_size = batch_size
+    
+    async def run_once(self, today: Optional[date] = None) -> Dict[str, int]:
+        today = today or date.today()
+        report = {}
+        
+        if self.db.partitioned:
+            report["partitions_created"] = len(await self.db.ensure_partitions(today))
+        
+        daily_cutoff = retention_cutoff(today, self.daily_months)
+        if daily_cutoff is not None:
+            report.update(await self._expire_daily(daily_cutoff))
+        
+        archetype_cutoff = retention_cutoff(today, self.archetype_months)
+        if archetype_cutoff is not None:
+            report["archetype_rows_compacted"] = await self._in_batches(
+                lambda session: self.repository.compact_archetype_history(session, archetype_cutoff, self.batch_size)
+            )
+        
+        logger.info("Retention applied", **report)
+        return report
+    
+    async def _expire_daily(self, cutoff: date) -> Dict[str, int]:
+        cutoff = expiry_cutoff(cutoff)
+        async for session in self.db.get_session():
+            try:
+                pending = await self.repository.count_dirty_rollups_before(session, cutoff)
+            finally:
+                await session.close()
+        if pending:
+            logger.info("Daily retention postponed until rollups catch up", pending=pending, cutoff=cutoff.isoformat())
+            return {"daily_rollups_pending": pending}
+        
+        report = {}
+        if self.db.partitioned:
+            async with self.db.engine.begin() as conn:
+                dropped = await conn.run_sync(drop_partitions_before, DailyMoodSummary.__tablename__, cutoff)
+            report["daily_partitions_dropped"] = len(dropped)
+        
+        report["daily_rows_deleted"] = await self._in_batches(
+            lambda session: self.repository.delete_daily_before(session, cutoff, self.batch_size)
+        )
+        report["daily_topics_deleted"] = await self._in_batches(
+            lambda session: self.repository.delete_daily_topics_before(session, cutoff, self.batch_size)
+        )
+        report["processed_entries_deleted"] = await self._in_batches(
+            lambda session: self.repository.delete_processed_entries_before(session, cutoff, self.batch_size)
+        )
+        return report
+    
+    async def _in_batches(self, delete_batch) -> int:
+        total = 0
+        while True:
+            async for session in self.db.get_session():
+                try:
+                    deleted = await delete_batch(session)
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+                finally:
+                    await session.close()
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+    
+    async def run(self, interval_seconds: float):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error applying retention", error=str(e), exc_info=True)
+            await asyncio.sleep(interval_seconds)
+
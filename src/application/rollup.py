@@ -0,0 +1,218 @@
+from typing import Dict, Any, List, Optional, Set, Tuple
+from collections import defaultdict
+from datetime import date, timedelta
+import asyncio
+import calendar
+import numpy as np
+import structlog
+
+from src.domain.aggregator import MoodAggregator
+from src.domain.accumulator import MoodAccumulator
+from src.domain.retention import retention_cutoff
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.database import Database
+from src.infrastructure.models import DailyMoodSummary, RollupDirtyBucket
+
+logger = structlog.get_logger()
+
+
+class RollupService:
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, batch_size: int = 500,
+        archetype_changes: bool = False, retention_months: int = 0
+    ):
+        self.repository = repository
+        self.db = db
+        self.batch_size = batch_size
+        self.archetype_changes = archetype_changes
+        self.retention_months = retention_months
+        self.aggregator = MoodAggregator()
+    
+    @staticmethod
+    def bucket_range(period: str, year: int, number: int) -> Tuple[date, date]:
+        if period == "week":
+            start = date.fromisocalendar(year, number, 1)
+            return start, start + timedelta(days=6)
+        last_day = calendar.monthrange(year, number)[1]
+        return date(year, number, 1), date(year, number, last_day)
+    
+    @staticmethod
+    def summary_to_dict(summary: DailyMoodSummary) -> Dict[str, Any]:
+        return {
+            "date": summary.date,
+            "emotion_vector": summary.emotion_vector,
+            "dominant_emotion": summary.dominant_emotion,
+            "average_valence": summary.average_valence,
+            "average_arousal": summary.average_arousal,
+            "entry_count": summary.entry_count,
+            "total_tokens": summary.total_tokens,
+            "topics": summary.topics or [],
+            "volatility_index": summary.volatility_index,
+            "stats": summary.stats
+        }
+    
+    def day_level_aggregates(self, bucket_dailies: List[List[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        rows = [(position, daily) for position, dailies in enumerate(bucket_dailies) for daily in dailies]
+        batch = self.aggregator.calculate_weekly_aggregates_batch(
+            [position for position, _ in rows],
+            np.zeros(len(rows), dtype=np.int64),
+            [daily["date"].toordinal() for _, daily in rows],
+            [daily["emotion_vector"] for _, daily in rows],
+            [daily["average_valence"] for _, daily in rows],
+            [daily["average_arousal"] for _, daily in rows],
+            [daily["entry_count"] for _, daily in rows],
+            [daily["total_tokens"] for _, daily in rows]
+        )
+        
+        day_levels: List[Optional[Dict[str, Any]]] = [None] * len(bucket_dailies)
+        for i, position in enumerate(batch["user_idx"].tolist()):
+            day_levels[position] = {
+                "volatility": float(batch["volatility"][i]),
+                "trend": str(batch["trend"][i]),
+                "most_emotional_day": date.fromordinal(int(batch["most_emotional_day"][i])).isoformat(),
+                "most_productive_day": date.fromordinal(int(batch["most_productive_day"][i])).isoformat()
+            }
+        return day_levels
+    
+    def build_weekly_row(
+        self, user_id: str, year: int, week: int, dailies: List[Dict[str, Any]], day_level: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        merged = MoodAccumulator.merge_all(MoodAccumulator.from_summary(d) for d in dailies)
+        if merged.count == 0:
+            return None
+        
+        aggregate = merged.to_aggregate()
+        
+        return {
+            "user_id": user_id,
+            "year": year,
+            "week": week,
+            "emotion_vector": aggregate["emotion_vector"],
+            "dominant_emotion": aggregate["dominant_emotion"],
+            "average_valence": aggregate["average_valence"],
+            "average_arousal": aggregate["average_arousal"],
+            "entry_count": aggregate["entry_count"],
+            "total_tokens": aggregate["total_tokens"],
+            "volatility": day_level["volatility"],
+            "trend": day_level["trend"],
+            "most_emotional_day": day_level["most_emotional_day"],
+            "most_productive_day": day_level["most_productive_day"],
+            "key_topics": aggregate["topics"],
+            "stats": merged.to_dict()
+        }
+    
+    def build_monthly_row(
+        self, user_id: str, year: int, month: int, dailies: List[Dict[str, Any]], day_level: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        merged = MoodAccumulator.merge_all(MoodAccumulator.from_summary(d) for d in dailies)
+        if merged.count == 0:
+            return None
+        
+        aggregate = merged.to_aggregate()
+        days_in_month = calendar.monthrange(year, month)[1]
+        
+        return {
+            "user_id": user_id,
+            "year": year,
+            "month": month,
+            "emotion_vector": aggregate["emotion_vector"],
+            "dominant_emotion": aggregate["dominant_emotion"],
+            "average_valence": aggregate["average_valence"],
+            "average_arousal": aggregate["average_arousal"],
+            "entry_count": aggregate["entry_count"],
+            "total_tokens": aggregate["total_tokens"],
+            "volatility": day_level["volatility"],
+            "trend": day_level["trend"],
+            "active_days": len([d for d in dailies if d["entry_count"] > 0]),
+            "average_entries_per_day": aggregate["entry_count"] / days_in_month,
+            "dominant_topics": aggregate["topics"],
+            "stats": merged.to_dict()
+        }
+    
+    async def process_dirty(self, today: Optional[date] = None) -> int:
+        async for session in self.db.get_session():
+            try:
+                buckets = await self.repository.claim_dirty_rollups(session, self.batch_size)
+                if not buckets:
+                    return 0
+                claimed = len(buckets)
+                
+                ranges = {bucket.id: self.bucket_range(bucket.period, bucket.year, bucket.number) for bucket in buckets}
+                cutoff = retention_cutoff(today or date.today(), self.retention_months)
+                if cutoff is not None:
+                    frozen = [bucket for bucket in buckets if ranges[bucket.id][1] < cutoff]
+                    if frozen:
+                        logger.info("Skipping rollups older than the retention horizon", buckets=len(frozen), cutoff=cutoff.isoformat())
+                        await self.repository.clear_dirty_rollups(session, frozen)
+                        buckets = [bucket for bucket in buckets if ranges[bucket.id][1] >= cutoff]
+                        if not buckets:
+                            await session.commit()
+                            return claimed
+                
+                users_by_range: Dict[Tuple[date, date], Set[str]] = defaultdict(set)
+                for bucket in buckets:
+                    users_by_range[ranges[bucket.id]].add(bucket.user_id)
+                
+                dailies: Dict[Tuple[str, Tuple[date, date]], List[Dict[str, Any]]] = defaultdict(list)
+                for (start, end), user_ids in sorted(users_by_range.items()):
+                    for summary in await self.repository.get_daily_summaries_for_users(session, user_ids, start, end):
+                        dailies[(summary.user_id, (start, end))].append(self.summary_to_dict(summary))
+                
+                bucket_dailies = [dailies.get((bucket.user_id, ranges[bucket.id]), []) for bucket in buckets]
+                day_levels = self.day_level_aggregates(bucket_dailies)
+                
+                weekly_rows = []
+                monthly_rows = []
+                for bucket, dailies, day_level in zip(buckets, bucket_dailies, day_levels):
+                    await self._rollup_bucket(session, bucket, dailies, day_level, weekly_rows, monthly_rows)
+                
+                if self.archetype_changes and monthly_rows:
+                    changes = await self.repository.get_archetype_changes(
+                        session, [(row["user_id"], row["year"], row["month"]) for row in monthly_rows]
+                    )
+                    for row in monthly_rows:
+                        row["archetype_change"] = changes.get((row["user_id"], row["year"], row["month"]))
+                
+                await self.repository.upsert_weekly_summaries(session, weekly_rows)
+                await self.repository.upsert_monthly_summaries(session, monthly_rows)
+                await self.repository.clear_dirty_rollups(session, buckets)
+                await session.commit()
+                
+                logger.debug("Rollups recomputed", weeks=len(weekly_rows), months=len(monthly_rows))
+                return claimed
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        return 0
+    
+    async def _rollup_bucket(
+        self, session, bucket: RollupDirtyBucket, dailies: List[Dict[str, Any]],
+        day_level: Optional[Dict[str, Any]], weekly_rows: list, monthly_rows: list
+    ):
+        if bucket.period == "week":
+            row = self.build_weekly_row(bucket.user_id, bucket.year, bucket.number, dailies, day_level) if dailies else None
+            if row:
+                weekly_rows.append(row)
+            else:
+                await self.repository.delete_weekly_summary(session, bucket.user_id, bucket.year, bucket.number)
+        else:
+            row = self.build_monthly_row(bucket.user_id, bucket.year, bucket.number, dailies, day_level) if dailies else None
+            if row:
+                monthly_rows.append(row)
+            else:
+                await self.repository.delete_monthly_summary(session, bucket.user_id, bucket.year, bucket.number)
+    
+    async def run(self, interval_seconds: float):
+        while True:
+            try:
+                processed = await self.process_dirty()
+                if processed < self.batch_size:
+                    await asyncio.sleep(interval_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error processing rollups", error=str(e), exc_info=True)
+                await asyncio.sleep(interval_seconds)
+
@@ -0,0 +1,246 @@
+from typing import Dict, List, Optional, Iterable, Any
+import math
+
+
+EMOTION_NAMES = ["joy", "trust", "fear", "surprise", "sadness", "disgust", "anger", "anticipation"]
+EMOTION_DIM = len(EMOTION_NAMES)
+MAX_TRACKED_TOPICS = 50
+TOP_TOPICS = 5
+
+
+class MoodAccumulator:
+    __slots__ = (
+        "count", "valence_mean", "valence_m2", "arousal_mean", "arousal_m2",
+        "emotion_sum", "total_tokens", "topic_counts"
+    )
+    
+    def __init__(self):
+        self.count = 0
+        self.valence_mean = 0.0
+        self.valence_m2 = 0.0
+        self.arousal_mean = 0.0
+        self.arousal_m2 = 0.0
+        self.emotion_sum = [0.0] * EMOTION_DIM
+        self.total_tokens = 0
+        self.topic_counts: Dict[str, int] = {}
+    
+    @staticmethod
+    def _emotion_vector(analysis: Dict[str, Any]) -> List[float]:
+        emotion_vector = analysis.get("emotion_vector")
+        if emotion_vector is None or len(emotion_vector) == 0:
+            return [0.0] * EMOTION_DIM
+        if len(emotion_vector) != EMOTION_DIM:
+            raise ValueError(f"emotion_vector must have {EMOTION_DIM} values, got {len(emotion_vector)}")
+        return emotion_vector
+    
+    def add(self, analysis: Dict[str, Any]) -> "MoodAccumulator":
+        emotion_vector = self._emotion_vector(analysis)
+        
+        valence = float(analysis.get("valence", 0.0))
+        arousal = float(analysis.get("arousal", 0.0))
+        
+        self.count += 1
+        delta = valence - self.valence_mean
+        self.valence_mean += delta / self.count
+        self.valence_m2 += delta * (valence - self.valence_mean)
+        
+        delta = arousal - self.arousal_mean
+        self.arousal_mean += delta / self.count
+        self.arousal_m2 += delta * (arousal - self.arousal_mean)
+        
+        for i, value in enumerate(emotion_vector):
+            self.emotion_sum[i] += float(value)
+        
+        self.total_tokens += int(analysis.get("tokens_count", 0) or 0)
+        
+        for topic in analysis.get("detected_topics") or []:
+            self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+        self._trim_topics()
+        
+        return self
+    
+    def remove(self, analysis: Dict[str, Any]) -> "MoodAccumulator":
+        emotion_vector = self._emotion_vector(analysis)
+        valence = float(analysis.get("valence", 0.0))
+        arousal = float(analysis.get("arousal", 0.0))
+        tokens = int(analysis.get("tokens_count", 0) or 0)
+        
+        if self.count == 0:
+            raise ValueError("cannot remove a contribution from an empty accumulator")
+        if self.count == 1:
+            if not self._holds_only(valence, arousal, tokens):
+                raise ValueError("contribution does not match the only remaining entry")
+            self._copy_from(MoodAccumulator())
+            return self
+        
+        self.count -= 1
+        previous = self.valence_mean
+        self.valence_mean -= (valence - previous) / self.count
+        self.valence_m2 = max(self.valence_m2 - (valence - previous) * (valence - self.valence_mean), 0.0)
+        
+        previous = self.arousal_mean
+        self.arousal_mean -= (arousal - previous) / self.count
+        self.arousal_m2 = max(self.arousal_m2 - (arousal - previous) * (arousal - self.arousal_mean), 0.0)
+        
+        for i, value in enumerate(emotion_vector):
+            self.emotion_sum[i] -= float(value)
+        
+        self.total_tokens = max(self.total_tokens - tokens, 0)
+        
+        for topic in analysis.get("detected_topics") or []:
+            remaining = self.topic_counts.get(topic, 0) - 1
+            if remaining > 0:
+                self.topic_counts[topic] = remaining
+            else:
+                self.topic_counts.pop(topic, None)
+        
+        return self
+    
+    def merge(self, other: "MoodAccumulator") -> "MoodAccumulator":
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self._copy_from(other)
+            return self
+        
+        count = self.count + other.count
+        weight = self.count * other.count / count
+        
+        delta = other.valence_mean - self.valence_mean
+        self.valence_mean += delta * other.count / count
+        self.valence_m2 += other.valence_m2 + delta * delta * weight
+        
+        delta = other.arousal_mean - self.arousal_mean
+        self.arousal_mean += delta * other.count / count
+        self.arousal_m2 += other.arousal_m2 + delta * delta * weight
+        
+        self.count = count
+        self.emotion_sum = [a + b for a, b in zip(self.emotion_sum, other.emotion_sum)]
+        self.total_tokens += other.total_tokens
+        
+        for topic, frequency in other.topic_counts.items():
+            self.topic_counts[topic] = self.topic_counts.get(topic, 0) + frequency
+        self._trim_topics()
+        
+        return self
+    
+    @classmethod
+    def merge_all(cls, accumulators: Iterable["MoodAccumulator"]) -> "MoodAccumulator":
+        merged = cls()
+        for accumulator in accumulators:
+            merged.merge(accumulator)
+        return merged
+    
+    @property
+    def emotion_vector(self) -> List[float]:
+        if self.count == 0:
+            return [0.0] * EMOTION_DIM
+        return [value / self.count for value in self.emotion_sum]
+    
+    @property
+    def dominant_emotion(self) -> str:
+        if self.count == 0:
+            return "neutral"
+        vector = self.emotion_sum
+        return EMOTION_NAMES[max(range(EMOTION_DIM), key=vector.__getitem__)]
+    
+    @property
+    def valence_std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self.valence_m2, 0.0) / self.count)
+    
+    def top_topics(self, limit: int = TOP_TOPICS) -> List[str]:
+        ranked = sorted(self.topic_counts.items(), key=lambda item: -item[1])
+        return [topic for topic, _ in ranked[:limit]]
+    
+    def to_aggregate(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {}
+        
+        return {
+            "emotion_vector": self.emotion_vector,
+            "dominant_emotion": self.dominant_emotion,
+            "average_valence": self.valence_mean,
+            "average_arousal": self.arousal_mean,
+            "entry_count": self.count,
+            "total_tokens": self.total_tokens,
+            "topics": self.top_topics(),
+            "volatility_index": self.valence_std
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n": self.count,
+            "vm": self.valence_mean,
+            "v2": self.valence_m2,
+            "am": self.arousal_mean,
+            "a2": self.arousal_m2,
+            "es": self.emotion_sum,
+            "tk": self.total_tokens,
+            "tc": self.topic_counts
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "MoodAccumulator":
+        accumulator = cls()
+        if not data:
+            return accumulator
+        
+        accumulator.count = int(data.get("n", 0))
+        accumulator.valence_mean = float(data.get("vm", 0.0))
+        accumulator.valence_m2 = float(data.get("v2", 0.0))
+        accumulator.arousal_mean = float(data.get("am", 0.0))
+        accumulator.arousal_m2 = float(data.get("a2", 0.0))
+        accumulator.emotion_sum = [float(v) for v in data.get("es", [0.0] * EMOTION_DIM)]
+        accumulator.total_tokens = int(data.get("tk", 0))
+        accumulator.topic_counts = dict(data.get("tc", {}))
+        return accumulator
+    
+    @classmethod
+    def from_summary(cls, summary: Dict[str, Any]) -> "MoodAccumulator":
+        if summary.get("stats"):
+            return cls.from_dict(summary["stats"])
+        
+        accumulator = cls()
+        count = int(summary.get("entry_count") or 0)
+        if count == 0:
+            return accumulator
+        
+        volatility = float(summary.get("volatility_index") or 0.0)
+        emotion_vector = summary.get("emotion_vector")
+        if emotion_vector is None or len(emotion_vector) == 0:
+            emotion_vector = [0.0] * EMOTION_DIM
+        
+        accumulator.count = count
+        accumulator.valence_mean = float(summary.get("average_valence") or 0.0)
+        accumulator.valence_m2 = volatility * volatility * count
+        accumulator.arousal_mean = float(summary.get("average_arousal") or 0.0)
+        accumulator.emotion_sum = [float(v) * count for v in emotion_vector]
+        accumulator.total_tokens = int(summary.get("total_tokens") or 0)
+        accumulator.topic_counts = {topic: 1 for topic in summary.get("topics") or []}
+        return accumulator
+    
+    def _holds_only(self, valence: float, arousal: float, tokens: int) -> bool:
+        return (
+            math.isclose(self.valence_mean, valence, rel_tol=1e-6, abs_tol=1e-6)
+            and math.isclose(self.arousal_mean, arousal, rel_tol=1e-6, abs_tol=1e-6)
+            and self.total_tokens == tokens
+        )
+    
+    def _copy_from(self, other: "MoodAccumulator"):
+        self.count = other.count
+        self.valence_mean = other.valence_mean
+        self.valence_m2 = other.valence_m2
+        self.arousal_mean = other.arousal_mean
+        self.arousal_m2 = other.arousal_m2
+        self.emotion_sum = list(other.emotion_sum)
+        self.total_tokens = other.total_tokens
+        self.topic_counts = dict(other.topic_counts)
+    
+    def _trim_topics(self):
+        if len(self.topic_counts) <= MAX_TRACKED_TOPICS:
+            return
+        ranked = sorted(self.topic_counts.items(), key=lambda item: -item[1])
+        self.topic_counts = dict(ranked[:MAX_TRACKED_TOPICS])
+
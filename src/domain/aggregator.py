@@ -1,12 +1,16 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import date, datetime, timedelta
 import numpy as np
 from collections import Counter
 
 import structlog
 
+from src.domain.accumulator import EMOTION_NAMES, EMOTION_DIM
+
 logger = structlog.get_logger()
 
+_EMOTION_NAMES_ARRAY = np.array(EMOTION_NAMES)
+
 
 class MoodAggregator:
     @staticmethod
@@ -23,8 +27,7 @@ class MoodAggregator:
         
         avg_emotion_vector = np.mean(emotion_vectors, axis=0).tolist()
         dominant_idx = np.argmax(avg_emotion_vector)
-        emotion_names = ["joy", "trust", "fear", "surprise", "sadness", "disgust", "anger", "anticipation"]
-        dominant_emotion = emotion_names[dominant_idx] if dominant_idx < len(emotion_names) else "neutral"
+        dominant_emotion = EMOTION_NAMES[dominant_idx] if dominant_idx < len(EMOTION_NAMES) else "neutral"
         
         volatility = np.std(valences) if len(valences) > 1 else 0.0
         
@@ -42,6 +45,171 @@ class MoodAggregator:
             "volatility_index": volatility
         }
     
+    @staticmethod
+    def _group_rows(user_idx: np.ndarray, group_idx: np.ndarray, order_idx: Optional[np.ndarray] = None):
+        keys = (group_idx, user_idx) if order_idx is None else (order_idx, group_idx, user_idx)
+        order = np.lexsort(keys)
+        users = user_idx[order]
+        groups = group_idx[order]
+        size = order.shape[0]
+        
+        boundaries = np.ones(size, dtype=bool)
+        if size:
+            np.not_equal(users[1:], users[:-1], out=boundaries[1:])
+            boundaries[1:] |= groups[1:] != groups[:-1]
+        
+        starts = np.flatnonzero(boundaries)
+        counts = np.diff(np.append(starts, size))
+        return order, starts, counts, np.cumsum(boundaries) - 1
+    
+    @staticmethod
+    def _grouped_means(
+        order: np.ndarray, starts: np.ndarray, counts: np.ndarray, group_of: np.ndarray,
+        emotion_matrix: np.ndarray, valences: np.ndarray, arousals: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        emotion_vectors = np.add.reduceat(emotion_matrix[order], starts, axis=0) / counts[:, None]
+        
+        sorted_valences = valences[order]
+        average_valence = np.add.reduceat(sorted_valences, starts) / counts
+        deviations = sorted_valences - average_valence[group_of]
+        variance = np.add.reduceat(deviations * deviations, starts) / counts
+        
+        return {
+            "emotion_vector": emotion_vectors,
+            "dominant_emotion": _EMOTION_NAMES_ARRAY[np.argmax(emotion_vectors, axis=1)],
+            "average_valence": average_valence,
+            "average_arousal": np.add.reduceat(arousals[order], starts) / counts,
+            "volatility": np.where(counts > 1, np.sqrt(variance), 0.0)
+        }
+    
+    @staticmethod
+    def _grouped_trend(sorted_valences: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        first = sorted_valences[starts]
+        last = sorted_valences[starts + counts - 1]
+        return np.where(last > first, "improving", np.where(last < first, "declining", "stable"))
+    
+    @staticmethod
+    def _grouped_first_max(values: np.ndarray, starts: np.ndarray, group_of: np.ndarray) -> np.ndarray:
+        peaks = np.maximum.reduceat(values, starts)
+        positions = np.flatnonzero(values == peaks[group_of])
+        _, first = np.unique(group_of[positions], return_index=True)
+        return positions[first]
+    
+    @staticmethod
+    def calculate_daily_aggregates_batch(
+        user_idx: np.ndarray,
+        day_idx: np.ndarray,
+        emotion_matrix: np.ndarray,
+        valences: np.ndarray,
+        arousals: np.ndarray,
+        tokens: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        user_idx = np.asarray(user_idx, dtype=np.int64)
+        day_idx = np.asarray(day_idx, dtype=np.int64)
+        emotion_matrix = np.asarray(emotion_matrix, dtype=np.float64).reshape(-1, EMOTION_DIM)
+        valences = np.asarray(valences, dtype=np.float64)
+        arousals = np.asarray(arousals, dtype=np.float64)
+        tokens = np.asarray(tokens, dtype=np.int64)
+        
+        order, starts, counts, group_of = MoodAggregator._group_rows(user_idx, day_idx)
+        means = MoodAggregator._grouped_means(order, starts, counts, group_of, emotion_matrix, valences, arousals)
+        
+        return {
+            "user_idx": user_idx[order][starts],
+            "day_idx": day_idx[order][starts],
+            "emotion_vector": means["emotion_vector"],
+            "dominant_emotion": means["dominant_emotion"],
+            "average_valence": means["average_valence"],
+            "average_arousal": means["average_arousal"],
+            "entry_count": counts,
+            "total_tokens": np.add.reduceat(tokens[order], starts),
+            "volatility_index": means["volatility"]
+        }
+    
+    @staticmethod
+    def calculate_weekly_aggregates_batch(
+        user_idx: np.ndarray,
+        week_idx: np.ndarray,
+        day_idx: np.ndarray,
+        emotion_matrix: np.ndarray,
+        valences: np.ndarray,
+        arousals: np.ndarray,
+        entry_counts: np.ndarray,
+        tokens: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        user_idx = np.asarray(user_idx, dtype=np.int64)
+        week_idx = np.asarray(week_idx, dtype=np.int64)
+        day_idx = np.asarray(day_idx, dtype=np.int64)
+        emotion_matrix = np.asarray(emotion_matrix, dtype=np.float64).reshape(-1, EMOTION_DIM)
+        valences = np.asarray(valences, dtype=np.float64)
+        arousals = np.asarray(arousals, dtype=np.float64)
+        entry_counts = np.asarray(entry_counts, dtype=np.int64)
+        tokens = np.asarray(tokens, dtype=np.int64)
+        
+        order, starts, counts, group_of = MoodAggregator._group_rows(user_idx, week_idx, day_idx)
+        means = MoodAggregator._grouped_means(order, starts, counts, group_of, emotion_matrix, valences, arousals)
+        
+        sorted_valences = valences[order]
+        sorted_entries = entry_counts[order]
+        sorted_days = day_idx[order]
+        
+        return {
+            "user_idx": user_idx[order][starts],
+            "week_idx": week_idx[order][starts],
+            "emotion_vector": means["emotion_vector"],
+            "dominant_emotion": means["dominant_emotion"],
+            "average_valence": means["average_valence"],
+            "average_arousal": means["average_arousal"],
+            "entry_count": np.add.reduceat(sorted_entries, starts),
+            "total_tokens": np.add.reduceat(tokens[order], starts),
+            "volatility": means["volatility"],
+            "trend": MoodAggregator._grouped_trend(sorted_valences, starts, counts),
+            "most_emotional_day": sorted_days[MoodAggregator._grouped_first_max(np.abs(sorted_valences), starts, group_of)],
+            "most_productive_day": sorted_days[MoodAggregator._grouped_first_max(sorted_entries, starts, group_of)]
+        }
+    
+    @staticmethod
+    def calculate_monthly_aggregates_batch(
+        user_idx: np.ndarray,
+        month_idx: np.ndarray,
+        week_idx: np.ndarray,
+        emotion_matrix: np.ndarray,
+        valences: np.ndarray,
+        arousals: np.ndarray,
+        entry_counts: np.ndarray,
+        tokens: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        user_idx = np.asarray(user_idx, dtype=np.int64)
+        month_idx = np.asarray(month_idx, dtype=np.int64)
+        week_idx = np.asarray(week_idx, dtype=np.int64)
+        emotion_matrix = np.asarray(emotion_matrix, dtype=np.float64).reshape(-1, EMOTION_DIM)
+        valences = np.asarray(valences, dtype=np.float64)
+        arousals = np.asarray(arousals, dtype=np.float64)
+        entry_counts = np.asarray(entry_counts, dtype=np.int64)
+        tokens = np.asarray(tokens, dtype=np.int64)
+        
+        order, starts, counts, group_of = MoodAggregator._group_rows(user_idx, month_idx, week_idx)
+        means = MoodAggregator._grouped_means(order, starts, counts, group_of, emotion_matrix, valences, arousals)
+        
+        sorted_entries = entry_counts[order]
+        entry_count = np.add.reduceat(sorted_entries, starts)
+        active_days = np.add.reduceat((sorted_entries > 0).astype(np.int64), starts)
+        
+        return {
+            "user_idx": user_idx[order][starts],
+            "month_idx": month_idx[order][starts],
+            "emotion_vector": means["emotion_vector"],
+            "dominant_emotion": means["dominant_emotion"],
+            "average_valence": means["average_valence"],
+            "average_arousal": means["average_arousal"],
+            "entry_count": entry_count,
+            "total_tokens": np.add.reduceat(tokens[order], starts),
+            "volatility": means["volatility"],
+            "trend": MoodAggregator._grouped_trend(valences[order], starts, counts),
+            "active_days": active_days,
+            "average_entries_per_day": np.where(active_days > 0, entry_count / 30.0, 0.0)
+        }
+    
     @staticmethod
     def calculate_weekly_aggregate(daily_summaries: List[Dict]) -> Dict:
         if not daily_summaries:
@@ -52,8 +220,7 @@ class MoodAggregator:
         
         avg_emotion_vector = np.mean(emotion_vectors, axis=0).tolist()
         dominant_idx = np.argmax(avg_emotion_vector)
-        emotion_names = ["joy", "trust", "fear", "surprise", "sadness", "disgust", "anger", "anticipation"]
-        dominant_emotion = emotion_names[dominant_idx] if dominant_idx < len(emotion_names) else "neutral"
+        dominant_emotion = EMOTION_NAMES[dominant_idx] if dominant_idx < len(EMOTION_NAMES) else "neutral"
         
         volatility = np.std(valences) if len(valences) > 1 else 0.0
         
@@ -95,8 +262,7 @@ class MoodAggregator:
         
         avg_emotion_vector = np.mean(emotion_vectors, axis=0).tolist()
         dominant_idx = np.argmax(avg_emotion_vector)
-        emotion_names = ["joy", "trust", "fear", "surprise", "sadness", "disgust", "anger", "anticipation"]
-        dominant_emotion = emotion_names[dominant_idx] if dominant_idx < len(emotion_names) else "neutral"
+        dominant_emotion = EMOTION_NAMES[dominant_idx] if dominant_idx < len(EMOTION_NAMES) else "neutral"
         
         volatility = np.std(valences) if len(valences) > 1 else 0.0
         
@@ -0,0 +1,61 @@
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime
+import base64
+
+
+class ArchetypeSegment:
+    __slots__ = ("archetype", "started_at", "ended_at", "observations", "confidence_min", "confidence_max", "confidence_sum")
+    
+    def __init__(self, archetype: str, changed_at: datetime, confidence: float):
+        self.archetype = archetype
+        self.started_at = changed_at
+        self.ended_at = changed_at
+        self.observations = 1
+        self.confidence_min = confidence
+        self.confidence_max = confidence
+        self.confidence_sum = confidence
+    
+    def extend(self, changed_at: datetime, confidence: float) -> "ArchetypeSegment":
+        self.started_at = min(self.started_at, changed_at)
+        self.ended_at = max(self.ended_at, changed_at)
+        self.observations += 1
+        self.confidence_min = min(self.confidence_min, confidence)
+        self.confidence_max = max(self.confidence_max, confidence)
+        self.confidence_sum += confidence
+        return self
+    
+    @property
+    def confidence_mean(self) -> float:
+        return self.confidence_sum / self.observations
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "archetype": self.archetype,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "observations": self.observations,
+            "confidence_min": self.confidence_min,
+            "confidence_max": self.confidence_max,
+            "confidence_mean": self.confidence_mean
+        }
+
+
+def archetype_change(previous: Optional[str], current: Optional[str]) -> Optional[str]:
+    if not current or current == previous:
+        return None
+    return f"{previous or 'none'} -> {current}"
+
+
+def encode_cursor(changed_at: datetime, row_id: str) -> str:
+    raw = f"{changed_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        changed_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(changed_at), row_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
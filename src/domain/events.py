@@ -0,0 +1,111 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, datetime, timezone
+import json
+
+from src.domain.accumulator import EMOTION_DIM
+
+TIMESTAMP_FIELDS = ("analyzed_at", "created_at", "timestamp")
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000.0 if value > 1e11 else float(value)
+        return datetime.fromtimestamp(seconds, tz=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def event_date(event_data: Dict[str, Any], payload: Dict[str, Any], default: Optional[date] = None) -> date:
+    metadata = event_data.get("metadata") or {}
+    for source in (payload, event_data, metadata):
+        for field in TIMESTAMP_FIELDS:
+            timestamp = parse_timestamp(source.get(field))
+            if timestamp is not None:
+                return timestamp.astimezone(timezone.utc).date()
+    return default or date.today()
+
+
+def parse_mood_analyzed(event_data: Dict[str, Any], default_date: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    payload = event_data.get("payload", {})
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    
+    user_id = payload.get("user_id")
+    if not user_id:
+        return None
+    
+    return {
+        "user_id": user_id,
+        "entry_id": payload.get("entry_id"),
+        "date": event_date(event_data, payload, default_date),
+        "emotion_vector": parse_emotion_vector(payload.get("emotion_vector")),
+        "dominant_emotion": payload.get("dominant_emotion", "neutral"),
+        "valence": float(payload.get("valence") or 0.0),
+        "arousal": float(payload.get("arousal") or 0.0),
+        "tokens_count": int(payload.get("tokens_count") or 0),
+        "detected_topics": parse_topics(payload.get("detected_topics"))
+    }
+
+
+def entry_contribution(analysis_data: Dict[str, Any], trend_weight: float = 0.0) -> Dict[str, Any]:
+    return {
+        "emotion_vector": analysis_data["emotion_vector"],
+        "valence": analysis_data["valence"],
+        "arousal": analysis_data["arousal"],
+        "tokens_count": analysis_data["tokens_count"],
+        "detected_topics": analysis_data["detected_topics"],
+        "trend_weight": trend_weight
+    }
+
+
+def parse_emotion_vector(value: Any) -> List[float]:
+    if value is None or (isinstance(value, list) and len(value) == 0):
+        return [0.0] * EMOTION_DIM
+    if not isinstance(value, list) or len(value) != EMOTION_DIM:
+        raise ValueError(f"emotion_vector must have {EMOTION_DIM} values, got {value!r}")
+    return [float(component) for component in value]
+
+
+def parse_topics(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(topic, str) for topic in value):
+        raise ValueError(f"detected_topics must be a list of strings, got {value!r}")
+    return value
+
+
+def parse_entry_deleted(event_data: Dict[str, Any], default_date: Optional[date] = None) -> Optional[Tuple[str, str, date]]:
+    payload = event_data.get("payload", {})
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    
+    entry_id = payload.get("entry_id") or payload.get("id")
+    user_id = payload.get("user_id")
+    if not entry_id or not user_id:
+        return None
+    return entry_id, user_id, event_date(event_data, payload, default_date)
+
+
+def parse_archetype_updated(event_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    payload = event_data.get("payload", {})
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    
+    user_id = payload.get("user_id")
+    archetype = payload.get("archetype")
+    if not user_id or not archetype:
+        return None
+    return {
+        "user_id": user_id,
+        "archetype": archetype,
+        "confidence": payload.get("confidence", 0.0),
+        "model_version": payload.get("model_version", "unknown")
+    }
+
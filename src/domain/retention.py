@@ -0,0 +1,22 @@
+from typing import Optional
+from datetime import date, timedelta
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_cutoff(today: date, months: int) -> Optional[date]:
+    if months <= 0:
+        return None
+    return add_months(month_start(today), -months)
+
+
+def expiry_cutoff(cutoff: date) -> date:
+    return cutoff - timedelta(days=cutoff.weekday())
+
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+
+DEFAULT_LANDMARK = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MAX_HALF_LIVES = 960
+
+
+class TopicTrending:
+    def __init__(self, half_life_days: float = 7.0, landmark: datetime = DEFAULT_LANDMARK):
+        if half_life_days <= 0:
+            raise ValueError("half_life_days must be positive")
+        if landmark.tzinfo is None:
+            landmark = landmark.replace(tzinfo=timezone.utc)
+        
+        self.half_life_seconds = half_life_days * 86400.0
+        self.landmark = landmark
+    
+    def weight(self, at: datetime) -> float:
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        return 2.0 ** ((at - self.landmark).total_seconds() / self.half_life_seconds)
+    
+    @property
+    def horizon(self) -> datetime:
+        return self.landmark + timedelta(seconds=self.half_life_seconds * MAX_HALF_LIVES)
+    
+    def rebase_factor(self, landmark: datetime) -> float:
+        return 1.0 / self.weight(landmark)
+    
+    def decayed(self, score: float, at: datetime) -> float:
+        return (score or 0.0) / self.weight(at)
+
@@ -2,10 +2,11 @@ import asyncio
 import sys
 import os
 from pathlib import Path
-from concurrent import futures
+from typing import Optional, List, Dict, Tuple
 
 import grpc
 from grpc import aio
+from google.protobuf.timestamp_pb2 import Timestamp
 import structlog
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "proto" / "generated"))
@@ -13,87 +14,239 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "proto" / "generated"))
 from src.config import Config
 from src.infrastructure.database import Database
 from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.cache import UserCache
+from src.infrastructure.metrics import observe_rpc
+from src.application.archetype_timeline import ArchetypeTimeline
 
 logger = structlog.get_logger()
 
 try:
-    from analytics_pb2 import GetUserStatisticsRequest, GetUserStatisticsResponse
+    from analytics_pb2 import (
+        GetUserStatisticsRequest, GetUserStatisticsResponse,
+        GetUserStatisticsBatchRequest, GetUserStatisticsBatchResponse, UserStatistics,
+        GetArchetypeTimelineRequest, GetArchetypeTimelineResponse, ArchetypeSegment
+    )
     from analytics_pb2_grpc import AnalyticsServiceServicer, add_AnalyticsServiceServicer_to_server
+    GRPC_STUBS_AVAILABLE = True
 except ImportError:
-    logger.warning("Proto files not generated. Run: python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. proto/analytics.proto")
-    sys.exit(1)
+    logger.warning("Proto files not generated. Run: python -m grpc_tools.protoc -Iproto --python_out=proto/generated --grpc_python_out=proto/generated proto/analytics.proto")
+    AnalyticsServiceServicer = object
+    GRPC_STUBS_AVAILABLE = False
 
 
 class AnalyticsServiceServicerImpl(AnalyticsServiceServicer):
-    def __init__(self, repository: AnalyticsRepository, db: Database):
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, cache: Optional[UserCache] = None,
+        batch_chunk_size: int = 200, batch_max_concurrency: int = 4
+    ):
         self.repository = repository
         self.db = db
+        self.cache = cache
+        self.batch_chunk_size = batch_chunk_size
+        self.batch_semaphore = asyncio.Semaphore(batch_max_concurrency)
+        self.archetype_timeline = ArchetypeTimeline(repository, db)
     
+    async def _load_user_statistics(self, user_id: str) -> Optional[dict]:
+        async for session in self.db.get_session():
+            try:
+                return await self.repository.get_user_statistics(session, user_id)
+            finally:
+                await session.close()
+    
+    async def _load_statistics_chunk(self, user_ids: List[str]) -> Dict[str, dict]:
+        async with self.batch_semaphore:
+            async for session in self.db.get_session():
+                try:
+                    return await self.repository.get_user_statistics_batch(session, user_ids)
+                finally:
+                    await session.close()
+    
+    def _split_cached(self, user_ids: List[str]) -> Tuple[Dict[str, dict], List[List[str]]]:
+        cached = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            stats = self.cache.get(user_id, "statistics") if self.cache is not None else None
+            if stats is not None:
+                cached[user_id] = stats
+            else:
+                missing.append(user_id)
+        
+        chunks = [missing[i:i + self.batch_chunk_size] for i in range(0, len(missing), self.batch_chunk_size)]
+        return cached, chunks
+    
+    @staticmethod
+    def _build_statistics_response(stats: dict) -> GetUserStatisticsResponse:
+        profile_created_at = Timestamp()
+        profile_created_at.FromDatetime(stats["profile_created_at"])
+        
+        last_personality_update = Timestamp()
+        last_personality_update.FromDatetime(stats["last_personality_update"])
+        
+        return GetUserStatisticsResponse(
+            total_diary_entries=stats["total_diary_entries"],
+            total_mood_analyses=stats["total_mood_analyses"],
+            total_tokens=stats["total_tokens"],
+            dominant_emotion=stats["dominant_emotion"],
+            top_topics=stats["top_topics"],
+            profile_created_at=profile_created_at,
+            last_personality_update=last_personality_update
+        )
+    
+    @observe_rpc
     async def GetUserStatistics(self, request: GetUserStatisticsRequest, context) -> GetUserStatisticsResponse:
         try:
             user_id = request.user_id
             logger.info("Getting user statistics", user_id=user_id)
             
-            async for session in self.db.get_session():
-                try:
-                    stats = await self.repository.get_user_statistics(session, user_id)
-                    if not stats:
-                        context.set_code(grpc.StatusCode.NOT_FOUND)
-                        context.set_details("User not found")
-                        return GetUserStatisticsResponse()
-                    
-                    from google.protobuf.timestamp_pb2 import Timestamp
-                    from datetime import datetime
-                    
-                    profile_created_at = Timestamp()
-                    profile_created_at.FromDatetime(stats["profile_created_at"])
-                    
-                    last_personality_update = Timestamp()
-                    last_personality_update.FromDatetime(stats["last_personality_update"])
-                    
-                    return GetUserStatisticsResponse(
-                        total_diary_entries=stats["total_diary_entries"],
-                        total_mood_analyses=stats["total_mood_analyses"],
-                        total_tokens=stats["total_tokens"],
-                        dominant_emotion=stats["dominant_emotion"],
-                        top_topics=stats["top_topics"],
-                        profile_created_at=profile_created_at,
-                        last_personality_update=last_personality_update
-                    )
-                finally:
-                    await session.close()
+            if self.cache is not None:
+                stats = await self.cache.get_or_load(user_id, "statistics", lambda: self._load_user_statistics(user_id))
+            else:
+                stats = await self._load_user_statistics(user_id)
+            
+            if not stats:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details("User not found")
+                return GetUserStatisticsResponse()
+            
+            return self._build_statistics_response(stats)
         except Exception as e:
             logger.error("Error getting user statistics", error=str(e), exc_info=True)
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Internal error: {str(e)}")
             return GetUserStatisticsResponse()
+    
+    @observe_rpc
+    async def GetUserStatisticsBatch(
+        self, request: GetUserStatisticsBatchRequest, context
+    ) -> GetUserStatisticsBatchResponse:
+        try:
+            logger.info("Getting user statistics batch", users=len(request.user_ids))
+            
+            statistics, chunks = self._split_cached(list(request.user_ids))
+            for loaded in await asyncio.gather(*(self._load_statistics_chunk(chunk) for chunk in chunks)):
+                statistics.update(loaded)
+            
+            return GetUserStatisticsBatchResponse(users=[
+                UserStatistics(user_id=user_id, statistics=self._build_statistics_response(statistics[user_id]))
+                for user_id in dict.fromkeys(request.user_ids)
+            ])
+        except Exception as e:
+            logger.error("Error getting user statistics batch", error=str(e), exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Internal error: {str(e)}")
+            return GetUserStatisticsBatchResponse()
+    
+    @observe_rpc
+    async def StreamUserStatistics(self, request: GetUserStatisticsBatchRequest, context):
+        logger.info("Streaming user statistics", users=len(request.user_ids))
+        
+        cached, chunks = self._split_cached(list(request.user_ids))
+        for user_id, stats in cached.items():
+            yield UserStatistics(user_id=user_id, statistics=self._build_statistics_response(stats))
+        
+        tasks = [asyncio.ensure_future(self._load_statistics_chunk(chunk)) for chunk in chunks]
+        try:
+            for next_chunk in asyncio.as_completed(tasks):
+                for user_id, stats in (await next_chunk).items():
+                    yield UserStatistics(user_id=user_id, statistics=self._build_statistics_response(stats))
+        except Exception as e:
+            logger.error("Error streaming user statistics", error=str(e), exc_info=True)
+            await context.abort(grpc.StatusCode.INTERNAL, f"Internal error: {str(e)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    @staticmethod
+    def _build_segment(segment) -> ArchetypeSegment:
+        started_at = Timestamp()
+        started_at.FromDatetime(segment.started_at)
+        
+        ended_at = Timestamp()
+        ended_at.FromDatetime(segment.ended_at)
+        
+        return ArchetypeSegment(
+            archetype=segment.archetype,
+            started_at=started_at,
+            ended_at=ended_at,
+            observations=segment.observations,
+            confidence_min=segment.confidence_min,
+            confidence_max=segment.confidence_max,
+            confidence_mean=segment.confidence_mean
+        )
+    
+    @observe_rpc
+    async def GetArchetypeTimeline(
+        self, request: GetArchetypeTimelineRequest, context
+    ) -> GetArchetypeTimelineResponse:
+        try:
+            limit = min(request.limit or 50, 500)
+            segments, next_cursor = await self.archetype_timeline.page(
+                request.user_id, limit, request.cursor or None, request.newest_first
+            )
+            return GetArchetypeTimelineResponse(
+                segments=[self._build_segment(segment) for segment in segments],
+                next_cursor=next_cursor or ""
+            )
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return GetArchetypeTimelineResponse()
+        except Exception as e:
+            logger.error("Error getting archetype timeline", error=str(e), exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Internal error: {str(e)}")
+            return GetArchetypeTimelineResponse()
 
 
-async def serve():
-    config = Config()
+def create_grpc_server(
+    config: Config, repository: AnalyticsRepository, db: Database,
+    cache: Optional[UserCache] = None, port: Optional[int] = None
+) -> Tuple[aio.Server, int]:
+    if not GRPC_STUBS_AVAILABLE:
+        raise RuntimeError("gRPC stubs are not generated")
     
-    db = Database(config.database_url)
-    await db.initialize()
+    server = aio.server(
+        maximum_concurrent_rpcs=config.grpc_max_concurrent_rpcs,
+        options=[
+            ("grpc.keepalive_time_ms", config.grpc_keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", config.grpc_keepalive_timeout_ms),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.min_ping_interval_without_data_ms", config.grpc_keepalive_time_ms),
+            ("grpc.http2.max_pings_without_data", 0),
+            ("grpc.max_concurrent_streams", config.grpc_max_concurrent_rpcs)
+        ]
+    )
     
-    repository = AnalyticsRepository(db)
+    servicer = AnalyticsServiceServicerImpl(
+        repository, db, cache=cache,
+        batch_chunk_size=config.grpc_batch_chunk_size,
+        batch_max_concurrency=config.grpc_batch_max_concurrency
+    )
+    add_AnalyticsServiceServicer_to_server(servicer, server)
     
-    server = aio.server(futures.ThreadPoolExecutor(max_workers=10))
+    listen_addr = f'{config.grpc_host}:{config.grpc_port if port is None else port}'
+    bound_port = server.add_insecure_port(listen_addr)
+    return server, bound_port
+
+
+async def serve():
+    config = Config()
     
-    servicer = AnalyticsServiceServicerImpl(repository, db)
-    add_AnalyticsServiceServicer_to_server(servicer, server)
+    db = Database(config)
+    repository = AnalyticsRepository(db)
+    cache = UserCache(config.cache_max_weight, config.cache_ttl_seconds)
     
-    grpc_port = config.grpc_port
-    listen_addr = f'0.0.0.0:{grpc_port}'
-    server.add_insecure_port(listen_addr)
+    server, grpc_port = create_grpc_server(config, repository, db, cache)
     
     logger.info("Starting gRPC server", port=grpc_port)
     await server.start()
     
     try:
         await server.wait_for_termination()
-    except KeyboardInterrupt:
+    finally:
         logger.info("Shutting down gRPC server")
-        await server.stop(5)
+        await server.stop(config.grpc_shutdown_grace_seconds)
+        await db.close()
 
 
 if __name__ == '__main__':
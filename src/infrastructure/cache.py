@@ -0,0 +1,166 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+import time
+
+
+class UserCache:
+    def __init__(self, max_weight: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_weight = max_weight
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, int, Any]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[Tuple[str, Hashable]]] = {}
+        self._inflight: Dict[str, List[List[bool]]] = {}
+        self._invalidation_listeners: List[Callable[[List[str]], None]] = []
+        self._weight = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def weigh(value: Any) -> int:
+        if isinstance(value, (list, tuple)):
+            return max(len(value), 1)
+        if isinstance(value, dict):
+            return max([len(v) for v in value.values() if isinstance(v, (list, tuple))] + [1])
+        return 1
+    
+    def get(self, user_id: str, key: Hashable) -> Optional[Any]:
+        cache_key = (user_id, key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, _, value = entry
+        if expires_at <= self.clock():
+            self._remove(cache_key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return value
+    
+    def set(self, user_id: str, key: Hashable, value: Any):
+        weight = self.weigh(value)
+        if weight > self.max_weight:
+            return
+        
+        cache_key = (user_id, key)
+        if cache_key in self._entries:
+            self._remove(cache_key)
+        
+        self._entries[cache_key] = (self.clock() + self.ttl_seconds, weight, value)
+        self._keys_by_user.setdefault(user_id, set()).add(cache_key)
+        self._weight += weight
+        
+        while self._weight > self.max_weight:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    async def get_or_load(self, user_id: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(user_id, key)
+        if value is not None:
+            return value
+        
+        still_valid = [True]
+        self._inflight.setdefault(user_id, []).append(still_valid)
+        try:
+            value = await loader()
+        finally:
+            loads = [load for load in self._inflight[user_id] if load is not still_valid]
+            if loads:
+                self._inflight[user_id] = loads
+            else:
+                del self._inflight[user_id]
+        
+        if value is not None and still_valid[0]:
+            self.set(user_id, key, value)
+        return value
+    
+    def invalidate_user(self, user_id: str):
+        for still_valid in self._inflight.get(user_id, ()):
+            still_valid[0] = False
+        
+        keys = self._keys_by_user.pop(user_id, None)
+        if not keys:
+            return
+        
+        for cache_key in keys:
+            entry = self._entries.pop(cache_key, None)
+            if entry is not None:
+                self._weight -= entry[1]
+        self.invalidations += 1
+    
+    def invalidate_users(self, user_ids: Iterable[str], propagate: bool = True):
+        user_ids = sorted(set(user_ids))
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+        
+        if propagate and user_ids:
+            for listener in self._invalidation_listeners:
+                listener(user_ids)
+    
+    def add_invalidation_listener(self, listener: Callable[[List[str]], None]):
+        self._invalidation_listeners.append(listener)
+    
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_user.clear()
+        self._weight = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "weight": self._weight,
+            "max_weight": self.max_weight,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+    
+    def _remove(self, cache_key: Tuple[str, Hashable]):
+        _, weight, _ = self._entries.pop(cache_key)
+        self._weight -= weight
+        user_keys = self._keys_by_user.get(cache_key[0])
+        if user_keys is not None:
+            user_keys.discard(cache_key)
+            if not user_keys:
+                del self._keys_by_user[cache_key[0]]
+
+
+class RecentIds:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+    
+    def __contains__(self, item: str) -> bool:
+        if item not in self._ids:
+            return False
+        self._ids.move_to_end(item)
+        return True
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def add(self, item: str):
+        self._ids[item] = None
+        self._ids.move_to_end(item)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+    
+    def discard(self, item: str):
+        self._ids.pop(item, None)
+
@@ -1,10 +1,14 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
-from typing import AsyncGenerator
+from sqlalchemy import text, inspect
+from typing import AsyncGenerator, Optional
+from datetime import date
 import structlog
 
 from src.config import Config
+from src.infrastructure.types import EMOTION_VECTOR_STORAGES
+from src.infrastructure.partitions import declare_partitioning, ensure_partitions
+from src.domain.retention import add_months, month_start
 
 logger = structlog.get_logger()
 
@@ -13,12 +17,18 @@ Base = declarative_base()
 class Database:
     def __init__(self, config: Config):
         self.config = config
-        self.engine = create_async_engine(
-            config.database_url,
-            pool_size=config.database_pool_size,
-            max_overflow=config.database_max_overflow,
-            echo=False
-        )
+        if config.database_url.startswith("sqlite"):
+            self.engine = create_async_engine(config.database_url, echo=False)
+        else:
+            self.engine = create_async_engine(
+                config.database_url,
+                pool_size=config.database_pool_size,
+                max_overflow=config.database_max_overflow,
+                echo=False
+            )
+        if config.emotion_vector_storage not in EMOTION_VECTOR_STORAGES:
+            raise ValueError(f"Unknown emotion_vector_storage: {config.emotion_vector_storage}")
+        self.engine.dialect.emotion_vector_storage = config.emotion_vector_storage
         self.async_session_maker = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
@@ -58,15 +68,46 @@ class Database:
         except Exception as e:
             logger.warning("Could not create database automatically", error=str(e))
     
+    @property
+    def partitioned(self) -> bool:
+        return self.config.database_partitioning and self.engine.dialect.name == "postgresql"
+    
     async def create_tables(self):
         try:
+            metadata = declare_partitioning(Base.metadata) if self.partitioned else Base.metadata
             async with self.engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(metadata.create_all)
+                await conn.run_sync(self._add_missing_columns)
+                await conn.run_sync(self._add_missing_indexes)
+            if self.partitioned:
+                await self.ensure_partitions()
             logger.info("Tables created successfully")
         except Exception as e:
             logger.error("Error creating tables", error=str(e))
             raise
     
+    @staticmethod
+    def _add_missing_columns(sync_conn):
+        inspector = inspect(sync_conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                default_value = getattr(column.server_default, "arg", None)
+                default = f" DEFAULT {default_value}" if isinstance(default_value, str) else ""
+                sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+                logger.info("Column added", table=table.name, column=column.name)
+    
+    async def ensure_partitions(self, today: Optional[date] = None):
+        if not self.partitioned:
+            return []
+        first_month = month_start(today or date.today())
+        last_month = add_months(first_month, self.config.database_partition_months_ahead)
+        async with self.engine.begin() as conn:
+            return await conn.run_sync(ensure_partitions, first_month, last_month)
+    
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
         async with self.async_session_maker() as session:
             try:
@@ -76,4 +117,15 @@ class Database:
     
     async def close(self):
         await self.engine.dispose()
+    
+    @staticmethod
+    def _add_missing_indexes(sync_conn):
+        inspector = inspect(sync_conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                index.create(sync_conn)
+                logger.info("Index added", table=table.name, index=index.name)
 
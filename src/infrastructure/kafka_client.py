@@ -1,27 +1,115 @@
+import asyncio
+import functools
 import json
-from typing import Dict, Any, Optional, Callable
-from confluent_kafka import Consumer, KafkaException
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Deque, Dict, Any, Iterable, Optional, Callable, List, Set, Tuple
+from confluent_kafka import Consumer, Producer, KafkaException, TopicPartition
 import structlog
 
 from src.config import Config
+from src.infrastructure.cache import UserCache
+from src.infrastructure.metrics import KAFKA_BATCH_SIZE, KAFKA_DEAD_LETTERS, KAFKA_MESSAGES, record_kafka_statistics
 
 logger = structlog.get_logger()
 
 
+class OffsetTracker:
+    def __init__(self):
+        self._pending: Dict[Tuple[str, int], Deque[int]] = {}
+        self._done: Dict[Tuple[str, int], Set[int]] = {}
+        self._next: Dict[Tuple[str, int], int] = {}
+        self._committed: Dict[Tuple[str, int], int] = {}
+        self._generations: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, topic: str, partition: int, offset: int) -> int:
+        key = (topic, partition)
+        with self._lock:
+            self._pending.setdefault(key, deque()).append(offset)
+            self._done.setdefault(key, set())
+            self._next[key] = max(self._next.get(key, 0), offset + 1)
+            return self._generations.get(key, 0)
+    
+    def done(self, topic: str, partition: int, offset: int, generation: int = 0):
+        key = (topic, partition)
+        with self._lock:
+            if key not in self._pending or self._generations.get(key, 0) != generation:
+                return
+            pending = self._pending[key]
+            done = self._done[key]
+            done.add(offset)
+            while pending and pending[0] in done:
+                done.discard(pending.popleft())
+    
+    def committable(self) -> Dict[Tuple[str, int], int]:
+        offsets = {}
+        with self._lock:
+            for key, pending in self._pending.items():
+                position = pending[0] if pending else self._next[key]
+                if position > self._committed.get(key, -1):
+                    offsets[key] = position
+                    self._committed[key] = position
+        return offsets
+    
+    def forget(self, keys: Iterable[Tuple[str, int]]):
+        with self._lock:
+            for key in keys:
+                for state in (self._pending, self._done, self._next, self._committed):
+                    state.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+
 class KafkaConsumer:
-    def __init__(self, config: Config, message_handler: Callable):
+    def __init__(
+        self, config: Config, message_handler: Callable, batch_handler: Optional[Callable] = None,
+        before_commit: Optional[Callable] = None
+    ):
         self.config = config
         self.message_handler = message_handler
+        self.batch_handler = batch_handler
+        self.before_commit = before_commit
+        self.batch_max_messages = config.kafka_batch_max_messages
+        self.batch_max_wait = config.kafka_batch_max_wait_ms / 1000.0
+        self.queue_max_messages = config.kafka_queue_max_messages
+        self.workers = config.kafka_workers
+        self.batch_max_attempts = max(config.kafka_batch_max_attempts, 1)
+        self.dead_letter_topic = config.kafka_dead_letter_topic
+        self.poll_timeout = 1.0
+        self.retry_backoff = 1.0
         
         self.consumer_config = {
             'bootstrap.servers': ','.join(config.kafka_brokers),
             'group.id': config.kafka_consumer_group,
             'auto.offset.reset': 'earliest',
-            'enable.auto.commit': False
+            'enable.auto.commit': False,
+            'statistics.interval.ms': config.kafka_statistics_interval_ms,
+            'stats_cb': self._on_statistics
         }
         
         self.consumer = None
+        self.producer = None
         self.running = False
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots = threading.BoundedSemaphore(self.queue_max_messages)
+        self._commit_requests: "queue.SimpleQueue[List[TopicPartition]]" = queue.SimpleQueue()
+        self._poll_thread: Optional[threading.Thread] = None
+        self._tracker = OffsetTracker()
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._assigned: Set[Tuple[str, int]] = set()
+        self._worker_queues: List[asyncio.Queue] = []
+        self._worker_items: List[list] = []
+        self._worker_tasks: List[asyncio.Task] = []
     
     def start(self):
         if self.running:
@@ -35,7 +123,9 @@ class KafkaConsumer:
                 self.config.diary_entry_deleted_topic,
                 self.config.archetype_updated_topic
             ]
-            self.consumer.subscribe(topics)
+            self.consumer.subscribe(topics, on_assign=self._on_assign, on_revoke=self._on_revoke)
+            if self.dead_letter_topic:
+                self.producer = Producer({'bootstrap.servers': ','.join(self.config.kafka_brokers)})
             self.running = True
             logger.info("Kafka consumer started", topics=topics)
         except KafkaException as e:
@@ -46,49 +136,469 @@ class KafkaConsumer:
         if not self.running:
             return
         self.running = False
-        if self.consumer:
+        if self._poll_thread and self._poll_thread.is_alive():
+            self._poll_thread.join(timeout=self.poll_timeout * 5)
+        elif self.consumer:
             self.consumer.close()
+        if self.producer:
+            self.producer.flush(self.poll_timeout * 5)
         logger.info("Kafka consumer stopped")
     
     async def consume_loop(self):
-        import asyncio
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_max_messages)
+        self._poll_thread = threading.Thread(target=self._poll_worker, name="kafka-poller", daemon=True)
+        self._poll_thread.start()
+        
+        if self.workers > 1:
+            await self._consume_concurrently()
+            return
+        
+        if self.batch_handler:
+            await self._consume_batches()
+            return
         
         while self.running:
             try:
-                msg = self.consumer.poll(timeout=1.0)
-                if msg is None:
-                    await asyncio.sleep(0.1)
-                    continue
+                msg = await self._take()
+                await self._process_message(msg)
+                await self._before_commit()
+                self._request_commit([msg])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error in consume loop", error=str(e), exc_info=True)
+                await asyncio.sleep(1)
+    
+    async def _consume_batches(self):
+        while self.running:
+            try:
+                msgs = await self._next_batch()
                 
-                if msg.error():
-                    logger.error("Consumer error", error=str(msg.error()))
-                    continue
+                batch = []
+                for msg in msgs:
+                    decoded = self._decode_message(msg)
+                    if decoded:
+                        batch.append(decoded)
                 
-                try:
-                    await self._process_message(msg)
-                    self.consumer.commit(asynchronous=False)
-                except Exception as e:
-                    logger.error("Error processing message", error=str(e), exc_info=True)
+                if batch:
+                    await self._handle_batch_with_retry(batch)
+                await self._before_commit()
+                self._request_commit(msgs)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error("Error in consume loop", error=str(e), exc_info=True)
                 await asyncio.sleep(1)
     
-    async def _process_message(self, msg):
+    async def _consume_concurrently(self):
+        self._in_flight = asyncio.Semaphore(self.queue_max_messages)
+        self._worker_queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._worker_items = [[] for _ in range(self.workers)]
+        self._worker_tasks = [self._start_worker(index) for index in range(self.workers)]
+        
         try:
-            value = msg.value().decode('utf-8')
-            data = json.loads(value)
-            topic = msg.topic()
+            while self.running:
+                try:
+                    msg = await self._take()
+                    await self._in_flight.acquire()
+                    generation = self._tracker.add(msg.topic(), msg.partition(), msg.offset())
+                    
+                    decoded = self._decode_message(msg)
+                    if decoded is None:
+                        self._complete([(msg, generation)])
+                        continue
+                    self._worker_queues[self._worker_index(msg, decoded)].put_nowait((msg, decoded, generation))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error("Error in consume loop", error=str(e), exc_info=True)
+                    await asyncio.sleep(1)
+        finally:
+            workers = self._worker_tasks
+            self._worker_tasks = []
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    def _start_worker(self, index: int) -> asyncio.Task:
+        worker = asyncio.create_task(self._keyed_worker(index))
+        worker.add_done_callback(functools.partial(self._worker_stopped, index))
+        return worker
+    
+    def _worker_stopped(self, index: int, worker: asyncio.Task):
+        if worker.cancelled() or not self.running or worker not in self._worker_tasks:
+            return
+        
+        held = self._worker_items[index]
+        logger.error("Keyed worker stopped, restarting it", worker=index, held=len(held), error=repr(worker.exception()))
+        worker_queue = asyncio.Queue()
+        for item in held:
+            worker_queue.put_nowait(item)
+        while not self._worker_queues[index].empty():
+            worker_queue.put_nowait(self._worker_queues[index].get_nowait())
+        held.clear()
+        self._worker_queues[index] = worker_queue
+        self._worker_tasks[index] = self._start_worker(index)
+    
+    async def _keyed_worker(self, index: int):
+        held = self._worker_items[index]
+        while True:
+            worker_queue = self._worker_queues[index]
+            items = [await worker_queue.get()]
+            while len(items) < self.batch_max_messages and not worker_queue.empty():
+                items.append(worker_queue.get_nowait())
+            held[:] = items
             
-            correlation_id = None
-            if isinstance(data, dict):
-                if "metadata" in data:
-                    correlation_id = data["metadata"].get("correlation_id")
-                elif "correlation_id" in data:
-                    correlation_id = data.get("correlation_id")
+            if self.batch_handler:
+                await self._handle_batch_with_retry([decoded for _, decoded, _ in items])
+            else:
+                for _, decoded, _ in items:
+                    await self._handle_decoded(decoded)
+            await self._before_commit()
+            self._complete([(msg, generation) for msg, _, generation in items])
+            held.clear()
+    
+    def _worker_index(self, msg, decoded) -> int:
+        _, data, _ = decoded
+        payload = data.get("payload") if isinstance(data, dict) else None
+        if isinstance(payload, str):
+            try:
+                payload = json.loads(payload)
+            except json.JSONDecodeError:
+                payload = None
+        
+        user_id = payload.get("user_id") if isinstance(payload, dict) else None
+        key = str(user_id) if user_id else f"{msg.topic()}:{msg.partition()}"
+        return zlib.crc32(key.encode("utf-8")) % self.workers
+    
+    def _complete(self, items):
+        for msg, generation in items:
+            self._tracker.done(msg.topic(), msg.partition(), msg.offset(), generation)
+            self._in_flight.release()
+        
+        offsets = self._tracker.committable()
+        if offsets:
+            self._commit_requests.put([
+                TopicPartition(topic, partition, offset)
+                for (topic, partition), offset in offsets.items()
+            ])
+    
+    async def _before_commit(self):
+        if self.before_commit is None:
+            return
+        
+        delay = self.retry_backoff
+        while True:
+            try:
+                await self.before_commit()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to flush before committing offsets", error=str(e), exc_info=True)
+                if not self.running:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+    
+    async def _handle_batch_with_retry(self, batch):
+        KAFKA_BATCH_SIZE.observe(len(batch))
+        error = await self._attempt(batch)
+        if error is None:
+            return
+        if len(batch) == 1:
+            await self._dead_letter(batch[0], error)
+            return
+        
+        logger.warning("Batch keeps failing, handling its messages one by one", batch_size=len(batch))
+        for item in batch:
+            error = await self._attempt([item])
+            if error is not None:
+                await self._dead_letter(item, error)
+    
+    async def _attempt(self, batch) -> Optional[Exception]:
+        delay = self.retry_backoff
+        for attempt in range(1, self.batch_max_attempts + 1):
+            try:
+                await self.batch_handler(batch)
+                return None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error processing batch", error=str(e), batch_size=len(batch), attempt=attempt, exc_info=True)
+                if not self.running:
+                    raise
+                if attempt == self.batch_max_attempts:
+                    return e
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+    
+    async def _dead_letter(self, item, error: Exception):
+        topic, data, correlation_id = item
+        KAFKA_DEAD_LETTERS.labels(topic).inc()
+        if self.producer is None:
+            logger.error("Skipping message that keeps failing", topic=topic, correlation_id=correlation_id, error=str(error))
+            return
+        
+        delay = self.retry_backoff
+        while True:
+            try:
+                await asyncio.to_thread(self._produce_dead_letter, topic, data, error)
+                logger.error(
+                    "Message sent to dead-letter topic",
+                    topic=topic, dead_letter_topic=self.dead_letter_topic, correlation_id=correlation_id, error=str(error)
+                )
+                return
+            except KafkaException as e:
+                logger.error("Failed to publish to dead-letter topic", error=str(e))
+                if not self.running:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+    
+    def _produce_dead_letter(self, topic: str, data: Any, error: Exception):
+        self.producer.produce(
+            self.dead_letter_topic,
+            value=json.dumps(data).encode("utf-8"),
+            headers={"original_topic": topic, "error": str(error)[:1000]}
+        )
+        if self.producer.flush(self.poll_timeout * 10) > 0:
+            raise KafkaException(f"dead-letter message to {self.dead_letter_topic} was not delivered")
+    
+    async def _take(self):
+        msg = await self._queue.get()
+        self._slots.release()
+        return msg
+    
+    async def _next_batch(self) -> list:
+        batch = [await self._take()]
+        deadline = self._loop.time() + self.batch_max_wait
+        
+        while len(batch) < self.batch_max_messages:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                self._slots.release()
+                continue
             
-            await self.message_handler(topic, data, correlation_id)
-        except json.JSONDecodeError as e:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._take(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    def _request_commit(self, msgs):
+        offsets: Dict[Tuple[str, int], int] = {}
+        for msg in msgs:
+            key = (msg.topic(), msg.partition())
+            offsets[key] = max(offsets.get(key, -1), msg.offset())
+        
+        if offsets:
+            self._commit_requests.put([
+                TopicPartition(topic, partition, offset + 1)
+                for (topic, partition), offset in offsets.items()
+            ])
+    
+    def _poll_worker(self):
+        try:
+            while self.running:
+                self._drain_commits()
+                try:
+                    msgs = self.consumer.consume(num_messages=self.batch_max_messages, timeout=self.poll_timeout)
+                except Exception as e:
+                    logger.error("Error polling Kafka", error=str(e))
+                    time.sleep(1.0)
+                    continue
+                
+                for msg in msgs:
+                    if msg.error():
+                        logger.error("Consumer error", error=str(msg.error()))
+                        continue
+                    if not self._enqueue(msg):
+                        break
+        finally:
+            self._drain_commits()
+            try:
+                self.consumer.close()
+            except Exception as e:
+                logger.error("Error closing Kafka consumer", error=str(e))
+    
+    def _enqueue(self, msg) -> bool:
+        while not self._slots.acquire(timeout=0.1):
+            if not self.running:
+                return False
+            self._drain_commits()
+        
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, msg)
+        except RuntimeError:
+            self._slots.release()
+            return False
+        return True
+    
+    def _on_assign(self, consumer, partitions):
+        self._assigned.update((p.topic, p.partition) for p in partitions)
+        logger.info("Kafka partitions assigned", partitions=len(partitions))
+    
+    def _on_revoke(self, consumer, partitions):
+        revoked = {(p.topic, p.partition) for p in partitions}
+        self._drain_commits()
+        self._assigned -= revoked
+        self._tracker.forget(revoked)
+        logger.info("Kafka partitions revoked", partitions=len(revoked), in_flight=self._tracker.in_flight())
+    
+    def _drain_commits(self):
+        while True:
+            try:
+                offsets = self._commit_requests.get_nowait()
+            except queue.Empty:
+                return
+            offsets = [tp for tp in offsets if (tp.topic, tp.partition) in self._assigned]
+            if not offsets:
+                continue
+            try:
+                self.consumer.commit(offsets=offsets, asynchronous=False)
+            except KafkaException as e:
+                logger.error("Failed to commit offsets", error=str(e))
+    
+    def _on_statistics(self, stats_json: str):
+        try:
+            record_kafka_statistics(json.loads(stats_json))
+        except Exception as e:
+            logger.error("Failed to record Kafka statistics", error=str(e))
+    
+    def _decode_message(self, msg) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+        KAFKA_MESSAGES.labels(msg.topic()).inc()
+        try:
+            value = msg.value().decode('utf-8')
+            data = json.loads(value)
+        except (AttributeError, UnicodeDecodeError, json.JSONDecodeError) as e:
             logger.error("Failed to decode JSON", error=str(e))
+            return None
+        
+        correlation_id = None
+        if isinstance(data, dict):
+            if "metadata" in data:
+                correlation_id = data["metadata"].get("correlation_id")
+            elif "correlation_id" in data:
+                correlation_id = data.get("correlation_id")
+        
+        return msg.topic(), data, correlation_id
+    
+    async def _process_message(self, msg):
+        decoded = self._decode_message(msg)
+        if decoded is not None:
+            await self._handle_decoded(decoded)
+    
+    async def _handle_decoded(self, decoded):
+        try:
+            topic, data, correlation_id = decoded
+            await self.message_handler(topic, data, correlation_id)
         except Exception as e:
             logger.error("Error processing message", error=str(e), exc_info=True)
 
+
+class CacheInvalidationBus:
+    def __init__(self, config: Config, cache: UserCache):
+        self.config = config
+        self.cache = cache
+        self.topic = config.cache_invalidation_topic
+        self.instance_id = uuid.uuid4().hex
+        self.poll_timeout = 1.0
+        self.max_messages = 500
+        
+        self.consumer_config = {
+            'bootstrap.servers': ','.join(config.kafka_brokers),
+            'group.id': f"{config.kafka_consumer_group}-cache-{self.instance_id}",
+            'auto.offset.reset': 'latest',
+            'enable.auto.commit': False
+        }
+        
+        self.consumer = None
+        self.producer = None
+        self.running = False
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poll_thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        if self.running:
+            return
+        
+        try:
+            self.consumer = Consumer(self.consumer_config)
+            self.consumer.subscribe([self.topic])
+            self.producer = Producer({'bootstrap.servers': ','.join(self.config.kafka_brokers)})
+        except KafkaException as e:
+            logger.error("Failed to start cache invalidation bus", error=str(e))
+            raise
+        
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        self.cache.add_invalidation_listener(self.publish)
+        self._poll_thread = threading.Thread(target=self._poll_worker, name="cache-invalidation-poller", daemon=True)
+        self._poll_thread.start()
+        logger.info("Cache invalidation bus started", topic=self.topic, instance_id=self.instance_id)
+    
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self._poll_thread and self._poll_thread.is_alive():
+            self._poll_thread.join(timeout=self.poll_timeout * 5)
+        if self.producer:
+            self.producer.flush(self.poll_timeout * 5)
+        logger.info("Cache invalidation bus stopped")
+    
+    def publish(self, user_ids: List[str]):
+        if not self.running:
+            return
+        try:
+            self.producer.produce(
+                self.topic,
+                value=json.dumps({"origin": self.instance_id, "user_ids": list(user_ids)}).encode("utf-8")
+            )
+            self.producer.poll(0)
+        except (KafkaException, BufferError) as e:
+            logger.error("Failed to publish cache invalidation", error=str(e), users=len(user_ids))
+    
+    def apply(self, value: bytes):
+        try:
+            data = json.loads(value.decode("utf-8"))
+            origin = data["origin"]
+            user_ids = [str(user_id) for user_id in data["user_ids"]]
+        except (AttributeError, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.error("Failed to decode cache invalidation", error=str(e))
+            return
+        
+        if origin != self.instance_id:
+            self.cache.invalidate_users(user_ids, propagate=False)
+    
+    def _poll_worker(self):
+        try:
+            while self.running:
+                try:
+                    msgs = self.consumer.consume(num_messages=self.max_messages, timeout=self.poll_timeout)
+                except Exception as e:
+                    logger.error("Error polling cache invalidations", error=str(e))
+                    time.sleep(1.0)
+                    continue
+                
+                for msg in msgs:
+                    if msg.error():
+                        logger.error("Cache invalidation consumer error", error=str(msg.error()))
+                        continue
+                    try:
+                        self._loop.call_soon_threadsafe(self.apply, msg.value())
+                    except RuntimeError:
+                        return
+        finally:
+            try:
+                self.consumer.close()
+            except Exception as e:
+                logger.error("Error closing cache invalidation consumer", error=str(e))
+
@@ -0,0 +1,126 @@
+from typing import Any, Dict, Iterator, Optional
+from contextlib import contextmanager
+import functools
+import inspect
+import time
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+KAFKA_MESSAGES = Counter(
+    "analytics_kafka_messages_total", "Kafka messages consumed", ["topic"]
+)
+KAFKA_BATCH_SIZE = Histogram(
+    "analytics_kafka_batch_size", "Messages handed to the batch handler at once",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+KAFKA_DEAD_LETTERS = Counter(
+    "analytics_kafka_dead_letters_total", "Messages given up on after repeated handler failures", ["topic"]
+)
+KAFKA_CONSUMER_LAG = Gauge(
+    "analytics_kafka_consumer_lag", "Messages behind the partition high watermark", ["topic", "partition"]
+)
+HANDLER_DURATION = Histogram(
+    "analytics_handler_duration_seconds", "Event handler latency", ["topic"], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_DURATION = Histogram(
+    "analytics_db_query_duration_seconds", "AnalyticsRepository call latency", ["query"], buckets=LATENCY_BUCKETS
+)
+GRPC_DURATION = Histogram(
+    "analytics_grpc_request_duration_seconds", "gRPC request latency", ["method", "code"], buckets=LATENCY_BUCKETS
+)
+HTTP_DURATION = Histogram(
+    "analytics_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+
+class PoolCollector(Collector):
+    def __init__(self, engine):
+        self.pool = engine.sync_engine.pool
+    
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        for name, method, documentation in (
+            ("analytics_db_pool_size", "size", "Configured connection pool size"),
+            ("analytics_db_pool_checked_out", "checkedout", "Connections currently checked out"),
+            ("analytics_db_pool_checked_in", "checkedin", "Idle connections in the pool"),
+            ("analytics_db_pool_overflow", "overflow", "Connections opened beyond pool_size")
+        ):
+            if hasattr(self.pool, method):
+                yield GaugeMetricFamily(name, documentation, value=getattr(self.pool, method)())
+
+
+def register_pool_collector(engine, registry=REGISTRY) -> PoolCollector:
+    collector = PoolCollector(engine)
+    registry.register(collector)
+    return collector
+
+
+def record_kafka_statistics(stats: Dict[str, Any]):
+    for topic, topic_stats in stats.get("topics", {}).items():
+        for partition, partition_stats in topic_stats.get("partitions", {}).items():
+            lag = partition_stats.get("consumer_lag", -1)
+            if partition == "-1" or lag is None or lag < 0:
+                continue
+            KAFKA_CONSUMER_LAG.labels(topic, partition).set(lag)
+
+
+@contextmanager
+def observe_handler(topic: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        HANDLER_DURATION.labels(topic).observe(time.perf_counter() - started)
+
+
+def observe_query(func):
+    name = func.__name__
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            DB_QUERY_DURATION.labels(name).observe(time.perf_counter() - started)
+    
+    return wrapper
+
+
+def _rpc_code(context) -> str:
+    code: Optional[Any] = None
+    try:
+        code = context.code()
+    except (AttributeError, NotImplementedError):
+        pass
+    return code.name if code is not None and hasattr(code, "name") else "OK"
+
+
+def observe_rpc(func):
+    name = func.__name__
+    
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def stream_wrapper(self, request, context):
+            started = time.perf_counter()
+            try:
+                async for response in func(self, request, context):
+                    yield response
+            finally:
+                GRPC_DURATION.labels(name, _rpc_code(context)).observe(time.perf_counter() - started)
+        
+        return stream_wrapper
+    
+    @functools.wraps(func)
+    async def wrapper(self, request, context):
+        started = time.perf_counter()
+        try:
+            return await func(self, request, context)
+        finally:
+            GRPC_DURATION.labels(name, _rpc_code(context)).observe(time.perf_counter() - started)
+    
+    return wrapper
+
@@ -0,0 +1,122 @@
+from typing import Dict
+import argparse
+import asyncio
+from sqlalchemy import JSON, LargeBinary, bindparam, column, inspect, select, table, text, update
+import structlog
+
+from src.config import Config
+from src.infrastructure.database import Database
+from src.infrastructure.models import DailyMoodSummary, WeeklyMoodSummary, MonthlyMoodSummary
+from src.infrastructure.types import (
+    EMOTION_VECTOR_STORAGES, decode_emotion_vector, encode_emotion_vector
+)
+
+logger = structlog.get_logger()
+
+EMOTION_VECTOR_TABLES = [
+    DailyMoodSummary.__tablename__,
+    WeeklyMoodSummary.__tablename__,
+    MonthlyMoodSummary.__tablename__
+]
+STORAGE_TYPES = {"json": JSON, "binary": LargeBinary}
+
+
+def _column_storage(sync_conn, table_name: str) -> str:
+    for column_info in inspect(sync_conn).get_columns(table_name):
+        if column_info["name"] == "emotion_vector":
+            return "binary" if isinstance(column_info["type"], LargeBinary) else "json"
+    raise ValueError(f"{table_name} has no emotion_vector column")
+
+
+def _convert(value, target: str):
+    vector = decode_emotion_vector(value)
+    if target == "binary":
+        return encode_emotion_vector(vector)
+    return [float(v) for v in vector]
+
+
+async def migrate_emotion_vectors(db: Database, target: str, batch_size: int = 1000) -> Dict[str, int]:
+    if target not in EMOTION_VECTOR_STORAGES:
+        raise ValueError(f"Unknown emotion_vector_storage: {target}")
+    
+    converted = {}
+    for table_name in EMOTION_VECTOR_TABLES:
+        async with db.engine.connect() as conn:
+            source = await conn.run_sync(_column_storage, table_name)
+        if source == target:
+            logger.info("Emotion vectors already migrated", table=table_name, storage=target)
+            continue
+        
+        converted[table_name] = await _migrate_table(db, table_name, source, target, batch_size)
+    return converted
+
+
+async def _migrate_table(db: Database, table_name: str, source: str, target: str, batch_size: int) -> int:
+    dialect = db.engine.dialect
+    target_type = STORAGE_TYPES[target]()
+    source_table = table(table_name, column("id"), column("emotion_vector", STORAGE_TYPES[source]()))
+    target_table = table(table_name, column("id"), column("emotion_vector_new", target_type))
+    
+    async with db.engine.begin() as conn:
+        await conn.execute(text(
+            f"ALTER TABLE {table_name} ADD COLUMN emotion_vector_new {target_type.compile(dialect=dialect)}"
+        ))
+    
+    converted = 0
+    last_id = ""
+    while True:
+        async with db.engine.begin() as conn:
+            result = await conn.execute(
+                select(source_table.c.id, source_table.c.emotion_vector)
+                .where(source_table.c.id > last_id)
+                .order_by(source_table.c.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            
+            await conn.execute(
+                update(target_table)
+                .where(target_table.c.id == bindparam("row_id"))
+                .values(emotion_vector_new=bindparam("vector")),
+                [{"row_id": row.id, "vector": _convert(row.emotion_vector, target)} for row in rows]
+            )
+            last_id = rows[-1].id
+            converted += len(rows)
+        logger.info("Emotion vectors converted", table=table_name, rows=converted)
+    
+    async with db.engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN emotion_vector"))
+        await conn.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN emotion_vector_new TO emotion_vector"))
+        if dialect.name == "postgresql":
+            await conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN emotion_vector SET NOT NULL"))
+    
+    logger.info("Emotion vector storage migrated", table=table_name, source=source, target=target, rows=converted)
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert stored emotion vectors between json and binary storage. Stop ingestion while it runs."
+    )
+    parser.add_argument("--to", dest="target", choices=EMOTION_VECTOR_STORAGES, required=True)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+    
+    config = Config(database_url=args.database_url) if args.database_url else Config()
+    
+    async def run():
+        db = Database(config)
+        try:
+            await migrate_emotion_vectors(db, args.target, args.batch_size)
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
+
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, JSON, Date, Index
+from sqlalchemy import Column, String, Float, Integer, BigInteger, DateTime, JSON, Date, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 
 from src.infrastructure.database import Base
+from src.infrastructure.types import EmotionVector
 
 
 class DailyMoodSummary(Base):
@@ -11,7 +12,7 @@ class DailyMoodSummary(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String, nullable=False, index=True)
     date = Column(Date, nullable=False)
-    emotion_vector = Column(JSON, nullable=False)
+    emotion_vector = Column(EmotionVector(), nullable=False)
     dominant_emotion = Column(String, nullable=False)
     average_valence = Column(Float, nullable=False)
     average_arousal = Column(Float, nullable=False)
@@ -19,6 +20,7 @@ class DailyMoodSummary(Base):
     total_tokens = Column(Integer, nullable=False, default=0)
     topics = Column(JSON, nullable=True)
     volatility_index = Column(Float, nullable=True)
+    stats = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -34,7 +36,7 @@ class WeeklyMoodSummary(Base):
     user_id = Column(String, nullable=False, index=True)
     year = Column(Integer, nullable=False)
     week = Column(Integer, nullable=False)
-    emotion_vector = Column(JSON, nullable=False)
+    emotion_vector = Column(EmotionVector(), nullable=False)
     dominant_emotion = Column(String, nullable=False)
     average_valence = Column(Float, nullable=False)
     average_arousal = Column(Float, nullable=False)
@@ -45,6 +47,7 @@ class WeeklyMoodSummary(Base):
     most_emotional_day = Column(String, nullable=True)
     most_productive_day = Column(String, nullable=True)
     key_topics = Column(JSON, nullable=True)
+    stats = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -60,7 +63,7 @@ class MonthlyMoodSummary(Base):
     user_id = Column(String, nullable=False, index=True)
     year = Column(Integer, nullable=False)
     month = Column(Integer, nullable=False)
-    emotion_vector = Column(JSON, nullable=False)
+    emotion_vector = Column(EmotionVector(), nullable=False)
     dominant_emotion = Column(String, nullable=False)
     average_valence = Column(Float, nullable=False)
     average_arousal = Column(Float, nullable=False)
@@ -72,6 +75,7 @@ class MonthlyMoodSummary(Base):
     average_entries_per_day = Column(Float, nullable=True)
     dominant_topics = Column(JSON, nullable=True)
     archetype_change = Column(String, nullable=True)
+    stats = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -80,6 +84,49 @@ class MonthlyMoodSummary(Base):
     )
 
 
+class RollupDirtyBucket(Base):
+    __tablename__ = "rollup_dirty_bucket"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    period = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    number = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    marked_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("idx_rollup_dirty_bucket", "user_id", "period", "year", "number", unique=True),
+    )
+
+
+class ProcessedEntry(Base):
+    __tablename__ = "processed_entries"
+    
+    entry_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    contribution = Column(JSON, nullable=True)
+    processed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index("idx_processed_entries_processed_at", "processed_at"),
+        Index("idx_processed_entries_date", "date"),
+    )
+
+
+class ReplayCheckpoint(Base):
+    __tablename__ = "replay_checkpoints"
+    
+    name = Column(String, primary_key=True)
+    source = Column(String, nullable=False)
+    position = Column(BigInteger, nullable=False, default=0)
+    events = Column(BigInteger, nullable=False, default=0)
+    skipped = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
 class UserTopicsSummary(Base):
     __tablename__ = "user_topics_summary"
     
@@ -88,11 +135,30 @@ class UserTopicsSummary(Base):
     topic = Column(String, nullable=False)
     frequency = Column(Integer, nullable=False, default=0)
     last_seen = Column(DateTime(timezone=True), nullable=True)
+    trend_score = Column(Float, nullable=True, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     __table_args__ = (
         Index("idx_user_topics_user_topic", "user_id", "topic", unique=True),
+        Index("idx_user_topics_user_frequency", user_id, frequency.desc()),
+        Index("idx_user_topics_user_trend", user_id, trend_score.desc()),
+    )
+
+
+class UserTopicsDaily(Base):
+    __tablename__ = "user_topics_daily"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    topic = Column(String, nullable=False)
+    frequency = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("idx_user_topics_daily_user_date_topic", "user_id", "date", "topic", unique=True),
+        Index("idx_user_topics_daily_date", "date"),
     )
 
 
@@ -0,0 +1,138 @@
+from typing import Dict, List
+from datetime import date
+import re
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+from sqlalchemy.exc import DBAPIError
+import structlog
+
+from src.domain.retention import add_months
+
+logger = structlog.get_logger()
+
+PARTITIONED_TABLES = {
+    "daily_mood_summary": "date",
+    "archetype_history": "changed_at"
+}
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def declare_partitioning(metadata: MetaData) -> MetaData:
+    partitioned = MetaData()
+    for table in metadata.sorted_tables:
+        table.to_metadata(partitioned)
+    for table_name, column in PARTITIONED_TABLES.items():
+        table = partitioned.tables[table_name]
+        table.dialect_kwargs["postgresql_partition_by"] = f"RANGE ({column})"
+        if column not in table.primary_key.columns:
+            table.c[column].primary_key = True
+            table.append_constraint(PrimaryKeyConstraint(*table.primary_key.columns, table.c[column]))
+    return partitioned
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+
+def _bound(table_name: str, month: date) -> str:
+    if PARTITIONED_TABLES[table_name] == "date":
+        return f"'{month.isoformat()}'"
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def _month_of(table_name: str) -> str:
+    column = PARTITIONED_TABLES[table_name]
+    if column == "date":
+        return f"date_trunc('month', {column})"
+    return f"date_trunc('month', {column} AT TIME ZONE 'UTC')"
+
+
+def is_partitioned(sync_conn, table_name: str) -> bool:
+    relkind = sync_conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": table_name}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(sync_conn, table_name: str) -> Dict[date, str]:
+    result = sync_conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :name"
+        ),
+        {"name": table_name}
+    )
+    partitions = {}
+    for (name,) in result:
+        match = _PARTITION_SUFFIX.search(name)
+        if match and name == partition_name(table_name, date(int(match.group(1)), int(match.group(2)), 1)):
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def months_in_default(sync_conn, table_name: str) -> List[date]:
+    result = sync_conn.execute(text(
+        f"SELECT DISTINCT CAST({_month_of(table_name)} AS date) FROM {table_name}_default"
+    ))
+    return sorted(month for (month,) in result)
+
+
+def ensure_partitions(sync_conn, first_month: date, last_month: date) -> List[str]:
+    created = []
+    for table_name in PARTITIONED_TABLES:
+        if not is_partitioned(sync_conn, table_name):
+            logger.warning("Table is not partitioned, skipping partition maintenance", table=table_name)
+            continue
+        
+        sync_conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"))
+        existing = list_partitions(sync_conn, table_name)
+        
+        months = set(months_in_default(sync_conn, table_name))
+        month = first_month
+        while month <= last_month:
+            months.add(month)
+            month = add_months(month, 1)
+        
+        for month in sorted(months - set(existing)):
+            name = partition_name(table_name, month)
+            try:
+                with sync_conn.begin_nested():
+                    moved = _attach_partition(sync_conn, table_name, name, month)
+                created.append(name)
+                logger.info("Partition created", table=table_name, partition=name, rows_moved_from_default=moved)
+            except DBAPIError as e:
+                logger.warning("Could not create partition", table=table_name, partition=name, error=str(e))
+    return created
+
+
+def _attach_partition(sync_conn, table_name: str, name: str, month: date) -> int:
+    column = PARTITIONED_TABLES[table_name]
+    lower = _bound(table_name, month)
+    upper = _bound(table_name, add_months(month, 1))
+    
+    sync_conn.execute(text(f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS)"))
+    moved = sync_conn.execute(text(
+        f"WITH moved AS (DELETE FROM {table_name}_default WHERE {column} >= {lower} AND {column} < {upper} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    )).rowcount
+    sync_conn.execute(text(f"ALTER TABLE {table_name} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})"))
+    return moved
+
+
+def drop_partitions_before(sync_conn, table_name: str, cutoff: date) -> List[str]:
+    if not is_partitioned(sync_conn, table_name):
+        return []
+    
+    dropped = []
+    for month, name in sorted(list_partitions(sync_conn, table_name).items()):
+        if add_months(month, 1) > cutoff:
+            break
+        sync_conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+        sync_conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+        logger.info("Partition dropped", table=table_name, partition=name)
+    return dropped
+
@@ -1,52 +1,172 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Iterable, Any, AsyncIterator, Set, NamedTuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from datetime import date, datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select, update, and_, or_, func, tuple_, delete, true, any_, literal, String, bindparam, case, union_all
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import date, datetime, time, timedelta, timezone
 import uuid
 
 from src.infrastructure.models import (
     DailyMoodSummary, WeeklyMoodSummary, MonthlyMoodSummary,
-    UserTopicsSummary, ArchetypeHistory
+    UserTopicsSummary, UserTopicsDaily, ArchetypeHistory, RollupDirtyBucket, ProcessedEntry, ReplayCheckpoint
 )
 from src.infrastructure.database import Database
+from src.infrastructure.metrics import observe_query
+from src.domain.accumulator import MoodAccumulator
+from src.domain.aggregator import MoodAggregator
+from src.domain.archetypes import archetype_change
+
+
+class TopicCount(NamedTuple):
+    topic: str
+    frequency: int
+    last_seen: Optional[datetime]
 
 
 class AnalyticsRepository:
     def __init__(self, db: Database):
         self.db = db
     
-    async def get_or_create_daily_summary(
-        self, session: AsyncSession, user_id: str, summary_date: date
-    ) -> DailyMoodSummary:
-        result = await session.execute(
-            select(DailyMoodSummary).where(
+    @staticmethod
+    def _dialect_name(session: AsyncSession) -> str:
+        return session.get_bind().dialect.name
+    
+    def _insert(self, session: AsyncSession, model):
+        if self._dialect_name(session) == "sqlite":
+            return sqlite_insert(model)
+        return pg_insert(model)
+    
+    def _user_id_in(self, session: AsyncSession, column, user_ids: List[str]):
+        if self._dialect_name(session) == "postgresql":
+            return column == any_(literal(user_ids, ARRAY(String)))
+        return column.in_(user_ids)
+    
+    @observe_query
+    async def merge_daily_accumulators(
+        self, session: AsyncSession, accumulators: Dict[Tuple[str, date], MoodAccumulator]
+    ) -> None:
+        if not accumulators:
+            return
+        
+        existing = await self._lock_daily_accumulators(session, accumulators.keys())
+        
+        fresh = [key for key in accumulators if key not in existing]
+        if fresh:
+            stmt = self._insert(session, DailyMoodSummary).values([
+                {"id": str(uuid.uuid4()), "user_id": key[0], "date": key[1], **self._summary_values(accumulators[key])}
+                for key in sorted(fresh)
+            ])
+            result = await session.execute(
+                stmt.on_conflict_do_nothing(index_elements=[DailyMoodSummary.user_id, DailyMoodSummary.date])
+                .returning(DailyMoodSummary.user_id, DailyMoodSummary.date)
+            )
+            inserted = {(row.user_id, row.date) for row in result}
+            raced = [key for key in fresh if key not in inserted]
+            if raced:
+                existing.update(await self._lock_daily_accumulators(session, raced))
+        
+        updates = []
+        for key in sorted(accumulators):
+            merged = existing.get(key)
+            if merged is None:
+                continue
+            merged.merge(accumulators[key])
+            updates.append({"key_user_id": key[0], "key_date": key[1], **self._summary_values(merged)})
+        await self._update_daily_summaries(session, updates)
+    
+    async def _update_daily_summaries(self, session: AsyncSession, updates: List[Dict[str, Any]]) -> None:
+        if not updates:
+            return
+        
+        await session.execute(
+            update(DailyMoodSummary.__table__)
+            .where(
                 and_(
-                    DailyMoodSummary.user_id == user_id,
-                    DailyMoodSummary.date == summary_date
+                    DailyMoodSummary.user_id == bindparam("key_user_id"),
+                    DailyMoodSummary.date == bindparam("key_date")
                 )
             )
+            .values(updated_at=func.now()),
+            updates
         )
-        existing = result.scalar_one_or_none()
+    
+    @staticmethod
+    def _summary_values(accumulator: MoodAccumulator) -> Dict[str, Any]:
+        aggregate = accumulator.to_aggregate()
+        return {
+            "emotion_vector": aggregate["emotion_vector"],
+            "dominant_emotion": aggregate["dominant_emotion"],
+            "average_valence": aggregate["average_valence"],
+            "average_arousal": aggregate["average_arousal"],
+            "entry_count": aggregate["entry_count"],
+            "total_tokens": aggregate["total_tokens"],
+            "topics": aggregate["topics"],
+            "volatility_index": aggregate["volatility_index"],
+            "stats": accumulator.to_dict()
+        }
+    
+    @observe_query
+    async def remove_daily_contributions(
+        self, session: AsyncSession, removals: Dict[Tuple[str, date], List[Dict[str, Any]]]
+    ) -> List[Tuple[Tuple[str, date], str]]:
+        if not removals:
+            return []
         
-        if existing:
-            return existing
+        existing = await self._lock_daily_accumulators(session, removals.keys())
         
-        new_summary = DailyMoodSummary(
-            id=str(uuid.uuid4()),
-            user_id=user_id,
-            date=summary_date,
-            emotion_vector=[0.0] * 8,
-            dominant_emotion="neutral",
-            average_valence=0.0,
-            average_arousal=0.0,
-            entry_count=0,
-            total_tokens=0
-        )
-        session.add(new_summary)
-        await session.commit()
-        await session.refresh(new_summary)
-        return new_summary
+        skipped = []
+        emptied = []
+        updates = []
+        for key, contributions in removals.items():
+            accumulator = existing.get(key)
+            if accumulator is None:
+                continue
+            for contribution in contributions:
+                try:
+                    accumulator.remove(contribution)
+                except (ValueError, TypeError) as e:
+                    skipped.append((key, str(e)))
+            
+            if accumulator.count == 0:
+                emptied.append(key)
+                continue
+            updates.append({"key_user_id": key[0], "key_date": key[1], **self._summary_values(accumulator)})
+        
+        await self._update_daily_summaries(session, updates)
+        if emptied:
+            await session.execute(
+                delete(DailyMoodSummary).where(
+                    tuple_(DailyMoodSummary.user_id, DailyMoodSummary.date).in_(emptied)
+                )
+            )
+        return skipped
     
+    async def _lock_daily_accumulators(
+        self, session: AsyncSession, keys: Iterable[Tuple[str, date]]
+    ) -> Dict[Tuple[str, date], MoodAccumulator]:
+        result = await session.execute(
+            select(
+                DailyMoodSummary.user_id,
+                DailyMoodSummary.date,
+                DailyMoodSummary.stats,
+                DailyMoodSummary.emotion_vector,
+                DailyMoodSummary.average_valence,
+                DailyMoodSummary.average_arousal,
+                DailyMoodSummary.entry_count,
+                DailyMoodSummary.total_tokens,
+                DailyMoodSummary.topics,
+                DailyMoodSummary.volatility_index
+            ).where(
+                tuple_(DailyMoodSummary.user_id, DailyMoodSummary.date).in_(list(keys))
+            ).with_for_update()
+        )
+        return {
+            (row.user_id, row.date): MoodAccumulator.from_summary(row._asdict())
+            for row in result
+        }
+    
+    @observe_query
     async def get_daily_summaries(
         self, session: AsyncSession, user_id: str, start_date: date, end_date: date
     ) -> List[DailyMoodSummary]:
@@ -61,6 +181,540 @@ class AnalyticsRepository:
         )
         return list(result.scalars().all())
     
+    @observe_query
+    async def get_daily_columns(
+        self, session: AsyncSession, user_id: str, start_date: date, end_date: date
+    ) -> Dict[str, list]:
+        columns = [
+            DailyMoodSummary.date,
+            DailyMoodSummary.emotion_vector,
+            DailyMoodSummary.dominant_emotion,
+            DailyMoodSummary.average_valence,
+            DailyMoodSummary.average_arousal,
+            DailyMoodSummary.entry_count,
+            DailyMoodSummary.total_tokens,
+            DailyMoodSummary.topics,
+            DailyMoodSummary.volatility_index
+        ]
+        result = await session.execute(
+            select(*columns).where(
+                and_(
+                    DailyMoodSummary.user_id == user_id,
+                    DailyMoodSummary.date >= start_date,
+                    DailyMoodSummary.date <= end_date
+                )
+            ).order_by(DailyMoodSummary.date)
+        )
+        values = list(zip(*result.tuples())) or [()] * len(columns)
+        return {column.key: list(column_values) for column, column_values in zip(columns, values)}
+    
+    async def stream_daily_rows(
+        self, session: AsyncSession, user_id: Optional[str] = None,
+        start_date: Optional[date] = None, end_date: Optional[date] = None, chunk_size: int = 1000
+    ) -> AsyncIterator[list]:
+        query = select(
+            DailyMoodSummary.user_id,
+            DailyMoodSummary.date,
+            DailyMoodSummary.emotion_vector,
+            DailyMoodSummary.dominant_emotion,
+            DailyMoodSummary.average_valence,
+            DailyMoodSummary.average_arousal,
+            DailyMoodSummary.entry_count,
+            DailyMoodSummary.total_tokens,
+            DailyMoodSummary.topics,
+            DailyMoodSummary.volatility_index
+        )
+        if user_id is not None:
+            query = query.where(DailyMoodSummary.user_id == user_id)
+        if start_date is not None:
+            query = query.where(DailyMoodSummary.date >= start_date)
+        if end_date is not None:
+            query = query.where(DailyMoodSummary.date <= end_date)
+        
+        result = await session.stream(
+            query.order_by(DailyMoodSummary.user_id, DailyMoodSummary.date)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions(chunk_size):
+            yield rows
+    
+    @observe_query
+    async def get_daily_summaries_for_users(
+        self, session: AsyncSession, user_ids: Iterable[str], start_date: date, end_date: date
+    ) -> List[DailyMoodSummary]:
+        result = await session.execute(
+            select(DailyMoodSummary).where(
+                and_(
+                    DailyMoodSummary.user_id.in_(list(user_ids)),
+                    DailyMoodSummary.date >= start_date,
+                    DailyMoodSummary.date <= end_date
+                )
+            ).order_by(DailyMoodSummary.user_id, DailyMoodSummary.date)
+        )
+        return list(result.scalars().all())
+    
+    @observe_query
+    async def claim_entries(
+        self, session: AsyncSession, entries: Iterable[Tuple[str, str, date, Dict[str, Any]]]
+    ) -> Set[str]:
+        rows = [
+            {"entry_id": entry_id, "user_id": user_id, "date": entry_date, "contribution": contribution}
+            for entry_id, user_id, entry_date, contribution in sorted(entries, key=lambda entry: entry[0])
+        ]
+        if not rows:
+            return set()
+        
+        stmt = self._insert(session, ProcessedEntry).values(rows)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[ProcessedEntry.entry_id]).returning(ProcessedEntry.entry_id)
+        result = await session.execute(stmt)
+        return set(result.scalars().all())
+    
+    @observe_query
+    async def tombstone_entries(
+        self, session: AsyncSession, entries: Iterable[Tuple[str, str, date]]
+    ) -> List[ProcessedEntry]:
+        entries = sorted(entries)
+        if not entries:
+            return []
+        
+        deleted_at = datetime.now(timezone.utc)
+        result = await session.execute(
+            update(ProcessedEntry)
+            .where(
+                and_(
+                    ProcessedEntry.entry_id.in_([entry_id for entry_id, _, _ in entries]),
+                    ProcessedEntry.deleted_at.is_(None)
+                )
+            )
+            .values(deleted_at=deleted_at)
+            .returning(ProcessedEntry)
+            .execution_options(synchronize_session=False)
+        )
+        removed = list(result.scalars().all())
+        
+        stmt = self._insert(session, ProcessedEntry).values([
+            {"entry_id": entry_id, "user_id": user_id, "date": entry_date, "deleted_at": deleted_at}
+            for entry_id, user_id, entry_date in entries
+        ])
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=[ProcessedEntry.entry_id]))
+        return removed
+    
+    @observe_query
+    async def decrement_topic_counts(
+        self, session: AsyncSession, decrements: Dict[Tuple[str, str], Tuple[int, float]]
+    ) -> None:
+        if not decrements:
+            return
+        
+        frequency = UserTopicsSummary.frequency - bindparam("frequency_delta")
+        trend_score = func.coalesce(UserTopicsSummary.trend_score, 0.0) - bindparam("trend_delta")
+        await session.execute(
+            update(UserTopicsSummary.__table__)
+            .where(
+                and_(
+                    UserTopicsSummary.user_id == bindparam("key_user_id"),
+                    UserTopicsSummary.topic == bindparam("key_topic")
+                )
+            )
+            .values(
+                frequency=case((frequency < 0, 0), else_=frequency),
+                trend_score=case((trend_score < 0, 0.0), else_=trend_score),
+                updated_at=func.now()
+            ),
+            [
+                {"key_user_id": user_id, "key_topic": topic, "frequency_delta": count, "trend_delta": trend}
+                for (user_id, topic), (count, trend) in sorted(decrements.items())
+            ]
+        )
+    
+    @observe_query
+    async def upsert_daily_topic_counts(
+        self, session: AsyncSession, topic_counts: Dict[Tuple[str, date, str], int]
+    ) -> None:
+        if not topic_counts:
+            return
+        
+        stmt = self._insert(session, UserTopicsDaily).values([
+            {"id": str(uuid.uuid4()), "user_id": user_id, "date": day, "topic": topic, "frequency": frequency}
+            for (user_id, day, topic), frequency in sorted(topic_counts.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserTopicsDaily.user_id, UserTopicsDaily.date, UserTopicsDaily.topic],
+            set_={"frequency": UserTopicsDaily.frequency + stmt.excluded.frequency, "updated_at": func.now()}
+        )
+        await session.execute(stmt)
+    
+    @observe_query
+    async def decrement_daily_topic_counts(
+        self, session: AsyncSession, decrements: Dict[Tuple[str, date, str], int]
+    ) -> None:
+        if not decrements:
+            return
+        
+        frequency = UserTopicsDaily.frequency - bindparam("frequency_delta")
+        await session.execute(
+            update(UserTopicsDaily.__table__)
+            .where(
+                and_(
+                    UserTopicsDaily.user_id == bindparam("key_user_id"),
+                    UserTopicsDaily.date == bindparam("key_date"),
+                    UserTopicsDaily.topic == bindparam("key_topic")
+                )
+            )
+            .values(frequency=case((frequency < 0, 0), else_=frequency), updated_at=func.now()),
+            [
+                {"key_user_id": user_id, "key_date": day, "key_topic": topic, "frequency_delta": count}
+                for (user_id, day, topic), count in sorted(decrements.items())
+            ]
+        )
+    
+    @observe_query
+    async def mark_rollups_dirty(
+        self, session: AsyncSession, keys: Iterable[Tuple[str, date]], periods: Tuple[str, ...] = ("week", "month")
+    ) -> None:
+        buckets = set()
+        for user_id, summary_date in keys:
+            if "week" in periods:
+                buckets.add((user_id, "week") + MoodAggregator.get_week_number(summary_date))
+            if "month" in periods:
+                buckets.add((user_id, "month") + MoodAggregator.get_month_number(summary_date))
+        
+        if not buckets:
+            return
+        
+        stmt = self._insert(session, RollupDirtyBucket).values([
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "period": period,
+                "year": year,
+                "number": number,
+                "version": 1
+            }
+            for user_id, period, year, number in sorted(buckets)
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[
+                RollupDirtyBucket.user_id, RollupDirtyBucket.period,
+                RollupDirtyBucket.year, RollupDirtyBucket.number
+            ],
+            set_={
+                "version": RollupDirtyBucket.version + 1,
+                "marked_at": func.now()
+            }
+        )
+        await session.execute(stmt)
+    
+    @observe_query
+    async def claim_dirty_rollups(
+        self, session: AsyncSession, limit: int
+    ) -> List[RollupDirtyBucket]:
+        result = await session.execute(
+            select(RollupDirtyBucket)
+            .order_by(RollupDirtyBucket.marked_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(result.scalars().all())
+    
+    @observe_query
+    async def clear_dirty_rollups(
+        self, session: AsyncSession, buckets: Iterable[RollupDirtyBucket]
+    ) -> None:
+        keys = [(bucket.id, bucket.version) for bucket in buckets]
+        if not keys:
+            return
+        
+        await session.execute(
+            delete(RollupDirtyBucket).where(
+                tuple_(RollupDirtyBucket.id, RollupDirtyBucket.version).in_(keys)
+            )
+        )
+    
+    @observe_query
+    async def upsert_weekly_summaries(
+        self, session: AsyncSession, rows: List[Dict[str, Any]]
+    ) -> None:
+        await self._upsert_rollups(
+            session, WeeklyMoodSummary, rows,
+            [WeeklyMoodSummary.user_id, WeeklyMoodSummary.year, WeeklyMoodSummary.week]
+        )
+    
+    @observe_query
+    async def upsert_monthly_summaries(
+        self, session: AsyncSession, rows: List[Dict[str, Any]]
+    ) -> None:
+        await self._upsert_rollups(
+            session, MonthlyMoodSummary, rows,
+            [MonthlyMoodSummary.user_id, MonthlyMoodSummary.year, MonthlyMoodSummary.month]
+        )
+    
+    async def _upsert_rollups(self, session: AsyncSession, model, rows: List[Dict[str, Any]], index_elements):
+        if not rows:
+            return
+        
+        stmt = self._insert(session, model).values([{"id": str(uuid.uuid4()), **row} for row in rows])
+        key_columns = {column.key for column in index_elements}
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={
+                **{key: stmt.excluded[key] for key in rows[0] if key not in key_columns},
+                "updated_at": func.now()
+            }
+        )
+        await session.execute(stmt)
+    
+    @observe_query
+    async def reset_summaries(self, session: AsyncSession) -> None:
+        for model in (
+            RollupDirtyBucket, MonthlyMoodSummary, WeeklyMoodSummary, DailyMoodSummary, UserTopicsSummary, UserTopicsDaily
+        ):
+            await session.execute(delete(model))
+        await session.execute(delete(ProcessedEntry).where(ProcessedEntry.deleted_at.is_(None)))
+    
+    @observe_query
+    async def get_replay_checkpoint(self, session: AsyncSession, name: str) -> Optional[ReplayCheckpoint]:
+        return await session.get(ReplayCheckpoint, name)
+    
+    @observe_query
+    async def save_replay_checkpoint(
+        self, session: AsyncSession, name: str, source: str, position: int, events: int, skipped: int
+    ) -> None:
+        stmt = self._insert(session, ReplayCheckpoint).values(
+            name=name, source=source, position=position, events=events, skipped=skipped
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReplayCheckpoint.name],
+            set_={
+                "source": stmt.excluded.source,
+                "position": stmt.excluded.position,
+                "events": stmt.excluded.events,
+                "skipped": stmt.excluded.skipped,
+                "updated_at": func.now()
+            }
+        )
+        await session.execute(stmt)
+    
+    @observe_query
+    async def delete_weekly_summary(self, session: AsyncSession, user_id: str, year: int, week: int) -> None:
+        await session.execute(
+            delete(WeeklyMoodSummary).where(
+                and_(
+                    WeeklyMoodSummary.user_id == user_id,
+                    WeeklyMoodSummary.year == year,
+                    WeeklyMoodSummary.week == week
+                )
+            )
+        )
+    
+    @observe_query
+    async def delete_monthly_summary(self, session: AsyncSession, user_id: str, year: int, month: int) -> None:
+        await session.execute(
+            delete(MonthlyMoodSummary).where(
+                and_(
+                    MonthlyMoodSummary.user_id == user_id,
+                    MonthlyMoodSummary.year == year,
+                    MonthlyMoodSummary.month == month
+                )
+            )
+        )
+    
+    @observe_query
+    async def count_dirty_rollups_before(self, session: AsyncSession, cutoff: date) -> int:
+        last_day = cutoff - timedelta(days=1)
+        year, week, _ = last_day.isocalendar()
+        return await session.scalar(
+            select(func.count()).select_from(RollupDirtyBucket).where(
+                or_(
+                    and_(
+                        RollupDirtyBucket.period == "month",
+                        or_(
+                            RollupDirtyBucket.year < last_day.year,
+                            and_(RollupDirtyBucket.year == last_day.year, RollupDirtyBucket.number <= last_day.month)
+                        )
+                    ),
+                    and_(
+                        RollupDirtyBucket.period == "week",
+                        or_(
+                            RollupDirtyBucket.year < year,
+                            and_(RollupDirtyBucket.year == year, RollupDirtyBucket.number <= week)
+                        )
+                    )
+                )
+            )
+        )
+    
+    @observe_query
+    async def delete_daily_before(self, session: AsyncSession, cutoff: date, limit: int) -> int:
+        expired = select(DailyMoodSummary.id).where(DailyMoodSummary.date < cutoff).limit(limit)
+        result = await session.execute(
+            delete(DailyMoodSummary)
+            .where(DailyMoodSummary.date < cutoff, DailyMoodSummary.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @observe_query
+    async def delete_daily_topics_before(self, session: AsyncSession, cutoff: date, limit: int) -> int:
+        expired = select(UserTopicsDaily.id).where(UserTopicsDaily.date < cutoff).limit(limit)
+        result = await session.execute(
+            delete(UserTopicsDaily)
+            .where(UserTopicsDaily.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @observe_query
+    async def delete_processed_entries_before(self, session: AsyncSession, cutoff: date, limit: int) -> int:
+        expired = select(ProcessedEntry.entry_id).where(ProcessedEntry.date < cutoff).limit(limit)
+        result = await session.execute(
+            delete(ProcessedEntry)
+            .where(ProcessedEntry.entry_id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @observe_query
+    async def compact_archetype_history(self, session: AsyncSession, cutoff: date, limit: int) -> int:
+        cutoff_at = datetime.combine(cutoff, time.min, tzinfo=timezone.utc)
+        ranked = select(
+            ArchetypeHistory.id,
+            ArchetypeHistory.archetype,
+            func.lag(ArchetypeHistory.archetype).over(
+                partition_by=ArchetypeHistory.user_id,
+                order_by=(ArchetypeHistory.changed_at, ArchetypeHistory.id)
+            ).label("previous")
+        ).where(ArchetypeHistory.changed_at < cutoff_at).subquery()
+        repeated = select(ranked.c.id).where(ranked.c.previous == ranked.c.archetype).limit(limit)
+        
+        result = await session.execute(
+            delete(ArchetypeHistory)
+            .where(ArchetypeHistory.changed_at < cutoff_at, ArchetypeHistory.id.in_(repeated))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @observe_query
+    async def get_weekly_summaries(
+        self, session: AsyncSession, user_id: str, limit: int
+    ) -> List[WeeklyMoodSummary]:
+        result = await session.execute(
+            select(WeeklyMoodSummary)
+            .where(WeeklyMoodSummary.user_id == user_id)
+            .order_by(WeeklyMoodSummary.year.desc(), WeeklyMoodSummary.week.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @observe_query
+    async def get_monthly_summaries(
+        self, session: AsyncSession, user_id: str, limit: int
+    ) -> List[MonthlyMoodSummary]:
+        result = await session.execute(
+            select(MonthlyMoodSummary)
+            .where(MonthlyMoodSummary.user_id == user_id)
+            .order_by(MonthlyMoodSummary.year.desc(), MonthlyMoodSummary.month.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @observe_query
+    async def upsert_topic_counts(
+        self, session: AsyncSession, topic_counts: Dict[Tuple[str, str], int], seen_at: datetime,
+        trend_weight: float = 0.0
+    ) -> None:
+        if not topic_counts:
+            return
+        
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "topic": topic,
+                "frequency": frequency,
+                "last_seen": seen_at,
+                "trend_score": frequency * trend_weight
+            }
+            for (user_id, topic), frequency in sorted(topic_counts.items())
+        ]
+        
+        stmt = self._insert(session, UserTopicsSummary).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserTopicsSummary.user_id, UserTopicsSummary.topic],
+            set_={
+                "frequency": UserTopicsSummary.frequency + stmt.excluded.frequency,
+                "last_seen": stmt.excluded.last_seen,
+                "trend_score": func.coalesce(UserTopicsSummary.trend_score, 0.0) + stmt.excluded.trend_score,
+                "updated_at": func.now()
+            }
+        )
+        await session.execute(stmt)
+    
+    @observe_query
+    async def rescale_trend_scores(self, session: AsyncSession, factor: float, batch_size: int = 1000) -> int:
+        await session.execute(
+            update(UserTopicsSummary.__table__)
+            .where(UserTopicsSummary.trend_score.is_not(None))
+            .values(trend_score=UserTopicsSummary.trend_score * factor)
+        )
+        
+        rescaled = 0
+        last_entry_id = ""
+        while True:
+            result = await session.execute(
+                select(ProcessedEntry.entry_id, ProcessedEntry.contribution)
+                .where(ProcessedEntry.entry_id > last_entry_id)
+                .order_by(ProcessedEntry.entry_id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                return rescaled
+            last_entry_id = rows[-1][0]
+            
+            updates = [
+                {"key_entry_id": entry_id, "rescaled": {**contribution, "trend_weight": contribution["trend_weight"] * factor}}
+                for entry_id, contribution in rows
+                if contribution and contribution.get("trend_weight")
+            ]
+            if updates:
+                await session.execute(
+                    update(ProcessedEntry.__table__)
+                    .where(ProcessedEntry.entry_id == bindparam("key_entry_id"))
+                    .values(contribution=bindparam("rescaled")),
+                    updates
+                )
+                rescaled += len(updates)
+    
+    @observe_query
+    async def get_top_topics(
+        self, session: AsyncSession, user_id: str, limit: int = 10, since: Optional[date] = None
+    ) -> List[TopicCount]:
+        if since is None:
+            result = await session.execute(
+                select(UserTopicsSummary.topic, UserTopicsSummary.frequency, UserTopicsSummary.last_seen)
+                .where(UserTopicsSummary.user_id == user_id, UserTopicsSummary.frequency > 0)
+                .order_by(UserTopicsSummary.frequency.desc(), UserTopicsSummary.topic)
+                .limit(limit)
+            )
+            return [TopicCount(*row) for row in result]
+        
+        frequency = func.sum(UserTopicsDaily.frequency)
+        result = await session.execute(
+            select(UserTopicsDaily.topic, frequency.label("frequency"), UserTopicsSummary.last_seen)
+            .outerjoin(
+                UserTopicsSummary,
+                and_(UserTopicsSummary.user_id == UserTopicsDaily.user_id, UserTopicsSummary.topic == UserTopicsDaily.topic)
+            )
+            .where(UserTopicsDaily.user_id == user_id, UserTopicsDaily.date >= since)
+            .group_by(UserTopicsDaily.topic, UserTopicsSummary.last_seen)
+            .having(frequency > 0)
+            .order_by(frequency.desc(), UserTopicsDaily.topic)
+            .limit(limit)
+        )
+        return [TopicCount(*row) for row in result]
+    
+    @observe_query
     async def save_archetype_history(
         self, session: AsyncSession, user_id: str, archetype: str,
         confidence: float, model_version: str
@@ -70,79 +724,216 @@ class AnalyticsRepository:
             user_id=user_id,
             archetype=archetype,
             confidence=confidence,
-            model_version=model_version
+            model_version=model_version,
+            changed_at=datetime.now(timezone.utc)
         )
         session.add(history)
         await session.commit()
-        await session.refresh(history)
         return history
     
+    @observe_query
+    async def insert_archetype_history(
+        self, session: AsyncSession, rows: List[Dict[str, Any]], chunk_size: int = 1000
+    ) -> int:
+        for offset in range(0, len(rows), chunk_size):
+            await session.execute(self._insert(session, ArchetypeHistory).values(rows[offset:offset + chunk_size]))
+        return len(rows)
+    
+    @observe_query
+    async def get_archetype_history_page(
+        self, session: AsyncSession, user_id: str, after: Optional[Tuple[datetime, str]],
+        limit: int, newest_first: bool = False
+    ) -> list:
+        query = select(
+            ArchetypeHistory.id, ArchetypeHistory.archetype, ArchetypeHistory.confidence, ArchetypeHistory.changed_at
+        ).where(ArchetypeHistory.user_id == user_id)
+        
+        if after is not None:
+            changed_at, row_id = after
+            if newest_first:
+                query = query.where(
+                    ArchetypeHistory.changed_at <= changed_at,
+                    or_(ArchetypeHistory.changed_at < changed_at, ArchetypeHistory.id < row_id)
+                )
+            else:
+                query = query.where(
+                    ArchetypeHistory.changed_at >= changed_at,
+                    or_(ArchetypeHistory.changed_at > changed_at, ArchetypeHistory.id > row_id)
+                )
+        
+        if newest_first:
+            query = query.order_by(ArchetypeHistory.changed_at.desc(), ArchetypeHistory.id.desc())
+        else:
+            query = query.order_by(ArchetypeHistory.changed_at, ArchetypeHistory.id)
+        
+        result = await session.execute(query.limit(limit))
+        return list(result.all())
+    
+    @observe_query
+    async def get_archetype_changes(
+        self, session: AsyncSession, months: Iterable[Tuple[str, int, int]], chunk_size: int = 200
+    ) -> Dict[Tuple[str, int, int], Optional[str]]:
+        months = sorted(set(months))
+        changes = {}
+        for offset in range(0, len(months), chunk_size):
+            chunk = months[offset:offset + chunk_size]
+            selects = []
+            for index, (user_id, year, month) in enumerate(chunk):
+                start = datetime(year, month, 1, tzinfo=timezone.utc)
+                end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+                selects.append(select(
+                    literal(index).label("idx"),
+                    self._archetype_before(user_id, start).label("previous"),
+                    self._archetype_before(user_id, end).label("current")
+                ))
+            
+            result = await session.execute(union_all(*selects) if len(selects) > 1 else selects[0])
+            for row in result:
+                changes[chunk[row.idx]] = archetype_change(row.previous, row.current)
+        return changes
+    
+    @staticmethod
+    def _archetype_before(user_id: str, before: datetime):
+        return (
+            select(ArchetypeHistory.archetype)
+            .where(ArchetypeHistory.user_id == user_id, ArchetypeHistory.changed_at < before)
+            .order_by(ArchetypeHistory.changed_at.desc(), ArchetypeHistory.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+    
+    @observe_query
     async def get_user_statistics(
         self, session: AsyncSession, user_id: str
     ) -> Optional[dict]:
-        from sqlalchemy import func
+        daily_totals = select(
+            func.count(DailyMoodSummary.id).label("total_diary_entries"),
+            func.coalesce(func.sum(DailyMoodSummary.entry_count), 0).label("total_mood_analyses"),
+            func.coalesce(func.sum(DailyMoodSummary.total_tokens), 0).label("total_tokens"),
+            func.min(DailyMoodSummary.date).label("first_date")
+        ).where(DailyMoodSummary.user_id == user_id).subquery()
         
-        total_diary_entries = await session.execute(
-            select(func.count(DailyMoodSummary.id)).where(
-                DailyMoodSummary.user_id == user_id
-            )
-        )
-        diary_count = total_diary_entries.scalar() or 0
+        latest_emotion = select(DailyMoodSummary.dominant_emotion).where(
+            DailyMoodSummary.user_id == user_id
+        ).order_by(DailyMoodSummary.date.desc()).limit(1).scalar_subquery()
         
-        total_mood_analyses = await session.execute(
-            select(func.sum(DailyMoodSummary.entry_count)).where(
-                DailyMoodSummary.user_id == user_id
-            )
-        )
-        mood_count = total_mood_analyses.scalar() or 0
+        last_archetype_change = select(func.max(ArchetypeHistory.changed_at)).where(
+            ArchetypeHistory.user_id == user_id
+        ).scalar_subquery()
+        
+        top_topics = select(UserTopicsSummary.topic, UserTopicsSummary.trend_score).where(
+            UserTopicsSummary.user_id == user_id, UserTopicsSummary.frequency > 0
+        ).order_by(UserTopicsSummary.trend_score.desc().nulls_last(), UserTopicsSummary.topic).limit(5).subquery()
         
-        total_tokens = await session.execute(
-            select(func.sum(DailyMoodSummary.total_tokens)).where(
-                DailyMoodSummary.user_id == user_id
+        result = await session.execute(
+            select(
+                daily_totals,
+                latest_emotion.label("dominant_emotion"),
+                last_archetype_change.label("last_archetype_change"),
+                top_topics.c.topic
             )
+            .select_from(daily_totals)
+            .outerjoin(top_topics, true())
+            .order_by(top_topics.c.trend_score.desc().nulls_last(), top_topics.c.topic)
         )
-        tokens = total_tokens.scalar() or 0
+        rows = result.all()
+        first = rows[0]
         
-        latest_summary = await session.execute(
-            select(DailyMoodSummary).where(
-                DailyMoodSummary.user_id == user_id
-            ).order_by(DailyMoodSummary.date.desc()).limit(1)
+        return self._statistics_dict(
+            first.total_diary_entries,
+            first.total_mood_analyses,
+            first.total_tokens,
+            first.dominant_emotion,
+            [row.topic for row in rows if row.topic is not None],
+            first.first_date,
+            first.last_archetype_change
         )
-        latest = latest_summary.scalar_one_or_none()
+    
+    @observe_query
+    async def get_user_statistics_batch(
+        self, session: AsyncSession, user_ids: List[str]
+    ) -> Dict[str, dict]:
+        if not user_ids:
+            return {}
         
-        dominant_emotion = latest.dominant_emotion if latest else ""
+        totals_result = await session.execute(
+            select(
+                DailyMoodSummary.user_id,
+                func.count(DailyMoodSummary.id).label("total_diary_entries"),
+                func.sum(DailyMoodSummary.entry_count).label("total_mood_analyses"),
+                func.sum(DailyMoodSummary.total_tokens).label("total_tokens"),
+                func.min(DailyMoodSummary.date).label("first_date")
+            )
+            .where(self._user_id_in(session, DailyMoodSummary.user_id, user_ids))
+            .group_by(DailyMoodSummary.user_id)
+        )
+        totals = {row.user_id: row for row in totals_result}
         
-        topics_summary = await session.execute(
-            select(UserTopicsSummary).where(
-                UserTopicsSummary.user_id == user_id
-            ).order_by(UserTopicsSummary.frequency.desc()).limit(5)
+        latest_ranked = select(
+            DailyMoodSummary.user_id,
+            DailyMoodSummary.dominant_emotion,
+            func.row_number().over(
+                partition_by=DailyMoodSummary.user_id,
+                order_by=DailyMoodSummary.date.desc()
+            ).label("position")
+        ).where(self._user_id_in(session, DailyMoodSummary.user_id, user_ids)).subquery()
+        latest_result = await session.execute(
+            select(latest_ranked.c.user_id, latest_ranked.c.dominant_emotion).where(latest_ranked.c.position == 1)
         )
-        topics = topics_summary.scalars().all()
-        top_topics = [t.topic for t in topics] if topics else []
+        dominant_emotions = {row.user_id: row.dominant_emotion for row in latest_result}
         
-        first_summary = await session.execute(
-            select(DailyMoodSummary).where(
-                DailyMoodSummary.user_id == user_id
-            ).order_by(DailyMoodSummary.date.asc()).limit(1)
+        topics_ranked = select(
+            UserTopicsSummary.user_id,
+            UserTopicsSummary.topic,
+            func.row_number().over(
+                partition_by=UserTopicsSummary.user_id,
+                order_by=(UserTopicsSummary.trend_score.desc().nulls_last(), UserTopicsSummary.topic)
+            ).label("position")
+        ).where(
+            self._user_id_in(session, UserTopicsSummary.user_id, user_ids), UserTopicsSummary.frequency > 0
+        ).subquery()
+        topics_result = await session.execute(
+            select(topics_ranked.c.user_id, topics_ranked.c.topic)
+            .where(topics_ranked.c.position <= 5)
+            .order_by(topics_ranked.c.user_id, topics_ranked.c.position)
         )
-        first = first_summary.scalar_one_or_none()
-        profile_created_at = first.date if first else datetime.now()
+        top_topics: Dict[str, List[str]] = {}
+        for row in topics_result:
+            top_topics.setdefault(row.user_id, []).append(row.topic)
         
-        archetype_history = await session.execute(
-            select(ArchetypeHistory).where(
-                ArchetypeHistory.user_id == user_id
-            ).order_by(ArchetypeHistory.changed_at.desc()).limit(1)
+        archetype_result = await session.execute(
+            select(ArchetypeHistory.user_id, func.max(ArchetypeHistory.changed_at).label("changed_at"))
+            .where(self._user_id_in(session, ArchetypeHistory.user_id, user_ids))
+            .group_by(ArchetypeHistory.user_id)
         )
-        last_archetype = archetype_history.scalar_one_or_none()
-        last_personality_update = last_archetype.changed_at if last_archetype else datetime.now()
+        archetype_changes = {row.user_id: row.changed_at for row in archetype_result}
         
+        statistics = {}
+        for user_id in user_ids:
+            total = totals.get(user_id)
+            statistics[user_id] = self._statistics_dict(
+                total.total_diary_entries if total else 0,
+                total.total_mood_analyses if total else 0,
+                total.total_tokens if total else 0,
+                dominant_emotions.get(user_id),
+                top_topics.get(user_id, []),
+                total.first_date if total else None,
+                archetype_changes.get(user_id)
+            )
+        return statistics
+    
+    @staticmethod
+    def _statistics_dict(
+        total_diary_entries, total_mood_analyses, total_tokens, dominant_emotion,
+        top_topics: List[str], first_date: Optional[date], last_archetype_change: Optional[datetime]
+    ) -> dict:
         return {
-            "total_diary_entries": diary_count,
-            "total_mood_analyses": mood_count,
-            "total_tokens": tokens,
-            "dominant_emotion": dominant_emotion,
+            "total_diary_entries": total_diary_entries or 0,
+            "total_mood_analyses": total_mood_analyses or 0,
+            "total_tokens": total_tokens or 0,
+            "dominant_emotion": dominant_emotion or "",
             "top_topics": top_topics,
-            "profile_created_at": profile_created_at,
-            "last_personality_update": last_personality_update
+            "profile_created_at": datetime.combine(first_date, time.min) if first_date else datetime.now(),
+            "last_personality_update": last_archetype_change or datetime.now()
         }
 
@@ -0,0 +1,54 @@
+from typing import Any, List, Optional, Union
+import json
+import numpy as np
+from sqlalchemy import JSON, LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from src.domain.accumulator import EMOTION_DIM
+
+EMOTION_VECTOR_DTYPE = np.dtype("<f4")
+EMOTION_VECTOR_STORAGES = ("json", "binary")
+
+
+def encode_emotion_vector(value: Any) -> bytes:
+    vector = np.asarray(value, dtype=EMOTION_VECTOR_DTYPE)
+    if vector.shape != (EMOTION_DIM,):
+        raise ValueError(f"emotion_vector must have {EMOTION_DIM} values, got {vector.size}")
+    return vector.tobytes()
+
+
+def decode_emotion_vector(value: Union[bytes, memoryview, str, List[float], None]) -> Optional[Any]:
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=EMOTION_VECTOR_DTYPE)
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def emotion_vector_storage(dialect) -> str:
+    return getattr(dialect, "emotion_vector_storage", "json")
+
+
+class EmotionVector(TypeDecorator):
+    impl = JSON
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if emotion_vector_storage(dialect) == "binary":
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(JSON())
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if emotion_vector_storage(dialect) == "binary":
+            return encode_emotion_vector(value)
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return value
+    
+    def process_result_value(self, value, dialect):
+        return decode_emotion_vector(value)
+
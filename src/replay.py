@@ -0,0 +1,316 @@
+from typing import Dict, List, Optional, Set, Tuple
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import time
+import structlog
+
+from src.config import Config
+from src.domain.accumulator import MoodAccumulator
+from src.domain.events import parse_mood_analyzed, entry_contribution
+from src.domain.trending import TopicTrending
+from src.infrastructure.database import Database
+from src.infrastructure.repository import AnalyticsRepository
+from src.application.rollup import RollupService
+
+logger = structlog.get_logger()
+
+Entry = Tuple[str, date, dict]
+Partial = Tuple[int, int, Dict[Tuple[str, date], dict], Dict[str, Entry]]
+
+
+def aggregate_range(path: str, start: int, end: int) -> Partial:
+    accumulators: Dict[Tuple[str, date], MoodAccumulator] = {}
+    entries: Dict[str, Entry] = {}
+    events = 0
+    skipped = 0
+    
+    with open(path, "rb") as source:
+        if start > 0:
+            source.seek(start - 1)
+            source.readline()
+        
+        while source.tell() < end:
+            line = source.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            
+            try:
+                analysis_data = parse_mood_analyzed(json.loads(line))
+                if analysis_data is None:
+                    skipped += 1
+                    continue
+                events += 1
+                entry_id = analysis_data["entry_id"]
+                if entry_id:
+                    if entry_id in entries:
+                        continue
+                    entries[entry_id] = (analysis_data["user_id"], analysis_data["date"], entry_contribution(analysis_data))
+                key = (analysis_data["user_id"], analysis_data["date"])
+                accumulator = accumulators.get(key)
+                if accumulator is None:
+                    accumulator = accumulators[key] = MoodAccumulator()
+                accumulator.add(analysis_data)
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1
+    
+    return events, skipped, {key: accumulator.to_dict() for key, accumulator in accumulators.items()}, entries
+
+
+def split_range(start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+    step = max((end - start) // parts, 1)
+    bounds = list(range(start, end, step))[:parts] + [end]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def discount(accumulators: Dict[Tuple[str, date], MoodAccumulator], entry: Entry):
+    user_id, entry_date, contribution = entry
+    accumulator = accumulators.get((user_id, entry_date))
+    if accumulator is None:
+        return
+    if accumulator.count <= 1:
+        del accumulators[(user_id, entry_date)]
+    else:
+        accumulator.remove(contribution)
+
+
+def merge_partials(partials: List[Partial]) -> Tuple[int, int, Dict[Tuple[str, date], MoodAccumulator], Dict[str, Entry]]:
+    merged: Dict[Tuple[str, date], MoodAccumulator] = {}
+    entries: Dict[str, Entry] = {}
+    events = 0
+    skipped = 0
+    for partial_events, partial_skipped, accumulators, partial_entries in partials:
+        events += partial_events
+        skipped += partial_skipped
+        for key, data in accumulators.items():
+            accumulator = MoodAccumulator.from_dict(data)
+            if key in merged:
+                merged[key].merge(accumulator)
+            else:
+                merged[key] = accumulator
+        for entry_id, entry in partial_entries.items():
+            if entry_id in entries:
+                discount(merged, entry)
+            else:
+                entries[entry_id] = entry
+    return events, skipped, merged, entries
+
+
+class Checkpoint:
+    def __init__(self, name: Optional[str], source: str):
+        self.name = name
+        self.source = source
+        self.offset = 0
+        self.events = 0
+        self.skipped = 0
+    
+    async def load(self, repository: AnalyticsRepository, session) -> bool:
+        if self.name is None:
+            return False
+        stored = await repository.get_replay_checkpoint(session, self.name)
+        if stored is None:
+            return False
+        if stored.source != self.source:
+            raise SystemExit(f"Checkpoint {self.name} belongs to {stored.source}, not {self.source}")
+        self.offset = stored.position
+        self.events = stored.events
+        self.skipped = stored.skipped
+        return True
+    
+    async def save(self, repository: AnalyticsRepository, session):
+        if self.name is None:
+            return
+        await repository.save_replay_checkpoint(session, self.name, self.source, self.offset, self.events, self.skipped)
+
+
+class Replayer:
+    def __init__(
+        self, repository: AnalyticsRepository, db: Database, workers: int,
+        segment_bytes: int, insert_batch_size: int, trending: Optional[TopicTrending] = None
+    ):
+        self.repository = repository
+        self.db = db
+        self.workers = workers
+        self.segment_bytes = segment_bytes
+        self.insert_batch_size = insert_batch_size
+        self.trending = trending or TopicTrending()
+    
+    async def run(self, path: str, checkpoint: Checkpoint, reset: bool = False):
+        size = os.path.getsize(path)
+        resumed = await self._load(checkpoint)
+        if reset and not resumed:
+            await self._reset()
+        elif resumed:
+            logger.info("Resuming replay", offset=checkpoint.offset, events=checkpoint.events)
+        
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        replayed = 0
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while checkpoint.offset < size:
+                segment_end = min(checkpoint.offset + self.segment_bytes, size)
+                partials = await asyncio.gather(*(
+                    loop.run_in_executor(pool, aggregate_range, path, start, end)
+                    for start, end in split_range(checkpoint.offset, segment_end, self.workers)
+                ))
+                events, skipped, accumulators, entries = merge_partials(partials)
+                checkpoint.offset = segment_end
+                checkpoint.events += events
+                checkpoint.skipped += skipped
+                duplicates = await self._write(accumulators, entries, checkpoint)
+                
+                replayed += events
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "Replay progress",
+                    offset=segment_end,
+                    size=size,
+                    events=checkpoint.events,
+                    skipped=checkpoint.skipped,
+                    duplicates=duplicates,
+                    summaries=len(accumulators),
+                    events_per_second=round(replayed / elapsed) if elapsed else None
+                )
+        
+        elapsed = time.perf_counter() - started
+        return {
+            "events": checkpoint.events,
+            "skipped": checkpoint.skipped,
+            "elapsed_seconds": elapsed,
+            "events_per_second": replayed / elapsed if elapsed else 0.0
+        }
+    
+    async def _load(self, checkpoint: Checkpoint) -> bool:
+        async for session in self.db.get_session():
+            try:
+                return await checkpoint.load(self.repository, session)
+            finally:
+                await session.close()
+        return False
+    
+    async def _reset(self):
+        async for session in self.db.get_session():
+            try:
+                await self.repository.reset_summaries(session)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        logger.info("Summaries reset before replay")
+    
+    async def _write(
+        self, accumulators: Dict[Tuple[str, date], MoodAccumulator], entries: Dict[str, Entry], checkpoint: Checkpoint
+    ) -> int:
+        async for session in self.db.get_session():
+            try:
+                claimed = await self._claim(session, entries)
+                for entry_id in entries.keys() - claimed:
+                    discount(accumulators, entries[entry_id])
+                
+                keys = sorted(accumulators)
+                for i in range(0, len(keys), self.insert_batch_size):
+                    chunk = {key: accumulators[key] for key in keys[i:i + self.insert_batch_size]}
+                    await self.repository.merge_daily_accumulators(session, chunk)
+                    await self.repository.mark_rollups_dirty(session, chunk.keys())
+                await self._upsert_topics(session, accumulators)
+                await checkpoint.save(self.repository, session)
+                await session.commit()
+                return len(entries) - len(claimed)
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        return 0
+    
+    async def _claim(self, session, entries: Dict[str, Entry]) -> Set[str]:
+        entry_ids = sorted(entries)
+        claimed = set()
+        for i in range(0, len(entry_ids), self.insert_batch_size):
+            chunk = []
+            for entry_id in entry_ids[i:i + self.insert_batch_size]:
+                user_id, entry_date, contribution = entries[entry_id]
+                contribution["trend_weight"] = self.trending.weight(self._seen_at(entry_date))
+                chunk.append((entry_id, user_id, entry_date, contribution))
+            claimed |= await self.repository.claim_entries(session, chunk)
+        return claimed
+    
+    async def _upsert_topics(self, session, accumulators: Dict[Tuple[str, date], MoodAccumulator]):
+        topic_counts: Dict[date, Dict[Tuple[str, str], int]] = defaultdict(dict)
+        daily_topic_counts: Dict[Tuple[str, date, str], int] = {}
+        for (user_id, entry_date), accumulator in accumulators.items():
+            for topic, frequency in accumulator.topic_counts.items():
+                topic_counts[entry_date][(user_id, topic)] = frequency
+                daily_topic_counts[(user_id, entry_date, topic)] = frequency
+        
+        await self.repository.upsert_daily_topic_counts(session, daily_topic_counts)
+        
+        for entry_date in sorted(topic_counts):
+            seen_at = self._seen_at(entry_date)
+            await self.repository.upsert_topic_counts(
+                session, topic_counts[entry_date], seen_at, self.trending.weight(seen_at)
+            )
+    
+    @staticmethod
+    def _seen_at(entry_date: date) -> datetime:
+        return datetime(entry_date.year, entry_date.month, entry_date.day, tzinfo=timezone.utc)
+
+
+async def replay(args) -> dict:
+    config = Config(database_url=args.database_url) if args.database_url else Config()
+    db = Database(config)
+    try:
+        await db.create_tables()
+        repository = AnalyticsRepository(db)
+        replayer = Replayer(
+            repository, db, args.workers, args.segment_mb * 1024 * 1024, args.insert_batch_size,
+            TopicTrending(config.trending_half_life_days, config.trending_landmark)
+        )
+        source = str(Path(args.source).resolve())
+        result = await replayer.run(source, Checkpoint(args.checkpoint, source), reset=args.reset)
+        
+        if not args.skip_rollups:
+            rollup_service = RollupService(
+                repository, db, batch_size=config.rollup_batch_size, archetype_changes=config.rollup_archetype_change
+            )
+            buckets = 0
+            while True:
+                processed = await rollup_service.process_dirty()
+                buckets += processed
+                if processed == 0:
+                    break
+            result["rollup_buckets"] = buckets
+        return result
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily summaries and rollups from a MoodAnalyzed JSONL dump")
+    parser.add_argument("source", help="JSONL file with one MoodAnalyzed message value per line")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--segment-mb", type=int, default=64, help="bytes aggregated and written between checkpoints")
+    parser.add_argument("--insert-batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default=None, help="resume from and record progress under this name in the database")
+    parser.add_argument("--reset", action="store_true", help="delete existing summaries before a fresh replay")
+    parser.add_argument("--skip-rollups", action="store_true")
+    args = parser.parse_args()
+    
+    result = asyncio.run(replay(args))
+    logger.info("Replay finished", **result)
+
+
+if __name__ == "__main__":
+    main()
+
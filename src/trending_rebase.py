@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import structlog
+
+from src.config import Config
+from src.domain.trending import TopicTrending
+from src.infrastructure.database import Database
+from src.infrastructure.repository import AnalyticsRepository
+
+logger = structlog.get_logger()
+
+
+async def rebase(
+    repository: AnalyticsRepository, db: Database, trending: TopicTrending, landmark: datetime, batch_size: int = 1000
+) -> dict:
+    if landmark.tzinfo is None:
+        landmark = landmark.replace(tzinfo=timezone.utc)
+    factor = trending.rebase_factor(landmark)
+    
+    async for session in db.get_session():
+        try:
+            entries = await repository.rescale_trend_scores(session, factor, batch_size)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+    
+    return {
+        "previous_landmark": trending.landmark.isoformat(),
+        "landmark": landmark.isoformat(),
+        "factor": factor,
+        "entries_rescaled": entries
+    }
+
+
+async def run(args) -> dict:
+    config = Config(database_url=args.database_url) if args.database_url else Config()
+    db = Database(config)
+    try:
+        trending = TopicTrending(config.trending_half_life_days, config.trending_landmark)
+        return await rebase(
+            AnalyticsRepository(db), db, trending, datetime.fromisoformat(args.landmark), args.batch_size
+        )
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rescale stored trend scores to a new trending landmark; stop the consumers first and set trending.landmark afterwards"
+    )
+    parser.add_argument("landmark", help="new landmark as an ISO 8601 timestamp")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    
+    result = asyncio.run(run(args))
+    logger.info("Trending landmark rebased", **result)
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+
+from src.config import Config
+
+
+@pytest.fixture
+def run():
+    return asyncio.run
+
+
+@pytest.fixture
+def database(tmp_path, run):
+    pytest.importorskip("aiosqlite")
+    from src.infrastructure.database import Database
+    
+    databases = []
+    
+    def create(name="analytics", create_tables=True, **options):
+        db = Database(Config(database_url=f"sqlite+aiosqlite:///{tmp_path / f'{name}.db'}", **options))
+        databases.append(db)
+        if create_tables:
+            run(db.create_tables())
+        return db
+    
+    try:
+        yield create
+    finally:
+        for db in databases:
+            run(db.close())
+
+
+@pytest.fixture
+def db(database):
+    return database()
+
+
+@pytest.fixture
+def repository(db):
+    from src.infrastructure.repository import AnalyticsRepository
+    
+    return AnalyticsRepository(db)
+
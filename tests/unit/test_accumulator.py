@@ -0,0 +1,111 @@
+import pytest
+from src.domain.accumulator import MoodAccumulator
+from src.domain.aggregator import MoodAggregator
+
+
+def _analyses():
+    return [
+        {
+            "emotion_vector": [0.8, 0.3, 0.1, 0.2, 0.1, 0.0, 0.1, 0.4],
+            "valence": 0.6,
+            "arousal": 0.4,
+            "tokens_count": 100,
+            "detected_topics": ["работа", "семья"]
+        },
+        {
+            "emotion_vector": [0.1, 0.2, 0.7, 0.1, 0.5, 0.1, 0.3, 0.2],
+            "valence": -0.4,
+            "arousal": 0.7,
+            "tokens_count": 40,
+            "detected_topics": ["работа"]
+        },
+        {
+            "emotion_vector": [0.3, 0.6, 0.1, 0.2, 0.1, 0.0, 0.0, 0.5],
+            "valence": 0.2,
+            "arousal": 0.1,
+            "tokens_count": 70,
+            "detected_topics": ["спорт"]
+        }
+    ]
+
+
+def test_accumulator_matches_daily_aggregate():
+    analyses = _analyses()
+    accumulator = MoodAccumulator()
+    for analysis in analyses:
+        accumulator.add(analysis)
+    
+    expected = MoodAggregator.calculate_daily_aggregate(analyses)
+    actual = accumulator.to_aggregate()
+    
+    assert actual["emotion_vector"] == pytest.approx(expected["emotion_vector"])
+    assert actual["dominant_emotion"] == expected["dominant_emotion"]
+    assert actual["average_valence"] == pytest.approx(expected["average_valence"])
+    assert actual["average_arousal"] == pytest.approx(expected["average_arousal"])
+    assert actual["volatility_index"] == pytest.approx(expected["volatility_index"])
+    assert actual["entry_count"] == expected["entry_count"]
+    assert actual["total_tokens"] == expected["total_tokens"]
+    assert actual["topics"] == expected["topics"]
+
+
+def test_merge_equals_sequential_add():
+    analyses = _analyses()
+    sequential = MoodAccumulator()
+    for analysis in analyses:
+        sequential.add(analysis)
+    
+    left = MoodAccumulator().add(analyses[0])
+    right = MoodAccumulator().add(analyses[1]).add(analyses[2])
+    merged = MoodAccumulator.from_dict(left.to_dict()).merge(MoodAccumulator.from_dict(right.to_dict()))
+    
+    assert merged.count == sequential.count
+    assert merged.valence_mean == pytest.approx(sequential.valence_mean)
+    assert merged.valence_m2 == pytest.approx(sequential.valence_m2)
+    assert merged.arousal_m2 == pytest.approx(sequential.arousal_m2)
+    assert merged.emotion_sum == pytest.approx(sequential.emotion_sum)
+    assert merged.topic_counts == sequential.topic_counts
+
+
+def test_add_rejects_wrong_emotion_dimension():
+    with pytest.raises(ValueError):
+        MoodAccumulator().add({"emotion_vector": [0.1, 0.2]})
+
+
+def test_remove_is_the_inverse_of_add():
+    first, second, third = _analyses()
+    accumulator = MoodAccumulator()
+    for analysis in (first, second, third):
+        accumulator.add(analysis)
+    accumulator.remove(second)
+    
+    expected = MoodAccumulator().add(first).add(third)
+    
+    assert accumulator.count == expected.count
+    assert accumulator.valence_mean == pytest.approx(expected.valence_mean)
+    assert accumulator.valence_m2 == pytest.approx(expected.valence_m2)
+    assert accumulator.arousal_m2 == pytest.approx(expected.arousal_m2)
+    assert accumulator.emotion_sum == pytest.approx(expected.emotion_sum)
+    assert accumulator.total_tokens == expected.total_tokens
+    assert accumulator.topic_counts == expected.topic_counts
+    
+    accumulator.remove(first).remove(third)
+    assert accumulator.count == 0
+    assert accumulator.to_aggregate() == {}
+
+
+
+def test_remove_rejects_contributions_it_cannot_hold():
+    first, second, _ = _analyses()
+    accumulator = MoodAccumulator().add(first)
+    
+    with pytest.raises(ValueError):
+        accumulator.remove(second)
+    with pytest.raises(ValueError):
+        accumulator.remove({**first, "emotion_vector": [0.1] * 7})
+    assert accumulator.count == 1
+    assert accumulator.total_tokens == first["tokens_count"]
+    
+    accumulator.remove(first)
+    with pytest.raises(ValueError):
+        accumulator.remove(first)
+
@@ -1,3 +1,5 @@
+from datetime import date, timedelta
+import numpy as np
 import pytest
 from src.domain.aggregator import MoodAggregator
 
@@ -20,3 +22,125 @@ def test_calculate_daily_aggregate():
     assert aggregate["entry_count"] == 1
     assert aggregate["total_tokens"] == 100
 
+
+def test_calculate_daily_aggregates_batch_matches_scalar():
+    rng = np.random.default_rng(7)
+    size = 500
+    user_idx = rng.integers(0, 20, size)
+    day_idx = rng.integers(0, 5, size)
+    emotions = rng.random((size, 8))
+    valences = rng.uniform(-1.0, 1.0, size)
+    arousals = rng.random(size)
+    tokens = rng.integers(0, 300, size)
+    
+    batch = MoodAggregator.calculate_daily_aggregates_batch(user_idx, day_idx, emotions, valences, arousals, tokens)
+    
+    assert len(batch["user_idx"]) == len(set(zip(user_idx.tolist(), day_idx.tolist())))
+    for i, (user, day) in enumerate(zip(batch["user_idx"], batch["day_idx"])):
+        mask = (user_idx == user) & (day_idx == day)
+        analyses = [
+            {
+                "emotion_vector": emotions[j].tolist(),
+                "valence": valences[j],
+                "arousal": arousals[j],
+                "tokens_count": int(tokens[j])
+            }
+            for j in np.flatnonzero(mask)
+        ]
+        expected = MoodAggregator.calculate_daily_aggregate(analyses)
+        
+        assert batch["emotion_vector"][i].tolist() == pytest.approx(expected["emotion_vector"], abs=1e-12)
+        assert batch["dominant_emotion"][i] == expected["dominant_emotion"]
+        assert batch["average_valence"][i] == pytest.approx(expected["average_valence"], abs=1e-12)
+        assert batch["average_arousal"][i] == pytest.approx(expected["average_arousal"], abs=1e-12)
+        assert batch["volatility_index"][i] == pytest.approx(expected["volatility_index"], abs=1e-12)
+        assert batch["entry_count"][i] == expected["entry_count"]
+        assert batch["total_tokens"][i] == expected["total_tokens"]
+
+
+
+def random_periods(seed, size, groups):
+    rng = np.random.default_rng(seed)
+    return {
+        "user_idx": rng.integers(0, 10, size),
+        "group_idx": rng.integers(0, groups, size),
+        "order_idx": rng.permutation(size),
+        "emotions": rng.random((size, 8)),
+        "valences": rng.choice([-0.5, -0.2, 0.0, 0.2, 0.5], size),
+        "arousals": rng.random(size),
+        "entry_counts": rng.integers(0, 4, size),
+        "tokens": rng.integers(0, 300, size)
+    }
+
+
+def rows_of(columns, user, group):
+    mask = (columns["user_idx"] == user) & (columns["group_idx"] == group)
+    positions = sorted(np.flatnonzero(mask), key=lambda j: columns["order_idx"][j])
+    return [
+        {
+            "date": date(2024, 1, 1) + timedelta(days=int(columns["order_idx"][j])),
+            "emotion_vector": columns["emotions"][j].tolist(),
+            "average_valence": columns["valences"][j],
+            "average_arousal": columns["arousals"][j],
+            "entry_count": int(columns["entry_counts"][j]),
+            "total_tokens": int(columns["tokens"][j])
+        }
+        for j in positions
+    ]
+
+
+def assert_period_matches(batch, i, expected):
+    assert batch["emotion_vector"][i].tolist() == pytest.approx(expected["emotion_vector"], abs=1e-12)
+    assert batch["dominant_emotion"][i] == expected["dominant_emotion"]
+    assert batch["average_valence"][i] == pytest.approx(expected["average_valence"], abs=1e-12)
+    assert batch["average_arousal"][i] == pytest.approx(expected["average_arousal"], abs=1e-12)
+    assert batch["volatility"][i] == pytest.approx(expected["volatility"], abs=1e-12)
+    assert batch["trend"][i] == expected["trend"]
+    assert batch["entry_count"][i] == expected["entry_count"]
+    assert batch["total_tokens"][i] == expected["total_tokens"]
+
+
+def test_calculate_weekly_aggregates_batch_matches_scalar():
+    columns = random_periods(11, 400, 4)
+    
+    batch = MoodAggregator.calculate_weekly_aggregates_batch(
+        columns["user_idx"], columns["group_idx"], columns["order_idx"], columns["emotions"],
+        columns["valences"], columns["arousals"], columns["entry_counts"], columns["tokens"]
+    )
+    
+    assert len(batch["user_idx"]) == len(set(zip(columns["user_idx"].tolist(), columns["group_idx"].tolist())))
+    for i, (user, week) in enumerate(zip(batch["user_idx"], batch["week_idx"])):
+        expected = MoodAggregator.calculate_weekly_aggregate(rows_of(columns, user, week))
+        
+        assert_period_matches(batch, i, expected)
+        assert (date(2024, 1, 1) + timedelta(days=int(batch["most_emotional_day"][i]))).isoformat() == expected["most_emotional_day"]
+        assert (date(2024, 1, 1) + timedelta(days=int(batch["most_productive_day"][i]))).isoformat() == expected["most_productive_day"]
+
+
+def test_calculate_monthly_aggregates_batch_matches_scalar():
+    columns = random_periods(13, 300, 3)
+    
+    batch = MoodAggregator.calculate_monthly_aggregates_batch(
+        columns["user_idx"], columns["group_idx"], columns["order_idx"], columns["emotions"],
+        columns["valences"], columns["arousals"], columns["entry_counts"], columns["tokens"]
+    )
+    
+    assert len(batch["user_idx"]) == len(set(zip(columns["user_idx"].tolist(), columns["group_idx"].tolist())))
+    for i, (user, month) in enumerate(zip(batch["user_idx"], batch["month_idx"])):
+        expected = MoodAggregator.calculate_monthly_aggregate(rows_of(columns, user, month))
+        
+        assert_period_matches(batch, i, expected)
+        assert batch["active_days"][i] == expected["active_days"]
+        assert batch["average_entries_per_day"][i] == pytest.approx(expected["average_entries_per_day"], abs=1e-12)
+
+
+def test_period_batches_accept_empty_input():
+    empty = np.empty(0)
+    
+    weekly = MoodAggregator.calculate_weekly_aggregates_batch(empty, empty, empty, empty, empty, empty, empty, empty)
+    monthly = MoodAggregator.calculate_monthly_aggregates_batch(empty, empty, empty, empty, empty, empty, empty, empty)
+    
+    assert weekly["emotion_vector"].shape == (0, 8)
+    assert len(weekly["most_emotional_day"]) == 0
+    assert len(monthly["active_days"]) == 0
+
@@ -0,0 +1,102 @@
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import select, func
+
+from src.infrastructure.models import ArchetypeHistory
+from src.infrastructure.cache import UserCache
+from src.application.archetype_buffer import ArchetypeHistoryBuffer
+from src.application.event_handler import EventHandler
+
+
+def archetype_event(user_id, archetype="explorer"):
+    return {"payload": {"user_id": user_id, "archetype": archetype, "confidence": 0.7, "model_version": "v1"}}
+
+
+async def count_rows(db):
+    async for session in db.get_session():
+        try:
+            return await session.scalar(select(func.count()).select_from(ArchetypeHistory))
+        finally:
+            await session.close()
+
+
+
+def test_buffer_flushes_when_full_and_on_close(run, db, repository):
+    async def scenario(db, repository):
+        buffer = ArchetypeHistoryBuffer(repository, db, max_rows=3, flush_interval_seconds=60)
+        handler = EventHandler(repository, db, archetype_buffer=buffer)
+        
+        for index in range(4):
+            await handler.handle_message("metachat.archetype.updated", archetype_event(f"u{index}"))
+        after_threshold = await count_rows(db), len(buffer)
+        
+        await buffer.close()
+        return after_threshold, await count_rows(db), len(buffer)
+    
+    after_threshold, after_close, pending = run(scenario(db, repository))
+    
+    assert after_threshold == (3, 1)
+    assert after_close == 4
+    assert pending == 0
+
+
+def test_flush_invalidates_cached_users_only_once_rows_are_written(run, db, repository):
+    async def scenario(db, repository):
+        cache = UserCache(100, 60)
+        cache.set("u1", "statistics", {"archetype": "sage"})
+        buffer = ArchetypeHistoryBuffer(repository, db, cache=cache, max_rows=10)
+        
+        await buffer.add("u1", "explorer", 0.9, "v1")
+        before_flush = cache.get("u1", "statistics")
+        await buffer.flush()
+        return before_flush, cache.get("u1", "statistics")
+    
+    before_flush, after_flush = run(scenario(db, repository))
+    
+    assert before_flush == {"archetype": "sage"}
+    assert after_flush is None
+
+
+def test_failed_flush_keeps_rows_for_the_next_attempt(run, db, repository):
+    async def scenario(db, repository):
+        buffer = ArchetypeHistoryBuffer(repository, db, max_rows=10)
+        await buffer.add("u1", "explorer", 0.9, "v1")
+        
+        insert = repository.insert_archetype_history
+        
+        async def failing_insert(session, rows):
+            raise RuntimeError("database unavailable")
+        
+        repository.insert_archetype_history = failing_insert
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        pending = len(buffer)
+        
+        repository.insert_archetype_history = insert
+        await buffer.add("u2", "sage", 0.4, "v1")
+        await buffer.flush()
+        return pending, await count_rows(db)
+    
+    pending, written = run(scenario(db, repository))
+    
+    assert pending == 1
+    assert written == 2
+
+
+def test_rows_kept_after_failed_flushes_are_capped(run, db, repository):
+    async def failing_insert(session, rows):
+        raise RuntimeError("database unavailable")
+    
+    async def scenario():
+        repository.insert_archetype_history = failing_insert
+        buffer = ArchetypeHistoryBuffer(repository, db, max_rows=2, max_pending=3)
+        for index in range(5):
+            with pytest.raises(RuntimeError):
+                await buffer.add(f"u{index}", "explorer", 0.5, "v1")
+                await buffer.flush()
+        return [row["user_id"] for row in buffer._rows]
+    
+    assert run(scenario()) == ["u2", "u3", "u4"]
+
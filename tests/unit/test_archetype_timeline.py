@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from src.domain.accumulator import MoodAccumulator
+from src.domain.archetypes import archetype_change
+from src.application.archetype_timeline import ArchetypeTimeline
+from src.application.rollup import RollupService
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HISTORY = ["explorer", "explorer", "sage", "sage", "sage", "explorer", "rebel", "rebel"]
+
+
+def history_rows(user_id, archetypes, start=START):
+    return [
+        {
+            "id": f"{user_id}-{start:%Y%m%d}-{index:03d}",
+            "user_id": user_id,
+            "archetype": archetype,
+            "confidence": 0.1 * (index + 1),
+            "model_version": "v1",
+            "changed_at": start + timedelta(hours=index)
+        }
+        for index, archetype in enumerate(archetypes)
+    ]
+
+
+@pytest.fixture
+def run_with_history(run, db, repository):
+    async def main(rows, scenario):
+        async for session in db.get_session():
+            await repository.insert_archetype_history(session, rows)
+            await session.commit()
+        return await scenario(db, repository)
+    
+    return lambda rows, scenario: run(main(rows, scenario))
+
+
+def read_all_pages(timeline, limit, newest_first=False):
+    async def read():
+        pages = []
+        cursor = None
+        while True:
+            segments, cursor = await timeline.page("u1", limit, cursor, newest_first)
+            pages.append([(s.archetype, s.observations) for s in segments])
+            if cursor is None:
+                return pages
+    return read()
+
+
+def test_consecutive_archetypes_are_merged_with_confidence_stats(run_with_history):
+    async def scenario(db, repository):
+        segments, cursor = await ArchetypeTimeline(repository, db).page("u1")
+        return [segment.to_dict() for segment in segments], cursor
+    
+    segments, cursor = run_with_history(history_rows("u1", HISTORY), scenario)
+    
+    assert cursor is None
+    assert [(s["archetype"], s["observations"]) for s in segments] == [
+        ("explorer", 2), ("sage", 3), ("explorer", 1), ("rebel", 2)
+    ]
+    sage = segments[1]
+    assert sage["confidence_min"] == pytest.approx(0.3)
+    assert sage["confidence_max"] == pytest.approx(0.5)
+    assert sage["confidence_mean"] == pytest.approx(0.4)
+    assert sage["ended_at"] - sage["started_at"] == timedelta(hours=2)
+
+
+def test_keyset_pages_never_split_a_segment(run_with_history):
+    async def scenario(db, repository):
+        timeline = ArchetypeTimeline(repository, db, chunk_size=2)
+        return await read_all_pages(timeline, 1), await read_all_pages(timeline, 3, newest_first=True)
+    
+    ascending, descending = run_with_history(history_rows("u1", HISTORY), scenario)
+    
+    assert ascending == [[("explorer", 2)], [("sage", 3)], [("explorer", 1)], [("rebel", 2)]]
+    assert descending == [[("rebel", 2), ("explorer", 1), ("sage", 3)], [("explorer", 2)]]
+
+
+def test_invalid_cursor_is_rejected(run_with_history):
+    async def scenario(db, repository):
+        with pytest.raises(ValueError):
+            await ArchetypeTimeline(repository, db).page("u1", cursor="not-a-cursor")
+    
+    run_with_history(history_rows("u1", HISTORY), scenario)
+
+
+def test_archetype_change_describes_net_change_only():
+    assert archetype_change(None, "sage") == "none -> sage"
+    assert archetype_change("explorer", "sage") == "explorer -> sage"
+    assert archetype_change("sage", "sage") is None
+    assert archetype_change("sage", None) is None
+
+
+def test_monthly_rollup_fills_in_archetype_change(run_with_history):
+    rows = (
+        history_rows("u1", ["explorer"], datetime(2023, 12, 20, tzinfo=timezone.utc))
+        + history_rows("u1", ["sage", "rebel", "sage"], datetime(2024, 1, 10, tzinfo=timezone.utc))
+        + history_rows("u2", ["explorer"], datetime(2024, 1, 5, tzinfo=timezone.utc))
+        + history_rows("u2", ["rebel"], datetime(2024, 2, 1, tzinfo=timezone.utc))
+    )
+    
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            accumulators = {
+                (user_id, date(2024, 1, 15)): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": 0.2})
+                for user_id in ("u1", "u2")
+            }
+            await repository.merge_daily_accumulators(session, accumulators)
+            await repository.mark_rollups_dirty(session, accumulators.keys())
+            await session.commit()
+        
+        await RollupService(repository, db, archetype_changes=True).process_dirty()
+        
+        async for session in db.get_session():
+            return {
+                user_id: (await repository.get_monthly_summaries(session, user_id, 1))[0].archetype_change
+                for user_id in ("u1", "u2")
+            }
+    
+    changes = run_with_history(rows, scenario)
+    
+    assert changes == {"u1": "explorer -> sage", "u2": "none -> explorer"}
+
@@ -0,0 +1,86 @@
+import asyncio
+from src.infrastructure.cache import UserCache, RecentIds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_cached_value_until_ttl_expires():
+    clock = FakeClock()
+    cache = UserCache(max_weight=10, ttl_seconds=5, clock=clock)
+    cache.set("u1", "statistics", {"total_tokens": 1})
+    
+    assert cache.get("u1", "statistics") == {"total_tokens": 1}
+    
+    clock.now = 6
+    assert cache.get("u1", "statistics") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_weight():
+    cache = UserCache(max_weight=4, ttl_seconds=60)
+    cache.set("u1", "daily", [1, 2])
+    cache.set("u2", "daily", [1])
+    cache.get("u1", "daily")
+    cache.set("u3", "daily", [1, 2])
+    
+    assert cache.get("u2", "daily") is None
+    assert cache.get("u1", "daily") == [1, 2]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["weight"] == 4
+
+
+def test_invalidate_user_drops_all_keys_and_inflight_loads():
+    cache = UserCache(max_weight=10, ttl_seconds=60)
+    cache.set("u1", "statistics", {"total_tokens": 1})
+    cache.set("u1", ("daily", 1, 2), [1])
+    cache.set("u2", "statistics", {"total_tokens": 2})
+    
+    async def load_during_invalidation():
+        cache.invalidate_user("u1")
+        return {"total_tokens": 3}
+    
+    cache.invalidate_user("u1")
+    value = asyncio.run(cache.get_or_load("u1", "statistics", load_during_invalidation))
+    
+    assert value == {"total_tokens": 3}
+    assert cache.get("u1", "statistics") is None
+    assert cache.get("u1", ("daily", 1, 2)) is None
+    assert cache.get("u2", "statistics") == {"total_tokens": 2}
+
+
+def test_invalidate_users_notifies_listeners_unless_told_not_to_propagate():
+    cache = UserCache(max_weight=10, ttl_seconds=60)
+    notified = []
+    cache.add_invalidation_listener(notified.append)
+    cache.set("u1", "statistics", {"total_tokens": 1})
+    cache.set("u2", "statistics", {"total_tokens": 2})
+    
+    cache.invalidate_users(["u2", "u1", "u2"])
+    cache.invalidate_users([])
+    cache.set("u1", "statistics", {"total_tokens": 3})
+    cache.invalidate_users(["u1"], propagate=False)
+    
+    assert notified == [["u1", "u2"]]
+    assert cache.get("u1", "statistics") is None
+    assert cache.get("u2", "statistics") is None
+
+
+def test_recent_ids_forget_least_recently_seen():
+    recent = RecentIds(max_size=2)
+    recent.add("e1")
+    recent.add("e2")
+    assert "e1" in recent
+    recent.add("e3")
+    
+    assert "e1" in recent
+    assert "e2" not in recent
+    assert len(recent) == 2
+
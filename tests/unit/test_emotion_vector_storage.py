@@ -0,0 +1,57 @@
+from datetime import date
+import numpy as np
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from src.domain.accumulator import MoodAccumulator
+from src.infrastructure.migrations import migrate_emotion_vectors
+from src.infrastructure.repository import AnalyticsRepository
+from src.infrastructure.types import decode_emotion_vector, encode_emotion_vector
+
+VECTOR = [0.5, 0.25, 0.0, 0.0, 0.125, 0.0, 0.0, 0.125]
+
+
+def test_encoded_vector_is_fixed_width_float32():
+    encoded = encode_emotion_vector(VECTOR)
+    
+    assert len(encoded) == 32
+    assert decode_emotion_vector(encoded).dtype == np.float32
+    assert decode_emotion_vector(encoded).tolist() == VECTOR
+    with pytest.raises(ValueError):
+        encode_emotion_vector([1.0, 2.0])
+
+
+def test_migration_converts_rows_between_storages(run, database):
+    databases = {storage: database(emotion_vector_storage=storage) for storage in ("json", "binary")}
+    
+    async def write(storage):
+        db = databases[storage]
+        async for session in db.get_session():
+            accumulator = MoodAccumulator().add({"emotion_vector": VECTOR, "valence": 0.5})
+            await AnalyticsRepository(db).merge_daily_accumulators(session, {("u1", date(2024, 1, 1)): accumulator})
+            await session.commit()
+    
+    async def read(storage):
+        db = databases[storage]
+        async for session in db.get_session():
+            summaries = await AnalyticsRepository(db).get_daily_summaries(
+                session, "u1", date(2024, 1, 1), date(2024, 1, 1)
+            )
+            return summaries[0].emotion_vector
+    
+    async def scenario():
+        await write("json")
+        converted = await migrate_emotion_vectors(databases["binary"], "binary", batch_size=1)
+        binary = await read("binary")
+        await write("binary")
+        await migrate_emotion_vectors(databases["json"], "json", batch_size=1)
+        return converted, binary, await read("json")
+    
+    converted, binary, restored = run(scenario())
+    
+    assert converted["daily_mood_summary"] == 1
+    assert isinstance(binary, np.ndarray)
+    assert binary.tolist() == VECTOR
+    assert restored == VECTOR
+
@@ -0,0 +1,256 @@
+from datetime import date
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import select, func
+
+from src.config import Config
+from src.infrastructure.models import ArchetypeHistory, UserTopicsSummary
+from src.application.event_handler import EventHandler
+
+DAY = date(2024, 1, 1)
+
+
+def mood_event(entry_id, user_id="u1", tokens=10):
+    return {
+        "metadata": {"timestamp": "2024-01-01T12:00:00Z"},
+        "payload": {
+            "user_id": user_id,
+            "entry_id": entry_id,
+            "emotion_vector": [0.125] * 8,
+            "valence": 0.5,
+            "tokens_count": tokens,
+            "detected_topics": ["work"]
+        }
+    }
+
+
+@pytest.fixture
+def run_handlers(run, db, repository):
+    async def main(scenario):
+        await scenario(lambda: EventHandler(repository, db))
+        async for session in db.get_session():
+            summaries = await repository.get_daily_summaries(session, "u1", DAY, DAY)
+            topics = await session.execute(
+                select(UserTopicsSummary).where(UserTopicsSummary.user_id == "u1").order_by(UserTopicsSummary.frequency.desc())
+            )
+            return summaries, list(topics.scalars())
+    
+    return lambda scenario: run(main(scenario))
+
+
+def test_redelivered_entries_are_counted_once(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1"), mood_event("e2"), mood_event("e1")])
+        await handler.handle_mood_analyzed_batch([mood_event("e2"), mood_event("e3")])
+        await new_handler().handle_mood_analyzed_batch([mood_event("e1"), mood_event("e3")])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 3
+    assert summaries[0].total_tokens == 30
+    assert topics[0].frequency == 3
+
+
+def test_batch_is_folded_per_user_and_day_into_one_upsert(run, db, repository):
+    merges = []
+    merge = repository.merge_daily_accumulators
+    
+    async def recording_merge(session, accumulators):
+        merges.append({key: accumulator.count for key, accumulator in accumulators.items()})
+        await merge(session, accumulators)
+    
+    async def scenario():
+        repository.merge_daily_accumulators = recording_merge
+        events = [mood_event(f"e{i}", user_id=f"u{i % 2}") for i in range(6)]
+        events[0]["metadata"]["timestamp"] = "2024-01-02T08:00:00Z"
+        await EventHandler(repository, db).handle_mood_analyzed_batch(events)
+        async for session in db.get_session():
+            return await repository.get_daily_summaries(session, "u0", DAY, date(2024, 1, 2))
+    
+    summaries = run(scenario())
+    
+    assert merges == [{("u0", DAY): 2, ("u0", date(2024, 1, 2)): 1, ("u1", DAY): 3}]
+    assert [(s.date, s.entry_count) for s in summaries] == [(DAY, 2), (date(2024, 1, 2), 1)]
+
+
+def test_events_without_entry_id_are_not_deduplicated(run_handlers):
+    async def scenario(new_handler):
+        await new_handler().handle_mood_analyzed_batch([mood_event(None), mood_event(None)])
+    
+    summaries, _ = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 2
+
+
+def deleted_event(entry_id, user_id="u1"):
+    return {"payload": {"entry_id": entry_id, "user_id": user_id}}
+
+
+def test_deleted_entries_are_subtracted_once(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1", tokens=10), mood_event("e2", tokens=20)])
+        await handler.handle_batch([
+            ("metachat.mood.analyzed", mood_event("e3", tokens=40), None),
+            ("metachat.diary.entry.deleted", deleted_event("e2"), None),
+            ("metachat.diary.entry.deleted", deleted_event("e2"), None)
+        ])
+        await new_handler().handle_entry_deleted_batch([deleted_event("e2")])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 2
+    assert summaries[0].total_tokens == 50
+    assert topics[0].frequency == 2
+
+
+def test_deletion_before_analysis_leaves_a_tombstone(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_entry_deleted_batch([deleted_event("e1")])
+        await new_handler().handle_mood_analyzed_batch([mood_event("e1")])
+    
+    summaries, _ = run_handlers(scenario)
+    
+    assert summaries == []
+
+
+def test_deleting_last_entry_removes_the_day_and_marks_rollups(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1")])
+        async for session in handler.db.get_session():
+            await handler.repository.clear_dirty_rollups(
+                session, await handler.repository.claim_dirty_rollups(session, 10)
+            )
+            await session.commit()
+        await handler.handle_entry_deleted_batch([deleted_event("e1")])
+        async for session in handler.db.get_session():
+            buckets = await handler.repository.claim_dirty_rollups(session, 10)
+            assert {bucket.period for bucket in buckets} == {"week", "month"}
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries == []
+    assert topics[0].frequency == 0
+    assert topics[0].trend_score == pytest.approx(0.0)
+
+
+
+def test_invalid_events_are_not_claimed(run_handlers):
+    invalid = mood_event("e2")
+    invalid["payload"]["emotion_vector"] = [0.1] * 7
+    
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1"), invalid])
+        await new_handler().handle_mood_analyzed_batch([mood_event("e2", tokens=5)])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 2
+    assert summaries[0].total_tokens == 15
+    assert topics[0].frequency == 2
+
+
+
+def test_period_topics_follow_analyses_and_deletions(run, db, repository):
+    def analysed(entry_id, topics):
+        event = mood_event(entry_id)
+        event["payload"]["detected_topics"] = topics
+        return event
+    
+    async def scenario():
+        handler = EventHandler(repository, db)
+        await handler.handle_mood_analyzed_batch([analysed("e1", ["work"]), analysed("e2", ["work", "family"])])
+        await handler.handle_entry_deleted_batch([deleted_event("e2")])
+        async for session in db.get_session():
+            return await repository.get_top_topics(session, "u1", since=DAY)
+    
+    assert [(t.topic, t.frequency) for t in run(scenario())] == [("work", 1)]
+
+
+def poisoned_claim(entry_id):
+    async def claim(handler):
+        async for session in handler.db.get_session():
+            await handler.repository.claim_entries(session, [
+                (entry_id, "u1", DAY, {"emotion_vector": [0.1] * 7, "valence": 0.9, "tokens_count": 99, "detected_topics": ["work"]})
+            ])
+            await session.commit()
+    return claim
+
+
+def test_deleting_a_poisoned_entry_leaves_valid_entries_alone(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1", tokens=10), mood_event("e2", tokens=20)])
+        await poisoned_claim("bad")(handler)
+        await handler.handle_entry_deleted_batch([deleted_event("bad")])
+        await new_handler().handle_entry_deleted_batch([deleted_event("bad")])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 2
+    assert summaries[0].total_tokens == 30
+    assert topics[0].frequency == 2
+
+
+def test_single_entry_day_survives_deleting_a_poisoned_entry(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1", tokens=10)])
+        await poisoned_claim("bad")(handler)
+        await handler.handle_entry_deleted_batch([deleted_event("bad")])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 1
+    assert summaries[0].total_tokens == 10
+    assert topics[0].frequency == 1
+
+
+def test_deleting_valid_and_poisoned_entries_together_removes_only_the_valid_one(run_handlers):
+    async def scenario(new_handler):
+        handler = new_handler()
+        await handler.handle_mood_analyzed_batch([mood_event("e1", tokens=10), mood_event("e2", tokens=20)])
+        await poisoned_claim("bad")(handler)
+        await handler.handle_entry_deleted_batch([deleted_event("bad"), deleted_event("e1")])
+    
+    summaries, topics = run_handlers(scenario)
+    
+    assert summaries[0].entry_count == 1
+    assert summaries[0].total_tokens == 20
+    assert topics[0].frequency == 1
+
+
+def test_failing_step_does_not_repeat_the_steps_before_it(run, db, repository):
+    kafka_client = pytest.importorskip("src.infrastructure.kafka_client")
+    
+    async def failing_tombstone(session, deletions):
+        raise RuntimeError("tombstone failed")
+    
+    async def scenario():
+        repository.tombstone_entries = failing_tombstone
+        consumer = kafka_client.KafkaConsumer(
+            Config(kafka_batch_max_attempts=3), None, batch_handler=EventHandler(repository, db).handle_batch
+        )
+        consumer.running = True
+        consumer.retry_backoff = 0
+        await consumer._handle_batch_with_retry([
+            ("metachat.archetype.updated", {"payload": {"user_id": "u1", "archetype": "sage", "confidence": 0.8}}, None),
+            ("metachat.mood.analyzed", mood_event(None), None),
+            ("metachat.diary.entry.deleted", deleted_event("e1"), None)
+        ])
+        async for session in db.get_session():
+            history = await session.scalar(select(func.count()).select_from(ArchetypeHistory))
+            summaries = await repository.get_daily_summaries(session, "u1", DAY, DAY)
+            return history, summaries
+    
+    history, summaries = run(scenario())
+    
+    assert history == 1
+    assert summaries[0].entry_count == 1
+
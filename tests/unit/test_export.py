@@ -0,0 +1,54 @@
+from datetime import date
+import orjson
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from src.domain.accumulator import MoodAccumulator
+from src.application.export import DailyExporter
+
+
+@pytest.fixture
+def export_chunks(run, db, repository):
+    async def main(export):
+        async for session in db.get_session():
+            accumulators = {
+                (user_id, date(2024, 1, day)): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": 0.5})
+                for user_id in ("u1", "u2") for day in range(1, 4)
+            }
+            await repository.merge_daily_accumulators(session, accumulators)
+            await session.commit()
+        
+        exporter = DailyExporter(repository, db, chunk_size=2)
+        return [chunk async for chunk in export(exporter)]
+    
+    return lambda export: run(main(export))
+
+
+def test_ndjson_export_streams_one_user_in_chunks(export_chunks):
+    chunks = export_chunks(lambda exporter: exporter.ndjson("u1"))
+    rows = [orjson.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    
+    assert len(chunks) == 2
+    assert [row["date"] for row in rows] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert {row["user_id"] for row in rows} == {"u1"}
+    assert rows[0]["entry_count"] == 1
+
+
+def test_ndjson_export_covers_all_users_within_range(export_chunks):
+    chunks = export_chunks(lambda exporter: exporter.ndjson(None, date(2024, 1, 2)))
+    rows = [orjson.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    
+    assert [(row["user_id"], row["date"]) for row in rows] == [
+        ("u1", "2024-01-02"), ("u1", "2024-01-03"), ("u2", "2024-01-02"), ("u2", "2024-01-03")
+    ]
+
+
+def test_arrow_export_round_trips(export_chunks):
+    pa = pytest.importorskip("pyarrow")
+    chunks = export_chunks(lambda exporter: exporter.arrow("u2"))
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    
+    assert table.num_rows == 3
+    assert table.column("user_id").to_pylist() == ["u2"] * 3
+
@@ -0,0 +1,215 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+import grpc
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.domain.accumulator import MoodAccumulator
+from src.infrastructure.cache import UserCache
+from src.infrastructure.models import DailyMoodSummary
+from src.infrastructure.repository import AnalyticsRepository
+from src.config import Config
+from src.grpc_server import GRPC_STUBS_AVAILABLE, AnalyticsServiceServicerImpl, create_grpc_server
+from src.application.event_handler import EventHandler
+
+if not GRPC_STUBS_AVAILABLE:
+    pytest.skip("gRPC stubs are not generated", allow_module_level=True)
+
+from analytics_pb2 import GetUserStatisticsBatchRequest, GetUserStatisticsRequest
+from analytics_pb2_grpc import AnalyticsServiceStub
+
+
+class RecordingRepository(AnalyticsRepository):
+    def __init__(self, db, delay=0.0, fail=False):
+        super().__init__(db)
+        self.delay = delay
+        self.fail = fail
+        self.chunks = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def get_user_statistics_batch(self, session, user_ids):
+        self.chunks.append(list(user_ids))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("database is down")
+            return await super().get_user_statistics_batch(session, user_ids)
+        finally:
+            self.in_flight -= 1
+
+
+class AbortError(Exception):
+    pass
+
+
+class FakeContext:
+    def __init__(self):
+        self.status = None
+        self.details = None
+    
+    def code(self):
+        return self.status
+    
+    def set_code(self, code):
+        self.status = code
+    
+    def set_details(self, details):
+        self.details = details
+    
+    async def abort(self, code, details):
+        self.set_code(code)
+        self.set_details(details)
+        raise AbortError(details)
+
+
+@pytest.fixture
+def run_with_servicer(run, db):
+    async def main(scenario, cache, options):
+        repository = RecordingRepository(db, **options.pop("repository", {}))
+        async for session in db.get_session():
+            await repository.merge_daily_accumulators(session, {
+                (f"u{index}", date(2024, 1, index)): MoodAccumulator().add(
+                    {"emotion_vector": [0.1] * 8, "tokens_count": index}
+                )
+                for index in range(1, 6)
+            })
+            await session.commit()
+        servicer = AnalyticsServiceServicerImpl(repository, db, cache=cache, **options)
+        return await scenario(servicer, repository)
+    
+    return lambda scenario, cache=None, **options: run(main(scenario, cache, options))
+
+
+def test_batch_returns_distinct_users_in_request_order_from_chunks(run_with_servicer):
+    cache = UserCache(max_weight=100, ttl_seconds=60)
+    
+    async def scenario(servicer, repository):
+        cached = await servicer._load_statistics_chunk(["u3"])
+        cache.set("u3", "statistics", cached["u3"])
+        repository.chunks.clear()
+        
+        request = GetUserStatisticsBatchRequest(user_ids=["u5", "u3", "u1", "u5", "u2", "u4", "missing"])
+        return await servicer.GetUserStatisticsBatch(request, FakeContext()), repository.chunks
+    
+    response, chunks = run_with_servicer(scenario, cache=cache, batch_chunk_size=2)
+    
+    assert [user.user_id for user in response.users] == ["u5", "u3", "u1", "u2", "u4", "missing"]
+    assert [user.statistics.total_tokens for user in response.users] == [5, 3, 1, 2, 4, 0]
+    assert chunks == [["u5", "u1"], ["u2", "u4"], ["missing"]]
+
+
+def test_chunk_queries_are_bounded_by_the_semaphore(run_with_servicer):
+    async def scenario(servicer, repository):
+        request = GetUserStatisticsBatchRequest(user_ids=[f"u{index}" for index in range(1, 6)])
+        await servicer.GetUserStatisticsBatch(request, FakeContext())
+        return len(repository.chunks), repository.max_in_flight
+    
+    assert run_with_servicer(
+        scenario, batch_chunk_size=1, batch_max_concurrency=2, repository={"delay": 0.01}
+    ) == (5, 2)
+
+
+def test_batch_failure_sets_internal_status(run_with_servicer):
+    async def scenario(servicer, repository):
+        context = FakeContext()
+        response = await servicer.GetUserStatisticsBatch(GetUserStatisticsBatchRequest(user_ids=["u1"]), context)
+        return response, context
+    
+    response, context = run_with_servicer(scenario, repository={"fail": True})
+    
+    assert list(response.users) == []
+    assert context.code() == grpc.StatusCode.INTERNAL
+
+
+def test_stream_yields_cached_users_first_then_each_chunk(run_with_servicer):
+    cache = UserCache(max_weight=100, ttl_seconds=60)
+    
+    async def scenario(servicer, repository):
+        cached = await servicer._load_statistics_chunk(["u4"])
+        cache.set("u4", "statistics", cached["u4"])
+        repository.chunks.clear()
+        
+        request = GetUserStatisticsBatchRequest(user_ids=["u1", "u2", "u4", "u3", "u1"])
+        users = [user async for user in servicer.StreamUserStatistics(request, FakeContext())]
+        return users, repository.chunks
+    
+    users, chunks = run_with_servicer(scenario, cache=cache, batch_chunk_size=2)
+    
+    assert users[0].user_id == "u4"
+    assert sorted(user.user_id for user in users) == ["u1", "u2", "u3", "u4"]
+    assert {user.user_id: user.statistics.total_tokens for user in users} == {"u1": 1, "u2": 2, "u3": 3, "u4": 4}
+    assert chunks == [["u1", "u2"], ["u3"]]
+
+
+def test_stream_aborts_with_internal_status_when_a_chunk_fails(run_with_servicer):
+    async def scenario(servicer, repository):
+        context = FakeContext()
+        request = GetUserStatisticsBatchRequest(user_ids=["u1", "u2"])
+        with pytest.raises(AbortError):
+            async for _ in servicer.StreamUserStatistics(request, context):
+                pass
+        return context.code()
+    
+    assert run_with_servicer(scenario, repository={"fail": True}) == grpc.StatusCode.INTERNAL
+
+
+def test_deleted_topics_drop_out_of_statistics(run_with_servicer):
+    def entry(entry_id, topics):
+        return {
+            "metadata": {"timestamp": "2024-01-01T12:00:00Z"},
+            "payload": {"user_id": "u1", "entry_id": entry_id, "emotion_vector": [0.1] * 8, "detected_topics": topics}
+        }
+    
+    async def scenario(servicer, repository):
+        handler = EventHandler(repository, servicer.db)
+        await handler.handle_mood_analyzed_batch([entry("e1", ["work"]), entry("e2", ["work", "secret"])])
+        await handler.handle_entry_deleted_batch([{"payload": {"entry_id": "e2", "user_id": "u1"}}])
+        
+        single = await servicer.GetUserStatistics(GetUserStatisticsRequest(user_id="u1"), FakeContext())
+        batch = await servicer.GetUserStatisticsBatch(GetUserStatisticsBatchRequest(user_ids=["u1"]), FakeContext())
+        return list(single.top_topics), list(batch.users[0].statistics.top_topics)
+    
+    assert run_with_servicer(scenario) == (["work"], ["work"])
+
+
+def test_server_answers_on_the_callers_event_loop_and_engine(run, db, repository):
+    async def scenario():
+        async for session in db.get_session():
+            await repository.merge_daily_accumulators(session, {
+                ("u1", date(2024, 1, 1)): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "tokens_count": 7})
+            })
+            await session.commit()
+        
+        server, port = create_grpc_server(Config(grpc_host="127.0.0.1"), repository, db, port=0)
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = AnalyticsServiceStub(channel)
+                single = await stub.GetUserStatistics(GetUserStatisticsRequest(user_id="u1"))
+                batch = await stub.GetUserStatisticsBatch(GetUserStatisticsBatchRequest(user_ids=["u1", "u2"]))
+            return single.total_tokens, [(user.user_id, user.statistics.total_tokens) for user in batch.users]
+        finally:
+            await server.stop(None)
+    
+    assert run(scenario()) == (7, [("u1", 7), ("u2", 0)])
+
+
+def test_user_id_filter_uses_any_array_on_postgres_and_in_elsewhere():
+    repository = AnalyticsRepository(None)
+    
+    def compiled(dialect):
+        session = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=dialect))
+        query = select(DailyMoodSummary.id).where(repository._user_id_in(session, DailyMoodSummary.user_id, ["u1", "u2"]))
+        return str(query.compile(dialect=dialect))
+    
+    assert "daily_mood_summary.user_id = ANY (%(param_1)s::VARCHAR[])" in compiled(postgresql.dialect())
+    assert "daily_mood_summary.user_id IN (__[POSTCOMPILE_user_id_1])" in compiled(sqlite.dialect())
+
@@ -0,0 +1,410 @@
+import asyncio
+import json
+import random
+import threading
+import pytest
+
+pytest.importorskip("confluent_kafka")
+
+from confluent_kafka import TopicPartition
+
+from src.config import Config
+from src.infrastructure.cache import UserCache
+from src.infrastructure.kafka_client import CacheInvalidationBus, KafkaConsumer, OffsetTracker
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, value):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._value = json.dumps(value).encode("utf-8")
+    
+    def topic(self):
+        return self._topic
+    
+    def partition(self):
+        return self._partition
+    
+    def offset(self):
+        return self._offset
+    
+    def value(self):
+        return self._value
+    
+    def error(self):
+        return None
+
+
+def test_offset_tracker_commits_up_to_lowest_unfinished_offset():
+    tracker = OffsetTracker()
+    for offset in range(5):
+        tracker.add("mood", 0, offset)
+    tracker.add("mood", 1, 7)
+    
+    tracker.done("mood", 0, 1)
+    tracker.done("mood", 0, 2)
+    assert tracker.committable() == {("mood", 0): 0, ("mood", 1): 7}
+    
+    tracker.done("mood", 0, 0)
+    tracker.done("mood", 1, 7)
+    assert tracker.committable() == {("mood", 0): 3, ("mood", 1): 8}
+    assert tracker.committable() == {}
+    assert tracker.in_flight() == 2
+
+
+def test_batches_are_capped_and_committed_only_after_the_handler_returns():
+    batches = []
+    
+    async def main():
+        consumer = None
+        
+        async def handle_batch(batch):
+            batches.append(([data["payload"]["sequence"] for _, data, _ in batch], consumer._commit_requests.qsize()))
+        
+        consumer = KafkaConsumer(Config(kafka_batch_max_messages=3, kafka_batch_max_wait_ms=20), None, batch_handler=handle_batch)
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue()
+        for offset in range(5):
+            consumer._slots.acquire()
+            consumer._queue.put_nowait(FakeMessage("mood", offset % 2, offset, {"payload": {"sequence": offset}}))
+        
+        task = asyncio.create_task(consumer._consume_batches())
+        while consumer._commit_requests.qsize() < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        commits = []
+        while not consumer._commit_requests.empty():
+            commits.append(sorted((tp.partition, tp.offset) for tp in consumer._commit_requests.get_nowait()))
+        return commits
+    
+    commits = asyncio.run(main())
+    
+    assert batches == [([0, 1, 2], 0), ([3, 4], 1)]
+    assert commits == [[(0, 3), (1, 2)], [(0, 5), (1, 4)]]
+
+
+class FakePollingConsumer:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.commits = []
+        self.closed = False
+    
+    def consume(self, num_messages, timeout):
+        batch, self.messages = self.messages[:num_messages], self.messages[num_messages:]
+        return batch
+    
+    def commit(self, offsets, asynchronous):
+        self.commits.append((threading.get_ident(), [(tp.partition, tp.offset) for tp in offsets]))
+    
+    def close(self):
+        self.closed = True
+
+
+def test_polling_thread_applies_backpressure_and_commits_off_the_loop():
+    async def main():
+        consumer = KafkaConsumer(Config(kafka_queue_max_messages=2, kafka_batch_max_messages=10), None)
+        consumer.consumer = FakePollingConsumer(FakeMessage("mood", 0, offset, {}) for offset in range(5))
+        consumer._on_assign(None, [TopicPartition("mood", 0)])
+        consumer.poll_timeout = 0.01
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue(maxsize=2)
+        poller = threading.Thread(target=consumer._poll_worker, daemon=True)
+        poller.start()
+        
+        await asyncio.sleep(0.1)
+        queued_while_blocked = consumer._queue.qsize()
+        offsets = [(await consumer._take()).offset() for _ in range(5)]
+        consumer._request_commit([FakeMessage("mood", 0, 4, {})])
+        for _ in range(100):
+            if consumer.consumer.commits:
+                break
+            await asyncio.sleep(0.01)
+        
+        consumer.running = False
+        await asyncio.to_thread(poller.join, 1)
+        return queued_while_blocked, offsets, poller.ident, consumer.consumer
+    
+    queued_while_blocked, offsets, poller_ident, fake = asyncio.run(main())
+    
+    assert queued_while_blocked == 2
+    assert offsets == [0, 1, 2, 3, 4]
+    assert fake.commits == [(poller_ident, [(0, 5)])]
+    assert fake.closed
+
+
+def test_revoked_partitions_ignore_offsets_from_before_the_revoke():
+    tracker = OffsetTracker()
+    stale = tracker.add("mood", 0, 10)
+    tracker.add("mood", 1, 3)
+    
+    tracker.forget([("mood", 0)])
+    fresh = tracker.add("mood", 0, 10)
+    tracker.done("mood", 0, 10, stale)
+    assert tracker.committable() == {("mood", 0): 10, ("mood", 1): 3}
+    
+    tracker.done("mood", 0, 10, fresh)
+    assert tracker.committable() == {("mood", 0): 11}
+
+
+class FakeCommitConsumer:
+    def __init__(self):
+        self.commits = []
+    
+    def commit(self, offsets, asynchronous):
+        self.commits.append([(tp.partition, tp.offset) for tp in offsets])
+
+
+def test_revoke_commits_finished_work_then_stops_committing_the_partition():
+    consumer = KafkaConsumer(Config(), None)
+    consumer.consumer = FakeCommitConsumer()
+    consumer._on_assign(None, [TopicPartition("mood", 0), TopicPartition("mood", 1)])
+    consumer._request_commit([FakeMessage("mood", 1, 4, {})])
+    
+    consumer._on_revoke(None, [TopicPartition("mood", 1)])
+    consumer._request_commit([FakeMessage("mood", 0, 7, {}), FakeMessage("mood", 1, 5, {})])
+    consumer._drain_commits()
+    
+    assert consumer.consumer.commits == [[(1, 5)], [(0, 8)]]
+
+
+def test_keyed_worker_that_dies_is_restarted_with_its_messages():
+    handled = []
+    
+    async def handle_batch(batch):
+        handled.extend(data["payload"]["sequence"] for _, data, _ in batch)
+    
+    async def main():
+        consumer = KafkaConsumer(Config(kafka_workers=2, kafka_batch_max_messages=3), None, batch_handler=handle_batch)
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue()
+        
+        handle_with_retry = consumer._handle_batch_with_retry
+        crashes = []
+        
+        async def crash_once(batch):
+            if not crashes:
+                crashes.append(len(batch))
+                raise RuntimeError("worker bug")
+            await handle_with_retry(batch)
+        
+        consumer._handle_batch_with_retry = crash_once
+        for offset in range(6):
+            consumer._slots.acquire()
+            consumer._queue.put_nowait(FakeMessage("mood", 0, offset, {"payload": {"user_id": "u1", "sequence": offset}}))
+        
+        task = asyncio.create_task(consumer._consume_concurrently())
+        while consumer._queue.qsize() or consumer._tracker.in_flight():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        commits = {}
+        while not consumer._commit_requests.empty():
+            for topic_partition in consumer._commit_requests.get_nowait():
+                commits[topic_partition.partition] = topic_partition.offset
+        return crashes, commits
+    
+    crashes, commits = asyncio.run(main())
+    
+    assert crashes
+    assert handled == list(range(6))
+    assert commits == {0: 6}
+
+
+def test_concurrent_mode_keeps_per_user_order_and_commits_every_partition():
+    seen = {}
+    
+    async def handle_batch(batch):
+        await asyncio.sleep(random.random() / 100)
+        for _, data, _ in batch:
+            seen.setdefault(data["payload"]["user_id"], []).append(data["payload"]["sequence"])
+    
+    async def main():
+        consumer = KafkaConsumer(Config(kafka_workers=4, kafka_batch_max_messages=5), None, batch_handler=handle_batch)
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue()
+        
+        for offset in range(60):
+            partition = offset % 3
+            user_id = f"u{offset % 7}"
+            consumer._slots.acquire()
+            consumer._queue.put_nowait(FakeMessage("mood", partition, offset, {
+                "payload": {"user_id": user_id, "sequence": offset}
+            }))
+        
+        task = asyncio.create_task(consumer._consume_concurrently())
+        while consumer._queue.qsize() or consumer._tracker.in_flight():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        commits = {}
+        while not consumer._commit_requests.empty():
+            for topic_partition in consumer._commit_requests.get_nowait():
+                commits[topic_partition.partition] = topic_partition.offset
+        return commits
+    
+    commits = asyncio.run(main())
+    
+    assert commits == {0: 58, 1: 59, 2: 60}
+    assert sum(len(sequence) for sequence in seen.values()) == 60
+    assert all(sequence == sorted(sequence) for sequence in seen.values())
+
+
+class FakeProducer:
+    def __init__(self):
+        self.produced = []
+    
+    def produce(self, topic, value, headers):
+        self.produced.append((topic, json.loads(value), headers["original_topic"]))
+    
+    def flush(self, timeout):
+        return 0
+
+
+def test_poison_message_is_dead_lettered_and_committed_past():
+    handled = []
+    
+    async def handle_batch(batch):
+        if any(data["payload"]["user_id"] == "poison" for _, data, _ in batch):
+            raise ValueError("cannot handle poison")
+        handled.extend(data["payload"]["sequence"] for _, data, _ in batch)
+    
+    async def main():
+        consumer = KafkaConsumer(
+            Config(kafka_workers=2, kafka_batch_max_messages=10, kafka_batch_max_attempts=2, kafka_dead_letter_topic="dead"),
+            None, batch_handler=handle_batch
+        )
+        consumer.producer = FakeProducer()
+        consumer.retry_backoff = 0.001
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue()
+        
+        for offset in range(12):
+            user_id = "poison" if offset == 5 else f"u{offset % 3}"
+            consumer._slots.acquire()
+            consumer._queue.put_nowait(FakeMessage("mood", 0, offset, {
+                "payload": {"user_id": user_id, "sequence": offset}
+            }))
+        
+        task = asyncio.create_task(consumer._consume_concurrently())
+        while consumer._queue.qsize() or consumer._tracker.in_flight():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        commits = {}
+        while not consumer._commit_requests.empty():
+            for topic_partition in consumer._commit_requests.get_nowait():
+                commits[topic_partition.partition] = topic_partition.offset
+        return commits, consumer.producer.produced
+    
+    commits, produced = asyncio.run(main())
+    
+    assert commits == {0: 12}
+    assert sorted(handled) == [offset for offset in range(12) if offset != 5]
+    assert produced == [("dead", {"payload": {"user_id": "poison", "sequence": 5}}, "mood")]
+
+
+def test_offsets_are_committed_only_after_a_successful_flush():
+    events = []
+    
+    async def handle_batch(batch):
+        events.append("handled")
+    
+    async def flush():
+        events.append("flush")
+        if events.count("flush") == 1:
+            raise RuntimeError("database unavailable")
+    
+    async def main():
+        consumer = KafkaConsumer(Config(kafka_batch_max_messages=2), None, batch_handler=handle_batch, before_commit=flush)
+        consumer.retry_backoff = 0.001
+        consumer.running = True
+        consumer._loop = asyncio.get_running_loop()
+        consumer._queue = asyncio.Queue()
+        for offset in range(2):
+            consumer._slots.acquire()
+            consumer._queue.put_nowait(FakeMessage("archetype", 0, offset, {"payload": {"user_id": "u1"}}))
+        
+        task = asyncio.create_task(consumer._consume_batches())
+        while consumer._commit_requests.empty():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return [(tp.partition, tp.offset) for tp in consumer._commit_requests.get_nowait()]
+    
+    assert asyncio.run(main()) == [(0, 2)]
+    assert events == ["handled", "flush", "flush"]
+
+
+class FakeBroker:
+    def __init__(self):
+        self.messages = []
+    
+    def produce(self, topic, value):
+        self.messages.append(FakeMessage(topic, 0, len(self.messages), json.loads(value)))
+    
+    def poll(self, timeout):
+        return 0
+
+
+class FakeInvalidationConsumer:
+    def __init__(self, broker, bus):
+        self.broker = broker
+        self.bus = bus
+        self.closed = False
+    
+    def consume(self, num_messages, timeout):
+        self.bus.running = False
+        return list(self.broker.messages)
+    
+    def close(self):
+        self.closed = True
+
+
+def test_invalidations_reach_other_pods_but_not_back_to_their_origin():
+    broker = FakeBroker()
+    config = Config(cache_invalidation_topic="invalidate")
+    
+    async def main():
+        pods = []
+        for _ in range(2):
+            cache = UserCache(max_weight=10, ttl_seconds=60)
+            bus = CacheInvalidationBus(config, cache)
+            bus.producer = broker
+            bus.running = True
+            bus._loop = asyncio.get_running_loop()
+            cache.add_invalidation_listener(bus.publish)
+            for user_id in ("u1", "u2"):
+                cache.set(user_id, "statistics", {"user_id": user_id})
+            pods.append((cache, bus))
+        
+        (origin_cache, _), (other_cache, _) = pods
+        origin_cache.invalidate_users(["u1", "u1"])
+        origin_cache.set("u1", "statistics", {"user_id": "u1", "reloaded": True})
+        
+        for cache, bus in pods:
+            bus.consumer = FakeInvalidationConsumer(broker, bus)
+            await asyncio.to_thread(bus._poll_worker)
+        await asyncio.sleep(0)
+        
+        return broker.messages, pods
+    
+    messages, ((origin_cache, origin_bus), (other_cache, other_bus)) = asyncio.run(main())
+    
+    assert [msg.topic() for msg in messages] == ["invalidate"]
+    assert json.loads(messages[0].value())["user_ids"] == ["u1"]
+    assert origin_cache.get("u1", "statistics") == {"user_id": "u1", "reloaded": True}
+    assert other_cache.get("u1", "statistics") is None
+    assert other_cache.get("u2", "statistics") == {"user_id": "u2"}
+    assert origin_bus.consumer.closed and other_bus.consumer.closed
+
@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+from prometheus_client import CollectorRegistry, REGISTRY
+from sqlalchemy.pool import QueuePool
+
+from src.infrastructure.metrics import observe_query, record_kafka_statistics, register_pool_collector
+
+
+def test_kafka_statistics_set_lag_per_partition():
+    record_kafka_statistics({
+        "topics": {
+            "metachat.mood.analyzed": {
+                "partitions": {
+                    "0": {"consumer_lag": 42},
+                    "1": {"consumer_lag": -1},
+                    "-1": {"consumer_lag": 7}
+                }
+            }
+        }
+    })
+    
+    labels = {"topic": "metachat.mood.analyzed"}
+    assert REGISTRY.get_sample_value("analytics_kafka_consumer_lag", {**labels, "partition": "0"}) == 42
+    assert REGISTRY.get_sample_value("analytics_kafka_consumer_lag", {**labels, "partition": "1"}) is None
+    assert REGISTRY.get_sample_value("analytics_kafka_consumer_lag", {**labels, "partition": "-1"}) is None
+
+
+def test_observe_query_records_latency_per_method():
+    @observe_query
+    async def load_something():
+        return 1
+    
+    before = REGISTRY.get_sample_value("analytics_db_query_duration_seconds_count", {"query": "load_something"}) or 0
+    assert asyncio.run(load_something()) == 1
+    assert REGISTRY.get_sample_value("analytics_db_query_duration_seconds_count", {"query": "load_something"}) == before + 1
+
+
+def test_pool_collector_reports_connection_usage():
+    pool = QueuePool(lambda: sqlite3.connect(":memory:"), pool_size=3, max_overflow=2)
+    registry = CollectorRegistry()
+    register_pool_collector(SimpleNamespace(sync_engine=SimpleNamespace(pool=pool)), registry)
+    
+    connection = pool.connect()
+    
+    assert registry.get_sample_value("analytics_db_pool_size") == 3
+    assert registry.get_sample_value("analytics_db_pool_checked_out") == 1
+    connection.close()
+    assert registry.get_sample_value("analytics_db_pool_checked_out") == 0
+
@@ -0,0 +1,157 @@
+import json
+from datetime import date
+import pytest
+
+from src.domain.events import parse_mood_analyzed
+from src.replay import Checkpoint, aggregate_range, merge_partials, split_range
+
+
+def mood_event(user_id, timestamp, valence):
+    return {
+        "metadata": {"timestamp": timestamp},
+        "payload": {"user_id": user_id, "emotion_vector": [0.125] * 8, "valence": valence, "tokens_count": 10}
+    }
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "mood.jsonl"
+    lines = [json.dumps(mood_event(f"u{i % 3}", f"2024-01-0{1 + i % 2}T10:00:00Z", i / 10)) for i in range(20)]
+    lines.insert(5, "not json")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_events_are_bucketed_by_their_own_timestamp():
+    assert parse_mood_analyzed(mood_event("u1", "2024-02-29T23:30:00-02:00", 0.1))["date"] == date(2024, 3, 1)
+    assert parse_mood_analyzed(mood_event("u1", 1704103200000, 0.1))["date"] == date(2024, 1, 1)
+    assert parse_mood_analyzed(mood_event("u1", None, 0.1), date(2023, 5, 5))["date"] == date(2023, 5, 5)
+
+
+def test_split_ranges_aggregate_to_the_same_result(dump):
+    size = dump.stat().st_size
+    whole = merge_partials([aggregate_range(str(dump), 0, size)])
+    pieces = merge_partials([aggregate_range(str(dump), start, end) for start, end in split_range(0, size, 7)])
+    
+    assert whole[0] == pieces[0] == 20
+    assert whole[1] == pieces[1] == 1
+    assert whole[2].keys() == pieces[2].keys()
+    for key, accumulator in whole[2].items():
+        assert pieces[2][key].count == accumulator.count
+        assert pieces[2][key].valence_mean == pytest.approx(accumulator.valence_mean)
+        assert pieces[2][key].valence_m2 == pytest.approx(accumulator.valence_m2)
+
+
+def test_entries_repeated_across_ranges_are_counted_once(tmp_path):
+    path = tmp_path / "repeated.jsonl"
+    events = []
+    for i in range(12):
+        event = mood_event(f"u{i % 2}", "2024-01-01T10:00:00Z", i / 10)
+        event["payload"]["entry_id"] = f"e{i % 5}"
+        events.append(json.dumps(event))
+    path.write_text("\n".join(events) + "\n")
+    size = path.stat().st_size
+    
+    whole = merge_partials([aggregate_range(str(path), 0, size)])
+    pieces = merge_partials([aggregate_range(str(path), start, end) for start, end in split_range(0, size, 5)])
+    
+    assert sorted(whole[3]) == sorted(pieces[3]) == [f"e{i}" for i in range(5)]
+    assert {key: a.count for key, a in pieces[2].items()} == {key: a.count for key, a in whole[2].items()}
+    assert sum(a.count for a in whole[2].values()) == 5
+    assert sum(a.total_tokens for a in pieces[2].values()) == 50
+
+
+def test_replay_writes_summaries_and_resumes_from_checkpoint(dump, run, db, repository):
+    from src.replay import Replayer
+    
+    async def main():
+        replayer = Replayer(repository, db, workers=2, segment_bytes=300, insert_batch_size=2)
+        first = await replayer.run(str(dump), Checkpoint("mood", str(dump)))
+        second = await replayer.run(str(dump), Checkpoint("mood", str(dump)))
+        async for session in db.get_session():
+            summaries = await repository.get_daily_summaries(session, "u0", date(2024, 1, 1), date(2024, 1, 2))
+            stored = await repository.get_replay_checkpoint(session, "mood")
+        return first, second, summaries, stored.position
+    
+    first, second, summaries, position = run(main())
+    
+    assert first["events"] == second["events"] == 20
+    assert first["skipped"] == 1
+    assert sum(s.entry_count for s in summaries) == 7
+    assert position == dump.stat().st_size
+
+
+def test_segment_that_fails_before_its_checkpoint_is_not_counted_twice(dump, run, db, repository):
+    from src.infrastructure.repository import AnalyticsRepository
+    from src.replay import Replayer
+    
+    class CrashingRepository(AnalyticsRepository):
+        saves = 0
+        
+        async def save_replay_checkpoint(self, session, *args):
+            self.saves += 1
+            if self.saves == 2:
+                raise RuntimeError("crashed before the checkpoint was stored")
+            await super().save_replay_checkpoint(session, *args)
+    
+    async def main():
+        with pytest.raises(RuntimeError):
+            await Replayer(CrashingRepository(db), db, 2, 300, 2).run(str(dump), Checkpoint("mood", str(dump)))
+        result = await Replayer(repository, db, 2, 300, 2).run(str(dump), Checkpoint("mood", str(dump)))
+        async for session in db.get_session():
+            summaries = await repository.get_daily_summaries(session, "u0", date(2024, 1, 1), date(2024, 1, 2))
+        return result, summaries
+    
+    result, summaries = run(main())
+    
+    assert result["events"] == 20
+    assert sum(s.entry_count for s in summaries) == 7
+
+
+def test_replay_deduplicates_entries_like_the_live_path(tmp_path, run, database):
+    from src.infrastructure.repository import AnalyticsRepository
+    from src.application.event_handler import EventHandler
+    from src.replay import Replayer
+    
+    events = []
+    for i in range(10):
+        event = mood_event(f"u{i % 2}", "2024-01-01T10:00:00Z", i / 10)
+        event["payload"].update({"entry_id": f"e{i}", "detected_topics": ["work"] if i % 3 else ["family"]})
+        events.append(event)
+    redelivered = events + events[3:7]
+    path = tmp_path / "redelivered.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in redelivered) + "\n")
+    
+    async def totals(db, repository):
+        async for session in db.get_session():
+            return {
+                user_id: (
+                    [(s.entry_count, s.total_tokens) for s in await repository.get_daily_summaries(session, user_id, date(2024, 1, 1), date(2024, 1, 1))],
+                    [(t.topic, t.frequency) for t in await repository.get_top_topics(session, user_id)]
+                )
+                for user_id in ("u0", "u1")
+            }
+    
+    replayed = database("replayed")
+    live = database("live")
+    
+    async def main():
+        replayed_repository = AnalyticsRepository(replayed)
+        live_repository = AnalyticsRepository(live)
+        
+        await Replayer(replayed_repository, replayed, 2, 200, 3).run(str(path), Checkpoint(None, str(path)), reset=True)
+        await EventHandler(live_repository, live).handle_mood_analyzed_batch(redelivered)
+        before = await totals(replayed, replayed_repository), await totals(live, live_repository)
+        
+        await EventHandler(replayed_repository, replayed).handle_entry_deleted_batch([
+            {"payload": {"entry_id": "e0", "user_id": "u0"}}
+        ])
+        return before, await totals(replayed, replayed_repository)
+    
+    (replayed_totals, live_totals), after_delete = run(main())
+    
+    assert replayed_totals == live_totals
+    assert replayed_totals["u0"][0] == [(5, 50)]
+    assert after_delete["u0"][0] == [(4, 40)]
+    assert dict(after_delete["u0"][1])["family"] == dict(replayed_totals["u0"][1])["family"] - 1
+
@@ -0,0 +1,256 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import select, func, insert
+
+from src.infrastructure.models import ArchetypeHistory, DailyMoodSummary, UserTopicsSummary
+from src.infrastructure.repository import AnalyticsRepository
+from src.domain.accumulator import MoodAccumulator
+
+
+def test_merge_daily_accumulators_combines_with_existing_row(run, db, repository):
+    def accumulator(valence, tokens):
+        return MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": valence, "tokens_count": tokens})
+    
+    async def scenario(db, repository):
+        key = ("u1", date(2024, 1, 1))
+        async for session in db.get_session():
+            await repository.merge_daily_accumulators(session, {key: accumulator(1.0, 10)})
+            await session.commit()
+            await repository.merge_daily_accumulators(session, {key: accumulator(0.0, 20)})
+            await session.commit()
+            return await repository.get_daily_summaries(session, "u1", key[1], key[1])
+    
+    summaries = run(scenario(db, repository))
+    
+    assert len(summaries) == 1
+    assert summaries[0].entry_count == 2
+    assert summaries[0].total_tokens == 30
+    assert summaries[0].average_valence == pytest.approx(0.5)
+
+
+def test_merge_of_a_row_created_concurrently_keeps_both_writers_stats(run, db, repository):
+    def accumulator(valence, tokens):
+        return MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": valence, "tokens_count": tokens})
+    
+    key = ("u1", date(2024, 1, 1))
+    
+    class RacingRepository(AnalyticsRepository):
+        raced = False
+        
+        async def _lock_daily_accumulators(self, session, keys):
+            locked = await super()._lock_daily_accumulators(session, keys)
+            if not self.raced:
+                self.raced = True
+                async for rival in self.db.get_session():
+                    await AnalyticsRepository(self.db).merge_daily_accumulators(rival, {key: accumulator(1.0, 10)})
+                    await rival.commit()
+            return locked
+    
+    async def scenario(db, repository):
+        racing = RacingRepository(db)
+        async for session in db.get_session():
+            await racing.merge_daily_accumulators(session, {key: accumulator(0.0, 20)})
+            await session.commit()
+            summaries = await repository.get_daily_summaries(session, "u1", key[1], key[1])
+            return racing.raced, summaries
+    
+    raced, summaries = run(scenario(db, repository))
+    stats = MoodAccumulator.from_dict(summaries[0].stats)
+    
+    assert raced
+    assert summaries[0].entry_count == 2
+    assert summaries[0].total_tokens == 30
+    assert stats.count == 2
+    assert stats.total_tokens == 30
+    assert stats.valence_mean == pytest.approx(0.5)
+    assert stats.valence_m2 == pytest.approx(0.5)
+
+
+def test_topic_counts_accumulate_and_rank_by_frequency(run, db, repository):
+    now = datetime.now(timezone.utc)
+    
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            await repository.upsert_topic_counts(session, {("u1", "work"): 2, ("u1", "sport"): 1}, now - timedelta(days=40))
+            await repository.upsert_topic_counts(session, {("u1", "family"): 2, ("u1", "work"): 1, ("u1", "gone"): 1}, now)
+            await repository.decrement_topic_counts(session, {("u1", "gone"): (1, 0.0)})
+            await session.commit()
+            return await repository.get_top_topics(session, "u1")
+    
+    everything = run(scenario(db, repository))
+    
+    assert [(t.topic, t.frequency) for t in everything] == [("work", 3), ("family", 2), ("sport", 1)]
+
+
+def test_top_topics_for_a_period_count_only_mentions_in_that_period(run, db, repository):
+    today = datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+    
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            await repository.upsert_daily_topic_counts(session, {
+                ("u1", today - timedelta(days=365), "work"): 500,
+                ("u1", yesterday, "work"): 1,
+                ("u1", yesterday, "family"): 2,
+                ("u1", yesterday, "gone"): 1
+            })
+            await repository.decrement_daily_topic_counts(session, {("u1", yesterday, "gone"): 1})
+            await repository.upsert_topic_counts(
+                session, {("u1", "work"): 501, ("u1", "family"): 2}, datetime.now(timezone.utc)
+            )
+            await session.commit()
+            return (
+                await repository.get_top_topics(session, "u1", since=yesterday),
+                await repository.get_top_topics(session, "u1", since=today)
+            )
+    
+    recent, today_only = run(scenario(db, repository))
+    
+    assert [(t.topic, t.frequency) for t in recent] == [("family", 2), ("work", 1)]
+    assert all(t.last_seen is not None for t in recent)
+    assert today_only == []
+
+
+def test_statistics_top_topics_follow_trend_score(run, db, repository):
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            await repository.upsert_topic_counts(session, {("u1", "work"): 10}, datetime.now(timezone.utc), 1.0)
+            await repository.upsert_topic_counts(session, {("u1", "travel"): 1}, datetime.now(timezone.utc), 64.0)
+            await session.commit()
+            return await repository.get_user_statistics(session, "u1")
+    
+    statistics = run(scenario(db, repository))
+    
+    assert statistics["top_topics"] == ["travel", "work"]
+
+
+def test_rebase_rescales_trend_scores_and_entry_contributions(run, db, repository):
+    from src.application.event_handler import EventHandler
+    from src.domain.trending import TopicTrending
+    from src.trending_rebase import rebase
+    
+    trending = TopicTrending(half_life_days=7)
+    rebased = TopicTrending(half_life_days=7, landmark=datetime(2030, 1, 1, tzinfo=timezone.utc))
+    
+    def entry(entry_id, topics):
+        return {
+            "metadata": {"timestamp": "2024-01-01T12:00:00Z"},
+            "payload": {"user_id": "u1", "entry_id": entry_id, "emotion_vector": [0.1] * 8, "detected_topics": topics}
+        }
+    
+    async def scenario(db, repository):
+        await EventHandler(repository, db, trending=trending).handle_mood_analyzed_batch(
+            [entry("e1", ["work"]), entry("e2", ["work", "travel"])]
+        )
+        async for session in db.get_session():
+            before = dict((await session.execute(select(UserTopicsSummary.topic, UserTopicsSummary.trend_score))).all())
+        result = await rebase(repository, db, trending, rebased.landmark, batch_size=1)
+        await EventHandler(repository, db, trending=rebased).handle_entry_deleted_batch(
+            [{"payload": {"entry_id": "e2", "user_id": "u1"}}]
+        )
+        async for session in db.get_session():
+            after = dict((await session.execute(select(UserTopicsSummary.topic, UserTopicsSummary.trend_score))).all())
+            return before, result, after
+    
+    before, result, after = run(scenario(db, repository))
+    
+    assert result["entries_rescaled"] == 2
+    assert result["factor"] == pytest.approx(trending.rebase_factor(rebased.landmark))
+    assert after["work"] == pytest.approx(before["work"] / 2 * result["factor"])
+    assert after["travel"] == pytest.approx(0.0)
+
+
+async def legacy_user_statistics(session, user_id):
+    async def scalar(query):
+        return (await session.execute(query)).scalar()
+    
+    daily = DailyMoodSummary.user_id == user_id
+    latest = await scalar(select(DailyMoodSummary).where(daily).order_by(DailyMoodSummary.date.desc()).limit(1))
+    first = await scalar(select(DailyMoodSummary).where(daily).order_by(DailyMoodSummary.date.asc()).limit(1))
+    archetype = await scalar(
+        select(ArchetypeHistory).where(ArchetypeHistory.user_id == user_id)
+        .order_by(ArchetypeHistory.changed_at.desc()).limit(1)
+    )
+    topics = await session.execute(
+        select(UserTopicsSummary.topic).where(UserTopicsSummary.user_id == user_id)
+        .order_by(UserTopicsSummary.trend_score.desc().nulls_last(), UserTopicsSummary.topic).limit(5)
+    )
+    
+    return {
+        "total_diary_entries": await scalar(select(func.count(DailyMoodSummary.id)).where(daily)) or 0,
+        "total_mood_analyses": await scalar(select(func.sum(DailyMoodSummary.entry_count)).where(daily)) or 0,
+        "total_tokens": await scalar(select(func.sum(DailyMoodSummary.total_tokens)).where(daily)) or 0,
+        "dominant_emotion": latest.dominant_emotion if latest else "",
+        "top_topics": list(topics.scalars()),
+        "profile_created_at": datetime.combine(first.date, datetime.min.time()) if first else None,
+        "last_personality_update": archetype.changed_at if archetype else None
+    }
+
+
+def test_statistics_match_the_per_field_queries(run, db, repository):
+    users = ["u1", "u2", "u3"]
+    
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            await repository.merge_daily_accumulators(session, {
+                ("u1", date(2024, 1, 1)): MoodAccumulator().add({"emotion_vector": [0.9] + [0.0] * 7, "tokens_count": 5}),
+                ("u1", date(2024, 1, 3)): MoodAccumulator().add({"emotion_vector": [0.0, 0.9] + [0.0] * 6, "tokens_count": 7})
+                    .add({"emotion_vector": [0.0, 0.9] + [0.0] * 6, "tokens_count": 1}),
+                ("u2", date(2024, 2, 1)): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "tokens_count": 3})
+            })
+            await repository.upsert_topic_counts(
+                session, {("u1", topic): 1 for topic in ["a", "b", "c", "d", "e"]}, datetime.now(timezone.utc), 1.0
+            )
+            await repository.upsert_topic_counts(session, {("u1", "f"): 1}, datetime.now(timezone.utc), 3.0)
+            await session.execute(insert(UserTopicsSummary).values(id="legacy", user_id="u2", topic="old", frequency=4, trend_score=None))
+            await repository.upsert_topic_counts(session, {("u2", "new"): 1}, datetime.now(timezone.utc), 0.5)
+            await repository.insert_archetype_history(session, [
+                {
+                    "id": f"h{index}", "user_id": "u1", "archetype": "sage", "confidence": 0.5, "model_version": "v1",
+                    "changed_at": datetime(2024, 1, index + 1, tzinfo=timezone.utc)
+                }
+                for index in range(2)
+            ])
+            await session.commit()
+            
+            single = {user_id: await repository.get_user_statistics(session, user_id) for user_id in users}
+            batch = await repository.get_user_statistics_batch(session, users)
+            legacy = {user_id: await legacy_user_statistics(session, user_id) for user_id in users}
+            return single, batch, legacy
+    
+    single, batch, legacy = run(scenario(db, repository))
+    
+    assert legacy["u1"]["top_topics"] == ["f", "a", "b", "c", "d"]
+    assert legacy["u2"]["top_topics"] == ["new", "old"]
+    for user_id in users:
+        for statistics in (single[user_id], batch[user_id]):
+            defaulted = [key for key in ("profile_created_at", "last_personality_update") if legacy[user_id][key] is None]
+            assert {key: value for key, value in statistics.items() if key not in defaulted} == {
+                key: value for key, value in legacy[user_id].items() if key not in defaulted
+            }
+
+
+def test_daily_columns_are_returned_column_oriented(run, db, repository):
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            accumulators = {
+                ("u1", date(2024, 1, day)): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": day / 10})
+                for day in (3, 1, 2)
+            }
+            await repository.merge_daily_accumulators(session, accumulators)
+            await session.commit()
+            
+            columns = await repository.get_daily_columns(session, "u1", date(2024, 1, 1), date(2024, 1, 2))
+            empty = await repository.get_daily_columns(session, "u2", date(2024, 1, 1), date(2024, 1, 2))
+            return columns, empty
+    
+    columns, empty = run(scenario(db, repository))
+    
+    assert columns["date"] == [date(2024, 1, 1), date(2024, 1, 2)]
+    assert columns["average_valence"] == pytest.approx([0.1, 0.2])
+    assert columns["entry_count"] == [1, 1]
+    assert all(values == [] for values in empty.values())
+
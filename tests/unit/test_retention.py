@@ -0,0 +1,149 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from src.domain.accumulator import MoodAccumulator
+from src.domain.retention import add_months, expiry_cutoff, retention_cutoff
+from src.infrastructure.database import Base
+from src.infrastructure.models import ArchetypeHistory, MonthlyMoodSummary, ProcessedEntry
+from src.infrastructure.partitions import declare_partitioning, partition_name
+from src.application.retention import RetentionService
+from src.application.rollup import RollupService
+
+TODAY = date(2024, 6, 15)
+
+
+
+async def seed_days(db, repository, days):
+    async for session in db.get_session():
+        accumulators = {
+            ("u1", day): MoodAccumulator().add({"emotion_vector": [0.1] * 8, "valence": 0.3})
+            for day in days
+        }
+        await repository.merge_daily_accumulators(session, accumulators)
+        await repository.claim_entries(session, [
+            (f"e-{day.isoformat()}", "u1", day, {"valence": 0.3}) for day in days
+        ])
+        await repository.mark_rollups_dirty(session, accumulators.keys())
+        await session.commit()
+
+
+async def count(db, model):
+    async for session in db.get_session():
+        try:
+            return await session.scalar(select(func.count()).select_from(model))
+        finally:
+            await session.close()
+
+
+def test_cutoff_is_the_start_of_a_month():
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert retention_cutoff(TODAY, 3) == date(2024, 3, 1)
+    assert retention_cutoff(TODAY, 0) is None
+    assert expiry_cutoff(date(2024, 3, 1)) == date(2024, 2, 26)
+    assert expiry_cutoff(date(2024, 4, 1)) == date(2024, 4, 1)
+
+
+def test_daily_retention_waits_for_rollups_then_keeps_monthly_summaries(run, db, repository):
+    async def scenario(db, repository):
+        await seed_days(db, repository, [date(2024, 1, 10), date(2024, 2, 20), date(2024, 3, 5)])
+        retention = RetentionService(repository, db, daily_months=3, batch_size=1)
+        
+        postponed = await retention.run_once(TODAY)
+        while await RollupService(repository, db).process_dirty():
+            pass
+        applied = await retention.run_once(TODAY)
+        
+        async for session in db.get_session():
+            dailies = await repository.get_daily_summaries(session, "u1", date(2024, 1, 1), date(2024, 12, 31))
+        return postponed, applied, [d.date for d in dailies], await count(db, MonthlyMoodSummary), await count(db, ProcessedEntry)
+    
+    postponed, applied, remaining, monthly, processed = run(scenario(db, repository))
+    
+    assert postponed["daily_rollups_pending"] > 0
+    assert "daily_rows_deleted" not in postponed
+    assert applied["daily_rows_deleted"] == 2
+    assert applied["processed_entries_deleted"] == 2
+    assert remaining == [date(2024, 3, 5)]
+    assert monthly == 3
+    assert processed == 1
+
+
+def test_rollups_before_the_horizon_are_not_recomputed(run, db, repository):
+    async def scenario(db, repository):
+        await seed_days(db, repository, [date.today() - timedelta(days=400), date.today()])
+        await RollupService(repository, db, retention_months=6).process_dirty()
+        return await count(db, MonthlyMoodSummary)
+    
+    assert run(scenario(db, repository)) == 1
+
+
+def test_week_straddling_the_horizon_is_recomputed_and_keeps_its_days(run, db, repository):
+    async def scenario(db, repository):
+        await seed_days(db, repository, [date(2024, 2, 20), date(2024, 2, 27), date(2024, 3, 2)])
+        while await RollupService(repository, db, retention_months=3).process_dirty(TODAY):
+            pass
+        report = await RetentionService(repository, db, daily_months=3).run_once(TODAY)
+        
+        async for session in db.get_session():
+            weeks = await repository.get_weekly_summaries(session, "u1", 10)
+            months = await repository.get_monthly_summaries(session, "u1", 10)
+            dailies = await repository.get_daily_summaries(session, "u1", date(2024, 1, 1), date(2024, 12, 31))
+            return report, weeks, months, [d.date for d in dailies]
+    
+    report, weeks, months, remaining = run(scenario(db, repository))
+    
+    assert [(w.week, w.entry_count) for w in weeks] == [(9, 2)]
+    assert [(m.month, m.entry_count) for m in months] == [(3, 1)]
+    assert report["daily_rows_deleted"] == 1
+    assert remaining == [date(2024, 2, 27), date(2024, 3, 2)]
+
+
+def test_archetype_compaction_keeps_change_points_only(run, db, repository):
+    archetypes = ["explorer", "explorer", "sage", "sage", "explorer", "explorer"]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    
+    async def scenario(db, repository):
+        async for session in db.get_session():
+            await repository.insert_archetype_history(session, [
+                {
+                    "id": f"h{index}",
+                    "user_id": "u1",
+                    "archetype": archetype,
+                    "confidence": 0.5,
+                    "model_version": "v1",
+                    "changed_at": start + timedelta(days=30 * index)
+                }
+                for index, archetype in enumerate(archetypes)
+            ])
+            await session.commit()
+        
+        report = await RetentionService(repository, db, archetype_months=3, batch_size=1).run_once(TODAY)
+        async for session in db.get_session():
+            rows = await session.execute(select(ArchetypeHistory.id).order_by(ArchetypeHistory.changed_at))
+            return report, [row.id for row in rows]
+    
+    report, remaining = run(scenario(db, repository))
+    
+    assert report["archetype_rows_compacted"] == 1
+    assert remaining == ["h0", "h2", "h3", "h4", "h5"]
+
+
+def test_partitioned_tables_are_declared_by_month_range():
+    metadata = declare_partitioning(Base.metadata)
+    
+    ddl = str(CreateTable(metadata.tables["daily_mood_summary"]).compile(dialect=postgresql.dialect()))
+    
+    assert "PARTITION BY RANGE (date)" in ddl
+    assert "PRIMARY KEY (id, date)" in ddl
+    assert [column.name for column in Base.metadata.tables["daily_mood_summary"].primary_key] == ["id"]
+    assert "PARTITION BY" not in str(CreateTable(Base.metadata.tables["daily_mood_summary"]).compile(dialect=postgresql.dialect()))
+    assert [column.name for column in metadata.tables["archetype_history"].primary_key] == ["id", "changed_at"]
+    assert partition_name("daily_mood_summary", date(2024, 3, 1)) == "daily_mood_summary_p202403"
+
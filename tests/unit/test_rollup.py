@@ -0,0 +1,114 @@
+from datetime import date
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import delete, select, func
+
+from src.domain.accumulator import MoodAccumulator
+from src.infrastructure.models import DailyMoodSummary, RollupDirtyBucket
+from src.infrastructure.repository import AnalyticsRepository
+from src.application.rollup import RollupService
+
+
+class RecordingRepository(AnalyticsRepository):
+    def __init__(self, db):
+        super().__init__(db)
+        self.daily_fetches = []
+    
+    async def get_daily_summaries_for_users(self, session, user_ids, start_date, end_date):
+        self.daily_fetches.append((tuple(sorted(user_ids)), start_date, end_date))
+        return await super().get_daily_summaries_for_users(session, user_ids, start_date, end_date)
+
+
+async def seed(db, repository, entries):
+    async for session in db.get_session():
+        accumulators = {}
+        for user_id, day, valence in entries:
+            accumulators.setdefault((user_id, day), MoodAccumulator()).add(
+                {"emotion_vector": [0.1] * 8, "valence": valence, "tokens_count": 10}
+            )
+        await repository.merge_daily_accumulators(session, accumulators)
+        await repository.mark_rollups_dirty(session, accumulators.keys())
+        await session.commit()
+
+
+async def rollups(db, repository, user_id):
+    async for session in db.get_session():
+        try:
+            weeks = await repository.get_weekly_summaries(session, user_id, 10)
+            months = await repository.get_monthly_summaries(session, user_id, 10)
+            dirty = await session.scalar(select(func.count()).select_from(RollupDirtyBucket))
+            return weeks, months, dirty
+        finally:
+            await session.close()
+
+
+def test_dirty_buckets_are_claimed_in_batches_and_cleared(run, db, repository):
+    async def scenario(db, repository):
+        await seed(db, repository, [
+            ("u1", date(2024, 3, 4), 0.2),
+            ("u1", date(2024, 3, 12), 0.4),
+            ("u2", date(2024, 4, 2), 0.1)
+        ])
+        service = RollupService(repository, db, batch_size=2)
+        
+        processed = [await service.process_dirty() for _ in range(4)]
+        return processed, await rollups(db, repository, "u1")
+    
+    processed, (weeks, months, dirty) = run(scenario(db, repository))
+    
+    assert processed == [2, 2, 1, 0]
+    assert dirty == 0
+    assert [(w.week, w.entry_count) for w in weeks] == [(11, 1), (10, 1)]
+    assert [(m.month, m.entry_count, m.active_days) for m in months] == [(3, 2, 2)]
+
+
+def test_changed_days_recompute_their_buckets(run, db, repository):
+    async def scenario(db, repository):
+        await seed(db, repository, [("u1", date(2024, 3, 4), 0.1)])
+        await RollupService(repository, db).process_dirty()
+        await seed(db, repository, [("u1", date(2024, 3, 4), 0.1), ("u1", date(2024, 3, 6), 0.5)])
+        await RollupService(repository, db).process_dirty()
+        return await rollups(db, repository, "u1")
+    
+    weeks, months, dirty = run(scenario(db, repository))
+    
+    assert dirty == 0
+    assert [(w.week, w.entry_count, w.total_tokens) for w in weeks] == [(10, 3, 30)]
+    assert weeks[0].trend == "improving"
+    assert weeks[0].volatility == pytest.approx(0.2)
+    assert weeks[0].most_emotional_day == "2024-03-06"
+    assert weeks[0].most_productive_day == "2024-03-04"
+    assert months[0].entry_count == 3
+
+
+def test_buckets_without_dailies_delete_their_rollups(run, db, repository):
+    async def scenario(db, repository):
+        await seed(db, repository, [("u1", date(2024, 3, 4), 0.1)])
+        await RollupService(repository, db).process_dirty()
+        async for session in db.get_session():
+            await session.execute(delete(DailyMoodSummary))
+            await repository.mark_rollups_dirty(session, [("u1", date(2024, 3, 4))])
+            await session.commit()
+        await RollupService(repository, db).process_dirty()
+        return await rollups(db, repository, "u1")
+    
+    assert run(scenario(db, repository)) == ([], [], 0)
+
+
+def test_dailies_are_loaded_per_bucket_range(run, db):
+    async def scenario(db, repository):
+        await seed(db, repository, [("u1", date(2024, 1, 10), 0.1), ("u2", date(2024, 6, 12), 0.1)])
+        await RollupService(repository, db).process_dirty()
+        return repository.daily_fetches
+    
+    fetches = run(scenario(db, RecordingRepository(db)))
+    
+    assert sorted(fetches) == [
+        (("u1",), date(2024, 1, 1), date(2024, 1, 31)),
+        (("u1",), date(2024, 1, 8), date(2024, 1, 14)),
+        (("u2",), date(2024, 6, 1), date(2024, 6, 30)),
+        (("u2",), date(2024, 6, 10), date(2024, 6, 16))
+    ]
+
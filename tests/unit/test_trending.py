@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+
+from src.domain.trending import TopicTrending
+
+
+def test_score_halves_after_each_half_life():
+    trending = TopicTrending(half_life_days=7)
+    start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    score = 4 * trending.weight(start)
+    
+    assert trending.decayed(score, start) == pytest.approx(4.0)
+    assert trending.decayed(score, start + timedelta(days=7)) == pytest.approx(2.0)
+    assert trending.decayed(score, start + timedelta(days=14)) == pytest.approx(1.0)
+
+
+def test_recent_topics_outrank_older_frequent_ones():
+    trending = TopicTrending(half_life_days=7)
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    old = 10 * trending.weight(now - timedelta(days=35))
+    recent = 1 * trending.weight(now - timedelta(days=1))
+    
+    assert recent > old
+    assert trending.decayed(old, now) == pytest.approx(10 / 32)
+
+
+def test_naive_landmark_is_treated_as_utc():
+    trending = TopicTrending(half_life_days=1, landmark=datetime(2024, 1, 1))
+    
+    assert trending.weight(datetime(2024, 1, 2)) == pytest.approx(2.0)
+
+
+
+def test_weights_stay_finite_until_the_horizon():
+    trending = TopicTrending(half_life_days=7)
+    
+    assert trending.horizon == trending.landmark + timedelta(days=7 * 960)
+    assert 1000 * trending.weight(trending.horizon) < float("inf")
+    with pytest.raises(OverflowError):
+        trending.weight(trending.landmark + timedelta(days=7 * 1030))
+
+
+def test_rebase_keeps_decayed_scores():
+    trending = TopicTrending(half_life_days=7)
+    rebased = TopicTrending(half_life_days=7, landmark=datetime(2030, 1, 1, tzinfo=timezone.utc))
+    seen = datetime(2029, 12, 20, tzinfo=timezone.utc)
+    now = datetime(2030, 2, 1, tzinfo=timezone.utc)
+    score = 3 * trending.weight(seen) * trending.rebase_factor(rebased.landmark)
+    
+    assert score == pytest.approx(3 * rebased.weight(seen))
+    assert rebased.decayed(score, now) == pytest.approx(trending.decayed(3 * trending.weight(seen), now))
+